@@ -10,8 +10,8 @@ class CartManager {
         // Kiểm tra xem user đã đăng nhập chưa
         const isLoggedIn = await this.checkAuthStatus();
         if (isLoggedIn) {
+            // /api/cart/ trả về cả giỏ hàng bonus (field "bonus") - chỉ cần một request
             await this.loadCart();
-            await this.loadBonusCart();
             this.updateCartDisplay();
         } else {
             // Ngay cả khi chưa đăng nhập, vẫn cập nhật shipping threshold với 0 items
@@ -39,6 +39,9 @@ class CartManager {
             });
             if (response.ok) {
                 this.cartData = await response.json();
+                if (this.cartData.bonus) {
+                    this.bonusCartData = this.cartData.bonus;
+                }
                 return this.cartData;
             }
         } catch (error) {
@@ -96,6 +99,7 @@ class CartManager {
 
             if (response.ok) {
                 this.cartData = await response.json();
+                this.bonusCartData = this.cartData.bonus;
                 this.updateCartDisplay();
                 this.showNotification('Product added to cart successfully!', 'success');
                 return true;
@@ -149,14 +153,15 @@ class CartManager {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken()
+                    'X-CSRFToken': this.getCSRFToken(),
+                    'X-Cart-Response': 'delta'
                 },
                 credentials: 'include',
                 body: JSON.stringify({ quantity: quantity })
             });
 
             if (response.ok) {
-                this.cartData = await response.json();
+                await this.applyCartDelta(await response.json());
                 this.updateCartDisplay();
                 this.showNotification('Cart updated successfully!', 'success');
                 return true;
@@ -172,20 +177,81 @@ class CartManager {
         }
     }
 
+    // Áp dụng delta (chỉ các dòng thay đổi + tổng mới) vào cartData/bonusCartData đang giữ.
+    // Nếu version không liền mạch (tab khác đã thay đổi giỏ hàng) thì load lại toàn bộ.
+    async applyCartDelta(delta) {
+        if (!this.cartData || !this.cartData.bonus || this.cartData.version !== delta.version - 1) {
+            await this.loadCart();
+            return;
+        }
+
+        const removed = new Set(delta.removed);
+        const changed = new Map(delta.changed.map(line => [line.product.id, line]));
+        const patch = (cart, productType) => {
+            cart.items = cart.items.filter(item => !removed.has(item.product.id));
+            cart.items = cart.items.map(item => changed.get(item.product.id) || item);
+            delta.changed.forEach(line => {
+                if (line.product_type === productType && !cart.items.some(item => item.product.id === line.product.id)) {
+                    cart.items.push(line);
+                }
+            });
+            cart.total_amount = delta.totals[productType].total_amount;
+            cart.item_count = delta.totals[productType].item_count;
+        };
+
+        patch(this.cartData, 'single');
+        patch(this.cartData.bonus, 'bonus');
+        this.cartData.grand_total = delta.grand_total;
+        this.cartData.version = delta.version;
+        this.bonusCartData = this.cartData.bonus;
+    }
+
+    // Gửi nhiều thao tác (sản phẩm chính + bonus) trong một request, server áp dụng trong một transaction
+    // operations: [{ op: 'add' | 'set_quantity' | 'remove' | 'set_options' | 'clear', product_type, quantity, ... }]
+    async batchCart(operations) {
+        try {
+            const response = await fetch(`${this.apiBase}/cart/batch/`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': this.getCSRFToken(),
+                    'X-Cart-Response': 'delta'
+                },
+                credentials: 'include',
+                body: JSON.stringify({ operations: operations })
+            });
+
+            if (response.ok) {
+                await this.applyCartDelta(await response.json());
+                this.updateCartDisplay();
+                return true;
+            } else {
+                const error = await response.json();
+                this.showNotification(`Error: ${error.error || 'Failed to update cart'}`, 'error');
+                return false;
+            }
+        } catch (error) {
+            console.error('Error updating cart:', error);
+            this.showNotification('Network error. Please try again.', 'error');
+            return false;
+        }
+    }
+
     async updateBonusCartQuantity(quantity) {
         try {
             const response = await fetch(`${this.apiBase}/bonus-cart/update_quantity/`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken()
+                    'X-CSRFToken': this.getCSRFToken(),
+                    'X-Cart-Response': 'delta'
                 },
                 credentials: 'include',
                 body: JSON.stringify({ quantity: quantity })
             });
 
             if (response.ok) {
-                this.bonusCartData = await response.json();
+                await this.applyCartDelta(await response.json());
                 console.log('Bonus cart updated:', this.bonusCartData);
                 
                 // Cập nhật display để hiển thị thay đổi
@@ -922,7 +988,7 @@ function handleCheckoutClick(event) {
 
         // Cũng force refresh từ database để đảm bảo dữ liệu mới nhất
         window.cartManager.loadCart().then(() => {
-            window.cartManager.loadBonusCart().then(() => {
+            (window.cartManager.bonusCartData ? Promise.resolve() : window.cartManager.loadBonusCart()).then(() => {
                 // Update lại display sau khi load xong
                 window.cartManager.updateCartDisplay();
 
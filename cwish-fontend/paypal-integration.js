@@ -382,16 +382,41 @@ class PayPalIntegration {
 
             const csrfToken = this.getCsrfToken();
 
-            const response = await fetch(endpoint, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    // Gửi CSRF token nếu có (phòng tránh 403 Forbidden)
-                    'X-CSRFToken': csrfToken || ''
-                },
-                credentials: 'include',
-                body: JSON.stringify(orderData)
-            });
+            // Idempotency-Key cố định cho một lần thanh toán: thử lại (mất mạng, 5xx)
+            // với cùng key sẽ nhận lại đúng order đã tạo thay vì tạo order thứ hai
+            const idempotencyKey = paypalInfo && paypalInfo.paypalOrderId
+                ? `checkout-${paypalInfo.paypalOrderId}`
+                : `checkout-${crypto.randomUUID()}`;
+
+            const maxAttempts = 3;
+            let response;
+            for (let attempt = 1; attempt <= maxAttempts; attempt++) {
+                try {
+                    response = await fetch(endpoint, {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json',
+                            // Gửi CSRF token nếu có (phòng tránh 403 Forbidden)
+                            'X-CSRFToken': csrfToken || '',
+                            'Idempotency-Key': idempotencyKey
+                        },
+                        credentials: 'include',
+                        body: JSON.stringify(orderData)
+                    });
+                } catch (networkError) {
+                    if (attempt === maxAttempts) throw networkError;
+                    console.warn(`⚠️ Network error, retrying (${attempt}/${maxAttempts})...`, networkError);
+                    await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+                    continue;
+                }
+                // 409: request trước với cùng key vẫn đang chạy
+                if ((response.status >= 500 || response.status === 409) && attempt < maxAttempts) {
+                    console.warn(`⚠️ Backend status ${response.status}, retrying (${attempt}/${maxAttempts})...`);
+                    await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+                    continue;
+                }
+                break;
+            }
 
             console.log(`📥 Response status: ${response.status}`);
             console.log(`📄 Response headers:`, [...response.headers.entries()]);
@@ -60,8 +60,15 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Template đã compile được giữ trong bộ nhớ (email xác nhận không đọc/parse lại file
+            # mỗi lần gửi); runserver tự xóa cache khi file template thay đổi
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -82,6 +89,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Khóa ghi ngay khi mở transaction và chờ khóa thay vì lỗi "database is locked"
+            # khi nhiều checkout chạy đồng thời (đo bằng loadtest_checkout)
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -126,6 +139,46 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Ảnh derivative của sản phẩm (store/images.py) - tên file có hash nội dung
+PRODUCT_IMAGE_WIDTHS = [160, 320, 640, 1024]
+PRODUCT_IMAGE_QUALITY = 80
+PRODUCT_IMAGE_WORKERS = 2  # 0 = encode ngay trong process hiện tại
+
+# Shirtigo API client (store/shirtigo.py)
+SHIRTIGO_API_URL = os.environ.get('SHIRTIGO_API_URL', 'https://cockpit.shirtigo.com/api')
+# Chỉ đọc từ biến môi trường (không commit token); thiếu token thì không gửi order đến Shirtigo
+SHIRTIGO_API_TOKEN = os.environ.get('SHIRTIGO_API_TOKEN', '')
+SHIRTIGO_CONNECT_TIMEOUT = 3.05
+SHIRTIGO_READ_TIMEOUT = 20
+SHIRTIGO_MAX_RETRIES = 3  # Chỉ thử lại 429/502/503/504 và lỗi kết nối
+SHIRTIGO_RETRY_BACKOFF = 0.5  # Giây, nhân đôi mỗi lần thử lại (full jitter)
+SHIRTIGO_RETRY_BUDGET = 10  # Giây chờ tối đa giữa các lần thử của một request (Retry-After dài hơn: outbox hẹn lại)
+SHIRTIGO_BREAKER_THRESHOLD = 5  # Số lỗi liên tiếp trước khi circuit breaker mở
+SHIRTIGO_BREAKER_RESET = 30  # Giây circuit breaker mở trước khi cho một request thử
+SHIRTIGO_MAX_IN_FLIGHT = 4  # Bulkhead: số request Shirtigo đồng thời tối đa mỗi process
+SHIRTIGO_BULKHEAD_TIMEOUT = 5
+
+# Shirtigo outbox (store/outbox.py, manage.py drain_shirtigo_outbox)
+SHIRTIGO_OUTBOX_CONCURRENCY = 4  # Số request Shirtigo đồng thời tối đa của một worker
+SHIRTIGO_OUTBOX_BATCH_SIZE = 20
+SHIRTIGO_OUTBOX_LEASE = 120  # Giây worker giữ một entry, phải lớn hơn timeout của request Shirtigo
+SHIRTIGO_OUTBOX_MAX_ATTEMPTS = 8
+SHIRTIGO_OUTBOX_BACKOFF_BASE = 30  # Giây, nhân đôi sau mỗi lần thất bại
+SHIRTIGO_OUTBOX_BACKOFF_MAX = 3600
+
+# Idempotency-Key cho POST /api/orders/ (store/idempotency.py)
+IDEMPOTENCY_KEY_TTL = 86400  # Giây giữ response đã lưu, sau đó purge_idempotency_keys xóa
+IDEMPOTENCY_WAIT_TIMEOUT = 10  # Giây request trùng chờ request đầu hoàn tất
+IDEMPOTENCY_LOCK_TIMEOUT = 120  # Giây giữ key in_progress (vài lần timeout của request); hết hạn thì request mới lấy lại
+
+# Lưu trữ đơn hàng đã xong (store/archive.py, manage.py archive_orders)
+ORDER_ARCHIVE_AFTER_DAYS = 180  # Order delivered/cancelled tạo trước số ngày này được lưu trữ
+ORDER_ARCHIVE_BATCH_SIZE = 500  # Số order chuyển trong một transaction
+
+# Export đơn hàng (store/export.py): watermark lùi N giây so với lúc export, phải dài hơn
+# transaction dài nhất để order commit muộn không bị bỏ sót
+ORDER_EXPORT_SAFETY_LAG = 30
+
 # Site URL for absolute URLs in emails
 SITE_URL = 'http://localhost:8000'  # Change this to your production domain
 
@@ -134,6 +187,24 @@ SITE_URL = 'http://localhost:8000'  # Change this to your production domain
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# Production với nhiều worker (gunicorn) cần backend dùng chung (Redis/Memcached)
+# để việc invalidate sản phẩm active có hiệu lực trên mọi worker.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+# Sản phẩm active được cache trong từng process; version dùng chung được kiểm tra
+# tối đa mỗi N giây
+ACTIVE_PRODUCT_CACHE_ALIAS = 'default'
+ACTIVE_PRODUCT_CACHE_CHECK_INTERVAL = 1.0
+# Version chỉ đến các worker khác khi cache là backend dùng chung (DJANGO_CACHE_BACKEND =
+# Redis/Memcached/DatabaseCache). Với LocMemCache mỗi process chỉ thấy sản phẩm cũ tối đa N giây
+ACTIVE_PRODUCT_CACHE_MAX_AGE = 60
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -171,6 +242,8 @@ CORS_ALLOWED_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-cart-response',  # delta response cho thay đổi giỏ hàng
+    'idempotency-key',
 ]
 
 # CSRF for frontend
@@ -212,3 +285,11 @@ EMAIL_HOST_PASSWORD = 'wyfultbqmpflhrkl'
 DEFAULT_FROM_EMAIL = 'Cwish Store <noreply@cwishstore.com>'
 
 # Email templates are configured in TEMPLATES setting above
+
+# Hàng đợi email (store/emails.py, manage.py send_queued_emails)
+EMAIL_QUEUE_BATCH_SIZE = 50  # Số email gửi qua một kết nối SMTP
+EMAIL_QUEUE_RATE_PER_MINUTE = 20
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_LEASE = 300
+EMAIL_QUEUE_BACKOFF_BASE = 60  # Giây, nhân đôi sau mỗi lần thất bại
+EMAIL_QUEUE_BACKOFF_MAX = 3600
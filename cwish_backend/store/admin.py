@@ -1,5 +1,14 @@
 from django.contrib import admin
-from .models import SingleProduct, UserCart, Order, Contact, DigitalBonusProduct, BonusCart, OrderItem
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.utils import timezone
+from .models import (
+    SingleProduct, CartLine, Order, Contact, DigitalBonusProduct, OrderItem,
+    Category, Product, ProductOption, ProductVariant, ProductImage, ShirtigoOutbox, QueuedEmail,
+    IdempotencyKey, ArchivedOrder
+)
+from .archive import find_order
+from .order_status import transition
 
 
 @admin.register(SingleProduct)
@@ -18,52 +27,127 @@ class DigitalBonusProductAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
 
 
-@admin.register(UserCart)
-class UserCartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'product', 'quantity', 'total_price', 'created_at']
-    list_filter = ['created_at']
-    search_fields = ['user__username', 'user__email', 'product__name']
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+class ProductOptionInline(admin.TabularInline):
+    model = ProductOption
+    extra = 0
+
+
+class ProductVariantInline(admin.TabularInline):
+    model = ProductVariant
+    extra = 0
+
+
+class ProductImageInline(admin.TabularInline):
+    model = ProductImage
+    extra = 0
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ['title', 'handle', 'category', 'price', 'currency', 'status', 'created_at']
+    list_filter = ['status', 'category']
+    list_select_related = ['category']
+    search_fields = ['title', 'handle']
+    prepopulated_fields = {'handle': ('title',)}
+    readonly_fields = ['price', 'created_at', 'updated_at']
+    inlines = [ProductOptionInline, ProductVariantInline, ProductImageInline]
+
+
+@admin.register(ProductVariant)
+class ProductVariantAdmin(admin.ModelAdmin):
+    list_display = ['sku', 'title', 'product', 'price', 'inventory_quantity']
+    list_select_related = ['product']
+    search_fields = ['sku', 'title', 'product__title']
     readonly_fields = ['created_at', 'updated_at']
 
 
-@admin.register(BonusCart)
-class BonusCartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'product', 'quantity', 'total_price', 'created_at']
-    list_filter = ['created_at']
+@admin.register(CartLine)
+class CartLineAdmin(admin.ModelAdmin):
+    list_display = ['user', 'product', 'product_type', 'quantity', 'total_price', 'created_at']
+    list_filter = ['product_type', 'created_at']
+    list_select_related = ['user', 'product']
     search_fields = ['user__username', 'user__email', 'product__name']
     readonly_fields = ['created_at', 'updated_at']
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'get_product_names', 'get_quantity', 'total_amount', 'currency', 'status', 'print_position', 'personalization', 'created_at']
+    # Danh sách chỉ đọc cột tổng hợp của Order (không query order_items mỗi dòng)
+    list_display = ['id', 'user', 'item_count', 'main_line_count', 'bonus_line_count', 'total_amount', 'currency', 'status', 'print_position', 'personalization', 'created_at']
+    list_select_related = ['user']
     list_filter = ['status', 'created_at', 'country']
     search_fields = ['user__username', 'user__email', 'first_name', 'last_name', 'email']
-    readonly_fields = ['id', 'created_at', 'updated_at', 'get_product_names', 'get_quantity', 'print_position', 'personalization']
+    # status chỉ đổi qua các action bên dưới (theo Order.TRANSITIONS)
+    readonly_fields = ['id', 'created_at', 'updated_at', 'get_product_names', 'get_quantity', 'print_position', 'personalization',
+                       'main_line_count', 'bonus_line_count', 'main_total', 'bonus_total', 'status',
+                       'shirtigo_status', 'shirtigo_synced_at', 'shirtigo_response']
 
     def get_product_names(self, obj):
         """Display product names from OrderItems"""
         products = []
-        for item in obj.order_items.all():
-            if item.single_product:
-                product_name = f"Main: {item.single_product.name} (x{item.quantity})"
+        for item in obj.order_items.select_related('product'):
+            if item.product_type == 'single':
+                product_name = f"Main: {item.product.name} (x{item.quantity})"
                 if item.print_position:
                     product_name += f" - {item.print_position}"
                 products.append(product_name)
-            elif item.bonus_product:
-                products.append(f"Bonus: {item.bonus_product.name} (x{item.quantity})")
+            else:
+                products.append(f"Bonus: {item.product.name} (x{item.quantity})")
 
         return "; ".join(products) if products else 'N/A'
     get_product_names.short_description = 'Products'
 
     def get_quantity(self, obj):
         """Display total quantity"""
-        return obj.quantity
+        return obj.item_count
     get_quantity.short_description = 'Total Quantity'
 
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        # Order đã được lưu trữ: mở trang chỉ đọc của ArchivedOrder
+        if isinstance(find_order(object_id), ArchivedOrder):
+            return redirect('admin:store_archivedorder_change', object_id)
+        return super().change_view(request, object_id, form_url, extra_context)
+
+    actions = ['mark_processing', 'mark_shipped', 'mark_delivered', 'mark_cancelled']
+
+    def _transition(self, request, queryset, target):
+        """Chuyển các order đã chọn trong một UPDATE; báo số order bị bỏ qua"""
+        updated, skipped = transition(queryset.values_list('pk', flat=True), target)
+        self.message_user(request, f'{len(updated)} order(s) marked as {target}')
+        if skipped:
+            reasons = ', '.join(sorted({f"{row['status']} ({row['reason']})" for row in skipped}))
+            self.message_user(request, f'{len(skipped)} order(s) skipped: {reasons}', level=messages.WARNING)
+
+    @admin.action(description='Mark selected orders as processing')
+    def mark_processing(self, request, queryset):
+        self._transition(request, queryset, 'processing')
+
+    @admin.action(description='Mark selected orders as shipped')
+    def mark_shipped(self, request, queryset):
+        self._transition(request, queryset, 'shipped')
+
+    @admin.action(description='Mark selected orders as delivered')
+    def mark_delivered(self, request, queryset):
+        self._transition(request, queryset, 'delivered')
+
+    @admin.action(description='Mark selected orders as cancelled')
+    def mark_cancelled(self, request, queryset):
+        self._transition(request, queryset, 'cancelled')
+
     fieldsets = (
         ('Order Information', {
-            'fields': ('id', 'user', 'get_product_names', 'get_quantity', 'total_amount', 'currency', 'status', 'print_position', 'personalization', 'shirtigo_order_id')
+            'fields': ('id', 'user', 'get_product_names', 'get_quantity', 'main_line_count', 'bonus_line_count', 'main_total', 'bonus_total', 'total_amount', 'currency', 'status', 'print_position', 'personalization')
+        }),
+        ('Shirtigo', {
+            'fields': ('shirtigo_order_id', 'shirtigo_status', 'shirtigo_synced_at', 'shirtigo_response'),
+            'classes': ('collapse',)
         }),
         ('Customer Information', {
             'fields': ('email', 'first_name', 'last_name', 'phone')
@@ -78,23 +162,106 @@ class OrderAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Đơn hàng đã lưu trữ - chỉ xem (manage.py archive_orders)"""
+    list_display = ['id', 'user', 'item_count', 'total_amount', 'currency', 'status', 'created_at', 'archived_at']
+    list_select_related = ['user']
+    list_filter = ['status', 'created_at']
+    search_fields = ['id', 'user__username', 'user__email', 'first_name', 'last_name', 'email', 'shirtigo_order_id']
+
+    def get_product_names(self, obj):
+        """Display product names from archived items"""
+        products = []
+        for item in obj.items:
+            label = 'Main' if item['product_type'] == 'single' else 'Bonus'
+            product_name = f"{label}: {item['product_name']} (x{item['quantity']})"
+            if item['product_type'] == 'single' and item['print_position']:
+                product_name += f" - {item['print_position']}"
+            products.append(product_name)
+        return "; ".join(products) if products else 'N/A'
+    get_product_names.short_description = 'Products'
+
+    fieldsets = (
+        ('Order Information', {
+            'fields': ('id', 'user', 'get_product_names', 'item_count', 'main_line_count', 'bonus_line_count', 'main_total', 'bonus_total', 'total_amount', 'currency', 'status', 'print_position', 'personalization')
+        }),
+        ('Shirtigo', {
+            'fields': ('shirtigo_order_id', 'shirtigo_status', 'shirtigo_synced_at', 'shirtigo_response'),
+        }),
+        ('Customer Information', {
+            'fields': ('email', 'first_name', 'last_name', 'phone')
+        }),
+        ('Shipping Address', {
+            'fields': ('address', 'city', 'country', 'postal_code')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at', 'archived_at'),
+        }),
+    )
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field for fieldset in self.fieldsets for field in fieldset[1]['fields']]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product_type', 'get_product_name', 'quantity', 'unit_price', 'total_price', 'print_position', 'personalization', 'created_at']
+    list_select_related = ['order__user', 'product']
     list_filter = ['product_type', 'created_at']
-    search_fields = ['order__id', 'single_product__name', 'bonus_product__name']
+    search_fields = ['order__id', 'product__name']
     readonly_fields = ['created_at']
 
     def get_product_name(self, obj):
         """Display product name based on product type"""
-        if obj.single_product:
-            return obj.single_product.name
-        elif obj.bonus_product:
-            return obj.bonus_product.name
-        return 'N/A'
+        return obj.product.name if obj.product_id else 'N/A'
     get_product_name.short_description = 'Product Name'
 
 
+@admin.register(ShirtigoOutbox)
+class ShirtigoOutboxAdmin(admin.ModelAdmin):
+    list_display = ['order', 'status', 'attempts', 'next_attempt_at', 'locked_by', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['order__id', 'order__email']
+    readonly_fields = ['order', 'locked_by', 'locked_until', 'last_error', 'created_at', 'updated_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected entries now')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status__in=['sent', 'in_progress']).update(
+            status='pending', next_attempt_at=timezone.now(), locked_by='', locked_until=None,
+        )
+        self.message_user(request, f'{updated} entr(ies) queued for retry')
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ['order', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['kind', 'status']
+    search_fields = ['order__id', 'order__email']
+    readonly_fields = ['order', 'locked_until', 'last_error', 'sent_at', 'created_at', 'updated_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected emails now')
+    def retry_now(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} email(s) queued for retry')
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['user', 'key', 'status', 'response_status', 'locked_until', 'created_at', 'expires_at']
+    list_filter = ['status']
+    search_fields = ['key', 'user__username']
+    readonly_fields = ['user', 'key', 'request_hash', 'response_status', 'response_body', 'locked_until', 'created_at']
+
+
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'phone', 'created_at', 'is_read']
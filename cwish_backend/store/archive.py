@@ -0,0 +1,113 @@
+"""Lưu trữ đơn hàng đã xong: chuyển khỏi Order/OrderItem sang ``ArchivedOrder``.
+
+Order ``delivered``/``cancelled`` cũ hơn ``ORDER_ARCHIVE_AFTER_DAYS`` được chuyển theo
+từng batch (mỗi batch một transaction ngắn: đọc, INSERT vào bảng lưu trữ, DELETE khỏi
+bảng chính) bởi lệnh ``archive_orders``. Bảng Order/OrderItem vì vậy chỉ còn các đơn
+hàng đang xử lý. API và admin vẫn đọc được đơn đã lưu trữ (chỉ đọc), xem ``find_order``.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem
+
+# Trạng thái cuối, order không còn thay đổi (xem Order.TRANSITIONS)
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+
+ORDER_FIELDS = [
+    'id', 'user_id', 'total_amount', 'currency', 'status', 'email', 'first_name', 'last_name', 'address',
+    'city', 'country', 'postal_code', 'phone', 'print_position', 'personalization', 'shirtigo_order_id',
+    'shirtigo_status', 'shirtigo_synced_at', 'item_count', 'main_line_count', 'bonus_line_count', 'main_total',
+    'bonus_total', 'created_at', 'updated_at',
+]
+ITEM_FIELDS = [
+    'id', 'order_id', 'product_type', 'product_id', 'quantity', 'unit_price', 'total_price',
+    'print_position', 'personalization',
+]
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def archive_cutoff(days=None):
+    """Order tạo trước thời điểm này (và đã xong) được lưu trữ"""
+    days = days if days is not None else _setting('ORDER_ARCHIVE_AFTER_DAYS', 180)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_orders(cutoff):
+    """Order đã xong và cũ hơn ``cutoff`` (index store_order_status_created, không sort)"""
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, created_at__lt=cutoff).order_by()
+
+
+def _archived_items(order_ids):
+    items = defaultdict(list)
+    rows = (
+        OrderItem.objects.filter(order__in=order_ids)
+        .values(*ITEM_FIELDS, product_name=F('product__name'), product_image=F('product__image'))
+        .order_by('order_id', 'pk')
+    )
+    for row in rows:
+        row['product_image'] = row['product_image'] or None
+        items[row.pop('order_id')].append(row)
+    return items
+
+
+def archive_batch(cutoff, batch_size=None):
+    """Lưu trữ tối đa ``batch_size`` order trong một transaction. Trả về số order đã chuyển"""
+    batch_size = batch_size or _setting('ORDER_ARCHIVE_BATCH_SIZE', 500)
+    with transaction.atomic():
+        order_ids = list(archivable_orders(cutoff).values_list('pk', flat=True)[:batch_size])
+        if not order_ids:
+            return 0
+        items = _archived_items(order_ids)
+        # Payload Shirtigo đã nén được chép nguyên trạng (không giải nén)
+        rows = Order.objects.filter(pk__in=order_ids).values(
+            *ORDER_FIELDS, shirtigo_codec=F('provider_payload__codec'), shirtigo_payload=F('provider_payload__data'),
+        )
+        archived = []
+        for row in rows:
+            row['shirtigo_codec'] = row['shirtigo_codec'] or ''
+            archived.append(ArchivedOrder(items=items[row['id']], **row))
+        ArchivedOrder.objects.bulk_create(archived)
+        # Xóa cả order_items, payload, outbox và email đã gửi của các order này
+        Order.objects.filter(pk__in=order_ids).delete()
+    return len(order_ids)
+
+
+def archive_orders(days=None, batch_size=None, max_batches=None):
+    """Lưu trữ theo từng batch đến khi hết order đủ điều kiện. Trả về tổng số order"""
+    cutoff = archive_cutoff(days)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        archived += count
+        batches += 1
+    return archived
+
+
+def find_order(pk, user=None):
+    """Order theo pk ở bảng chính, nếu không có thì ở bảng lưu trữ (``ArchivedOrder``).
+
+    Trả về ``None`` nếu không tìm thấy hoặc pk không hợp lệ.
+    """
+    try:
+        pk = Order._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+    for model in (Order, ArchivedOrder):
+        queryset = model.objects.filter(pk=pk)
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        order = queryset.first()
+        if order is not None:
+            return order
+    return None
@@ -0,0 +1,169 @@
+"""Cache trong process cho sản phẩm đang active.
+
+Mỗi worker giữ một bản sao sản phẩm active trong bộ nhớ. Khi sản phẩm thay đổi,
+signal sẽ tăng "version" trong cache dùng chung (Django cache) để mọi worker
+biết bản sao của mình đã cũ và tải lại.
+
+Version chỉ đến được các worker khác khi cache là backend dùng chung (Redis,
+Memcached, DatabaseCache). Với LocMemCache (mặc định, riêng từng process) các worker
+khác không thấy version mới, nên mỗi bản sao (local và trong cache) chỉ được dùng
+tối đa ``ACTIVE_PRODUCT_CACHE_MAX_AGE`` giây kể từ lúc đọc từ DB.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+_MISSING = object()
+
+
+class ActiveProductResolver:
+    """Trả về sản phẩm active của một model, cache theo version.
+
+    - Fast path: so sánh version dùng chung với version local, không query DB.
+    - Khi version đổi: chỉ một thread trong process (lock local) và chỉ một
+      worker trong cụm (lock ``cache.add``) được tải lại từ DB; các worker khác
+      đọc bản đã được worker kia ghi vào cache dùng chung, hoặc tạm dùng bản cũ.
+    """
+
+    lock_timeout = 5
+    wait_interval = 0.05
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = _MISSING
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'ACTIVE_PRODUCT_CACHE_ALIAS', 'default')]
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'ACTIVE_PRODUCT_CACHE_CHECK_INTERVAL', 1.0)
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'ACTIVE_PRODUCT_CACHE_MAX_AGE', 60)
+
+    def _is_fresh(self, loaded_at):
+        return time.time() - loaded_at < self.max_age
+
+    @property
+    def version_key(self):
+        return f'store:active-product:{self.name}:version'
+
+    def _value_key(self, version):
+        return f'store:active-product:{self.name}:{version}'
+
+    @property
+    def _lock_key(self):
+        return f'store:active-product:{self.name}:lock'
+
+    def current_version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, 1, timeout=None)
+            version = self.cache.get(self.version_key, 1)
+        return version
+
+    def get(self):
+        """Trả về sản phẩm active (hoặc None nếu không có)."""
+        now = time.monotonic()
+        fresh = self._value is not _MISSING and self._is_fresh(self._loaded_at)
+        if fresh and now - self._checked_at < self.check_interval:
+            return self._value
+
+        version = self.current_version()
+        if fresh and self._version == version:
+            self._checked_at = now
+            return self._value
+
+        with self._lock:
+            # Thread khác có thể đã tải xong trong lúc chờ lock
+            if self._value is not _MISSING and self._version == version and self._is_fresh(self._loaded_at):
+                return self._value
+            loaded = self._load(version)
+            if loaded is _MISSING:
+                # Worker khác đang tải: tạm dùng bản cũ, giữ version cũ để lần sau đọc lại cache
+                return self._value
+            loaded_at, value = loaded
+            self._version = version
+            self._value = value
+            self._loaded_at = loaded_at
+            self._checked_at = time.monotonic()
+            return value
+
+    def _cached(self, version):
+        """``(loaded_at, value)`` trong cache dùng chung nếu còn hạn"""
+        cached = self.cache.get(self._value_key(version), _MISSING)
+        if cached is not _MISSING and self._is_fresh(cached[0]):
+            return cached
+        return _MISSING
+
+    def _load(self, version):
+        """Trả về ``(loaded_at, value)`` (``loaded_at`` là lúc đọc từ DB, time.time), hoặc
+        ``_MISSING`` khi worker khác đang tải và process này còn bản cũ để dùng tạm"""
+        cached = self._cached(version)
+        if cached is not _MISSING:
+            return cached
+
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(self._lock_key, version, timeout=self.lock_timeout):
+            # Worker khác đang tải: dùng tạm bản cũ nếu có, nếu không thì chờ
+            if self._value is not _MISSING:
+                return _MISSING
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(self.wait_interval)
+            cached = self._cached(version)
+            if cached is not _MISSING:
+                return cached
+
+        try:
+            loaded = (time.time(), self.loader())
+            self.cache.set(self._value_key(version), loaded, timeout=self.max_age)
+            return loaded
+        finally:
+            self.cache.delete(self._lock_key)
+
+    def invalidate(self):
+        """Tăng version dùng chung và xóa bản local của process hiện tại."""
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.add(self.version_key, 2, timeout=None)
+        with self._lock:
+            self._value = _MISSING
+            self._version = None
+            self._checked_at = 0.0
+            self._loaded_at = 0.0
+
+
+def _load_active_product():
+    from .models import SingleProduct
+    return SingleProduct.objects.filter(is_active=True).first()
+
+
+def _load_active_bonus_product():
+    from .models import DigitalBonusProduct
+    return DigitalBonusProduct.objects.filter(is_active=True).first()
+
+
+active_product = ActiveProductResolver('single', _load_active_product)
+active_bonus_product = ActiveProductResolver('bonus', _load_active_bonus_product)
+
+
+def get_active_product():
+    """Sản phẩm chính đang active (website 1 sản phẩm)"""
+    return active_product.get()
+
+
+def get_active_bonus_product():
+    """Sản phẩm bonus đang active"""
+    return active_bonus_product.get()
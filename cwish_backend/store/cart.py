@@ -0,0 +1,221 @@
+"""Các thao tác trên giỏ hàng (bảng CartLine chung cho sản phẩm chính và bonus)."""
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CartLine, CartVersion
+
+PRODUCT_TYPES = ('single', 'bonus')
+
+
+def cart_lines(user, product_type=None):
+    """Các dòng giỏ hàng của user, kèm sản phẩm (một query)"""
+    queryset = CartLine.objects.filter(user=user).select_related('product')
+    if product_type:
+        queryset = queryset.filter(product_type=product_type)
+    return queryset
+
+
+def cart_summary(user, product_types=PRODUCT_TYPES):
+    """Các dòng giỏ hàng và tổng tiền/số lượng theo loại trong cùng một query.
+
+    Tổng được tính bằng window function (``SUM() OVER (PARTITION BY product_type)``)
+    nên số query không phụ thuộc số dòng. Trả về ``(lines, totals)`` với
+    ``totals['<type>_total']`` và ``totals['<type>_count']``.
+    """
+    money = DecimalField(max_digits=12, decimal_places=2)
+    by_type = [F('product_type')]
+    lines = list(
+        cart_lines(user)
+        .filter(product_type__in=product_types)
+        # Cùng thứ tự với partition và index store_cartline_user_type: không cần sort
+        .order_by('product_type', 'id')
+        .annotate(line_total=ExpressionWrapper(F('quantity') * F('product__price'), output_field=money))
+        .annotate(
+            type_total=Window(Sum('line_total'), partition_by=by_type, output_field=money),
+            type_count=Window(Sum('quantity'), partition_by=by_type, output_field=IntegerField()),
+        )
+    )
+
+    totals = {}
+    for product_type in product_types:
+        totals[f'{product_type}_total'] = Decimal('0')
+        totals[f'{product_type}_count'] = 0
+    for line in lines:
+        totals[f'{line.product_type}_total'] = line.type_total
+        totals[f'{line.product_type}_count'] = line.type_count
+    return lines, totals
+
+
+def cart_totals(user, product_types=PRODUCT_TYPES):
+    """Chỉ tổng tiền/số lượng theo loại (một query aggregate, không load các dòng)"""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    aggregates = {}
+    for product_type in product_types:
+        only_type = Q(product_type=product_type)
+        aggregates[f'{product_type}_total'] = Coalesce(
+            Sum(F('quantity') * F('product__price'), filter=only_type, output_field=money),
+            Value(Decimal('0')), output_field=money,
+        )
+        aggregates[f'{product_type}_count'] = Coalesce(
+            Sum('quantity', filter=only_type), Value(0), output_field=IntegerField(),
+        )
+    return CartLine.objects.filter(user=user).aggregate(**aggregates)
+
+
+def cart_version(user):
+    """Version hiện tại của giỏ hàng (0 nếu chưa từng thay đổi)"""
+    return CartVersion.objects.filter(user=user).values_list('version', flat=True).first() or 0
+
+
+def bump_cart_version(user):
+    """Tăng version giỏ hàng và trả về giá trị mới.
+
+    Gọi trong cùng transaction với thay đổi giỏ hàng: UPDATE giữ lock dòng version
+    nên các request đồng thời nhận các version khác nhau, tăng dần.
+    """
+    with transaction.atomic():
+        versions = CartVersion.objects.filter(user=user)
+        if not versions.update(version=F('version') + 1, updated_at=timezone.now()):
+            try:
+                with transaction.atomic():
+                    CartVersion.objects.create(user=user, version=1)
+                    return 1
+            except IntegrityError:
+                versions.update(version=F('version') + 1, updated_at=timezone.now())
+        return versions.values_list('version', flat=True).get()
+
+
+UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+def _upsert_line(user, product, quantity, print_position, personalization):
+    """Một câu INSERT ... ON CONFLICT: tạo dòng mới hoặc cộng dồn số lượng ngay trong DB"""
+    table = connection.ops.quote_name(CartLine._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    sql = (
+        f"INSERT INTO {table} "
+        "(user_id, product_id, product_type, quantity, print_position, personalization, created_at, updated_at) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+        "ON CONFLICT (user_id, product_id) DO UPDATE SET "
+        f"quantity = {table}.quantity + excluded.quantity, "
+        f"print_position = COALESCE(NULLIF(excluded.print_position, ''), {table}.print_position), "
+        f"personalization = COALESCE(NULLIF(excluded.personalization, ''), {table}.personalization), "
+        "updated_at = excluded.updated_at"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            user.pk, product.pk, product.product_type, quantity,
+            print_position or '', personalization or '', now, now,
+        ])
+
+
+def _increment_line(user, product, quantity, print_position, personalization):
+    """Backend không có ON CONFLICT: UPDATE với F(), INSERT nếu chưa có dòng"""
+    changes = {'quantity': F('quantity') + quantity, 'updated_at': timezone.now()}
+    if print_position:  # Chỉ cập nhật nếu có print position mới
+        changes['print_position'] = print_position
+    if personalization:  # Chỉ cập nhật nếu có personalization mới
+        changes['personalization'] = personalization
+
+    lines = CartLine.objects.filter(user=user, product=product)
+    if lines.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            CartLine.objects.create(
+                user=user, product=product, product_type=product.product_type, quantity=quantity,
+                print_position=print_position, personalization=personalization,
+            )
+    except IntegrityError:
+        # Request khác vừa tạo dòng này - cộng dồn vào dòng đó
+        lines.update(**changes)
+
+
+def add_line(user, product, quantity, print_position='', personalization=''):
+    """Thêm sản phẩm vào giỏ hàng (cộng dồn nếu đã có) bằng một câu lệnh atomic.
+
+    Không đọc-sửa-ghi trong Python nên các request đồng thời của cùng một user
+    (double click, nhiều tab) không làm mất số lượng.
+    """
+    if connection.vendor in UPSERT_VENDORS:
+        _upsert_line(user, product, quantity, print_position, personalization)
+    else:
+        _increment_line(user, product, quantity, print_position, personalization)
+
+
+def set_line_quantity(user, product, quantity):
+    """Đặt số lượng cho một dòng (0 = xóa). Trả về False nếu dòng không tồn tại"""
+    lines = CartLine.objects.filter(user=user, product=product)
+    if quantity == 0:
+        return lines.delete()[0] > 0
+    return lines.update(quantity=quantity, updated_at=timezone.now()) > 0
+
+
+def set_line_options(user, product, **options):
+    """Cập nhật print position / personalization của một dòng. Trả về False nếu dòng không tồn tại"""
+    return CartLine.objects.filter(user=user, product=product).update(updated_at=timezone.now(), **options) > 0
+
+
+class CartOperationError(Exception):
+    """Một thao tác trong batch không áp dụng được (toàn bộ batch bị rollback)"""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+def apply_operations(user, operations, get_product):
+    """Áp dụng lần lượt các thao tác giỏ hàng trong một transaction.
+
+    ``get_product(product_type)`` trả về sản phẩm active của loại đó. Lỗi ở bất kỳ
+    thao tác nào sẽ rollback cả batch và raise ``CartOperationError``. Trả về id
+    các sản phẩm có dòng bị thay đổi.
+    """
+    touched = set()
+    with transaction.atomic():
+        for index, operation in enumerate(operations):
+            op = operation['op']
+            product_type = operation.get('product_type')
+            if op == 'clear':
+                touched.update(clear_lines(user, product_type))
+                continue
+
+            product = get_product(product_type)
+            if product is None:
+                raise CartOperationError(index, f'No active {product_type} product available')
+
+            options = {
+                field: operation[field] for field in ('print_position', 'personalization') if field in operation
+            }
+            if op == 'add':
+                add_line(user, product, operation['quantity'], **options)
+                found = True
+            elif op == 'set_quantity':
+                found = set_line_quantity(user, product, operation['quantity'])
+            elif op == 'remove':
+                # Xóa dòng không tồn tại cũng coi như thành công
+                if set_line_quantity(user, product, 0):
+                    touched.add(product.pk)
+                continue
+            else:  # set_options
+                found = set_line_options(user, product, **options)
+            if not found:
+                raise CartOperationError(index, f'No {product_type} item in cart')
+            touched.add(product.pk)
+    return touched
+
+
+def clear_lines(user, product_type=None):
+    """Xóa các dòng giỏ hàng (theo loại nếu có). Trả về id các sản phẩm đã xóa"""
+    lines = CartLine.objects.filter(user=user)
+    if product_type:
+        lines = lines.filter(product_type=product_type)
+    product_ids = list(lines.values_list('product_id', flat=True))
+    if product_ids:
+        CartLine.objects.filter(user=user, product_id__in=product_ids).delete()
+    return product_ids
@@ -0,0 +1,65 @@
+"""Conditional GET (ETag / Last-Modified / 304) cho các ViewSet.
+
+Validator được tính từ ``updated_at`` và số dòng bằng một query nhỏ, trước khi
+serialize, để request lặp lại nhận 304 mà không tốn công encode JSON.
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+PUBLIC_CACHE_CONTROL = {'public': True, 'no_cache': True}
+PRIVATE_CACHE_CONTROL = {'private': True, 'no_cache': True}
+
+
+def make_etag(*parts):
+    """Tạo ETag (weak) từ các thành phần version"""
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def latest(*timestamps):
+    """Trả về timestamp mới nhất (bỏ qua None)"""
+    values = [ts for ts in timestamps if ts is not None]
+    return max(values) if values else None
+
+
+def conditional_get(validator, private=True):
+    """Decorator cho method của ViewSet.
+
+    ``validator(self, request, *args, **kwargs)`` trả về ``(etag, last_modified)``
+    hoặc ``None`` khi không có gì để so sánh (view chạy bình thường).
+    """
+    cache_control = PRIVATE_CACHE_CONTROL if private else PUBLIC_CACHE_CONTROL
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_method(self, request, *args, **kwargs)
+
+            validators = validator(self, request, *args, **kwargs)
+            etag, last_modified = validators if validators else (None, None)
+            if etag is not None:
+                etag = quote_etag(etag)
+            last_modified_ts = timegm(last_modified.utctimetuple()) if last_modified else None
+
+            response = None
+            if etag or last_modified_ts:
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                if etag and not response.has_header('ETag'):
+                    response['ETag'] = etag
+                if last_modified_ts and not response.has_header('Last-Modified'):
+                    response['Last-Modified'] = http_date(last_modified_ts)
+                patch_cache_control(response, **cache_control)
+                if private:
+                    patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,225 @@
+"""Email xác nhận đơn hàng: hàng đợi trong DB và sender chạy nền.
+
+Checkout chỉ ghi một dòng ``QueuedEmail`` (cùng transaction với order). Lệnh
+``send_queued_emails`` lấy các email đến hạn theo batch, gửi tất cả qua một kết
+nối SMTP (``get_connection()`` mở một lần cho cả batch), giới hạn số email mỗi
+phút và thử lại lỗi tạm thời với backoff.
+
+Nội dung email gồm phần shell tĩnh (render một lần, cache trong process) và phần
+nội dung của từng order, dựng từ dict giá trị thay vì ``OrderItemSerializer``.
+Năm ở footer được điền lúc gửi, không nằm trong shell đã cache.
+"""
+import smtplib
+import time
+from collections import Counter
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .images import pick_variant_url
+from .models import QueuedEmail
+from .outbox import backoff_delay
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+SHELL_TEMPLATE = 'emails/order_confirmation_shell.html'
+BODY_TEMPLATE = 'emails/order_confirmation_body.html'
+CONTENT_MARKER = '<!-- ORDER_CONTENT -->'
+# Chỗ điền năm ở footer (không có ký tự bị autoescape)
+YEAR_MARKER = '__EMAIL_YEAR__'
+# Ảnh trong email hiển thị 60x60, lấy bản đủ nét cho màn hình retina
+EMAIL_IMAGE_WIDTH = 160
+
+
+@lru_cache(maxsize=None)
+def email_shell():
+    """Phần tĩnh (layout, CSS, header/footer) đã render, tách tại chỗ chèn nội dung order.
+
+    Không phụ thuộc order nên chỉ render một lần mỗi process (mỗi lần deploy). Năm
+    được để là ``YEAR_MARKER`` và điền khi render từng email.
+    """
+    html = render_to_string(SHELL_TEMPLATE, {'site_url': settings.SITE_URL, 'year': YEAR_MARKER})
+    head, tail = html.split(CONTENT_MARKER, 1)
+    return head, tail
+
+
+def order_email_items(order):
+    """Dữ liệu các dòng order cho email: một query ``values()``, không qua serializer/model"""
+    rows = order.order_items.order_by('created_at', 'pk').values(
+        'product_type', 'quantity', 'unit_price', 'total_price', 'print_position', 'personalization',
+        'product__name', 'product__description', 'product__image', 'product__image_variants',
+    )
+    items = []
+    for row in rows:
+        image = pick_variant_url(row['product__image_variants'], EMAIL_IMAGE_WIDTH)
+        if not image and row['product__image']:
+            image = f"{settings.SITE_URL}{default_storage.url(row['product__image'])}"
+        single = row['product_type'] == 'single'
+        items.append({
+            'name': row['product__name'] or 'Unknown Product',
+            'image': image,
+            'description': Truncator(row['product__description'] or '').chars(80),
+            'print_position': row['print_position'] if single else None,
+            'personalization': row['personalization'] if single else None,
+            'quantity': row['quantity'],
+            'unit_price': row['unit_price'],
+            'total_price': row['total_price'],
+        })
+    return items
+
+
+def render_order_confirmation(order):
+    """HTML email xác nhận đơn hàng: shell đã cache + phần nội dung của order"""
+    year = str(timezone.now().year)
+    head, tail = (part.replace(YEAR_MARKER, year) for part in email_shell())
+    body = render_to_string(BODY_TEMPLATE, {'order': order, 'order_items': order_email_items(order)})
+    return f'{head}{body}{tail}'
+
+
+def build_order_confirmation(order, connection=None):
+    """Tạo EmailMessage xác nhận đơn hàng (HTML)"""
+    email = EmailMessage(
+        subject=f'Order Confirmation - Order #{order.id} - Cwish Store',
+        body=render_order_confirmation(order),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[order.email],
+        connection=connection,
+    )
+    email.content_subtype = 'html'  # Đánh dấu đây là HTML email
+    return email
+
+
+def enqueue_order_confirmation(order):
+    """Đưa email xác nhận vào hàng đợi (gọi trong transaction tạo order)"""
+    return QueuedEmail.objects.create(order=order, kind='order_confirmation')
+
+
+BUILDERS = {
+    'order_confirmation': build_order_confirmation,
+}
+
+
+class RateLimiter:
+    """Giãn cách các lần gửi để không vượt quá ``per_minute`` email mỗi phút"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_slot = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self._next_slot:
+            time.sleep(self._next_slot - now)
+            now = self._next_slot
+        self._next_slot = now + self.interval
+
+
+def _due(now):
+    return Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', locked_until__lt=now)
+
+
+def claim_batch(limit):
+    """Giữ các email đến hạn bằng UPDATE có điều kiện (an toàn khi chạy nhiều sender)"""
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=_setting('EMAIL_QUEUE_LEASE', 300))
+    candidates = list(
+        QueuedEmail.objects.filter(_due(now)).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+    )
+    return [
+        pk for pk in candidates
+        if QueuedEmail.objects.filter(_due(now), pk=pk).update(
+            status='sending', locked_until=locked_until, updated_at=now,
+        )
+    ]
+
+
+def _mark_failed(entry, error, permanent=False):
+    """Lỗi tạm thời: hẹn gửi lại; quá số lần hoặc lỗi vĩnh viễn: failed"""
+    now = timezone.now()
+    attempts = entry.attempts + 1
+    if permanent or attempts >= _setting('EMAIL_QUEUE_MAX_ATTEMPTS', 5):
+        QueuedEmail.objects.filter(pk=entry.pk).update(
+            status='failed', attempts=attempts, locked_until=None, last_error=str(error)[:1000], updated_at=now,
+        )
+        print(f"❌ Email {entry.pk} ({entry.kind}) failed after {attempts} attempt(s): {error}")
+        return 'failed'
+
+    delay = backoff_delay(
+        attempts,
+        base=_setting('EMAIL_QUEUE_BACKOFF_BASE', 60),
+        cap=_setting('EMAIL_QUEUE_BACKOFF_MAX', 3600),
+    )
+    QueuedEmail.objects.filter(pk=entry.pk).update(
+        status='pending', attempts=attempts, next_attempt_at=now + delay,
+        locked_until=None, last_error=str(error)[:1000], updated_at=now,
+    )
+    print(f"⚠️ Email {entry.pk} ({entry.kind}) attempt {attempts} failed, will retry: {error}")
+    return 'retry'
+
+
+def _send_one(entry, connection):
+    try:
+        message = BUILDERS[entry.kind](entry.order, connection=connection)
+    except Exception as e:
+        # Lỗi template/dữ liệu: gửi lại cũng không được
+        return _mark_failed(entry, e, permanent=True)
+
+    try:
+        try:
+            sent = message.send()
+        except smtplib.SMTPServerDisconnected:
+            # Server đóng kết nối giữa batch: mở lại một lần rồi gửi tiếp
+            connection.close()
+            connection.open()
+            sent = message.send()
+    except smtplib.SMTPRecipientsRefused as e:
+        return _mark_failed(entry, e, permanent=True)
+    except (smtplib.SMTPException, OSError) as e:
+        return _mark_failed(entry, e)
+
+    if not sent:
+        return _mark_failed(entry, 'Email backend reported 0 messages sent')
+    QueuedEmail.objects.filter(pk=entry.pk).update(
+        status='sent', attempts=F('attempts') + 1, sent_at=timezone.now(),
+        locked_until=None, last_error='', updated_at=timezone.now(),
+    )
+    print(f"✅ Email {entry.pk} ({entry.kind}) sent to {entry.order.email}")
+    return 'sent'
+
+
+def send_batch(batch_size=None, limiter=None):
+    """Gửi một batch email đến hạn qua một kết nối SMTP.
+
+    Trả về Counter kết quả ({'sent': n, 'retry': n, 'failed': n}); rỗng khi hàng đợi trống.
+    """
+    limiter = limiter or RateLimiter(_setting('EMAIL_QUEUE_RATE_PER_MINUTE', 20))
+    claimed = claim_batch(batch_size or _setting('EMAIL_QUEUE_BATCH_SIZE', 50))
+    if not claimed:
+        return Counter()
+
+    entries = list(QueuedEmail.objects.filter(pk__in=claimed).select_related('order').order_by('next_attempt_at'))
+    connection = get_connection()
+    try:
+        connection.open()
+    except (smtplib.SMTPException, OSError) as e:
+        # Không kết nối được SMTP: cả batch thử lại sau
+        return Counter(_mark_failed(entry, e) for entry in entries)
+
+    results = Counter()
+    try:
+        for entry in entries:
+            limiter.wait()
+            results[_send_one(entry, connection)] += 1
+    finally:
+        connection.close()
+    return results
@@ -0,0 +1,136 @@
+"""Export đơn hàng (CSV / NDJSON) dạng stream cho fulfillment và kế toán.
+
+Đơn hàng được đọc theo từng trang keyset trên ``(updated_at, id)`` (index
+store_order_updated / store_archorder_updated), mỗi trang đọc bằng ``.iterator()`` và
+các item của trang trong một query, rồi trả về từng khối text. Bộ nhớ chỉ phụ thuộc
+``chunk_size``, không phụ thuộc số đơn hàng.
+
+Export tăng dần: ``since`` (không bao gồm) và ``until`` (bao gồm) lọc theo
+``updated_at``; lần sau dùng ``until`` của lần trước làm ``since``. ``until`` mặc định
+là ``watermark()``: lúc bắt đầu export lùi ``ORDER_EXPORT_SAFETY_LAG`` giây, để
+transaction đã ghi ``updated_at`` nhưng chưa commit khi export đọc qua không bị bỏ sót
+(lag phải dài hơn transaction dài nhất). Một order được export lại mỗi lần nó thay đổi,
+nên bên nhận phải ghi đè theo ``id``.
+Đơn đã lưu trữ (``ArchivedOrder``) được export sau các đơn trong bảng chính.
+"""
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+COLUMNS = [
+    'id', 'created_at', 'updated_at', 'status', 'user_id', 'email', 'first_name', 'last_name', 'phone',
+    'address', 'city', 'postal_code', 'country', 'currency', 'item_count', 'main_total', 'bonus_total',
+    'total_amount', 'shirtigo_order_id', 'shirtigo_status',
+]
+ITEM_COLUMNS = [
+    'product_type', 'product_id', 'product_name', 'quantity', 'unit_price', 'total_price',
+    'print_position', 'personalization',
+]
+
+
+def watermark(now=None):
+    """``until`` an toàn cho export bắt đầu lúc ``now``: lùi ``ORDER_EXPORT_SAFETY_LAG`` giây"""
+    lag = getattr(settings, 'ORDER_EXPORT_SAFETY_LAG', 30)
+    return (now or timezone.now()) - timedelta(seconds=lag)
+
+
+def _order_pages(model, since, until, chunk_size):
+    """Các trang (list dict) của ``model`` theo thứ tự (updated_at, id)"""
+    queryset = model.objects.filter(updated_at__lte=until).order_by('updated_at', 'id')
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    columns = COLUMNS + (['items'] if model is ArchivedOrder else [])
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            # (updated_at, id) > last, viết dạng range trên updated_at để SQLite quét index theo thứ tự
+            page = page.filter(updated_at__gte=last[0]).exclude(updated_at=last[0], id__lte=last[1])
+        rows = list(page.values(*columns)[:chunk_size].iterator(chunk_size=chunk_size))
+        if not rows:
+            return
+        yield rows
+        last = rows[-1]['updated_at'], rows[-1]['id']
+
+
+def _attach_items(rows):
+    """Gắn ``items`` cho một trang order trong bảng chính (một query)"""
+    items = defaultdict(list)
+    queryset = (
+        OrderItem.objects.filter(order__in=[row['id'] for row in rows])
+        .values('order_id', *[c for c in ITEM_COLUMNS if c != 'product_name'], product_name=F('product__name'))
+        .order_by('order_id', 'pk')
+    )
+    for item in queryset.iterator():
+        items[item.pop('order_id')].append(item)
+    for row in rows:
+        row['items'] = items[row['id']]
+
+
+def iter_orders(since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Các trang order (dict có ``items`` và ``archived``) cần export"""
+    until = until or watermark()
+    for model in (Order, ArchivedOrder):
+        for rows in _order_pages(model, since, until, chunk_size):
+            if model is Order:
+                _attach_items(rows)
+            for row in rows:
+                row['items'] = [{column: item.get(column) for column in ITEM_COLUMNS} for item in row['items']]
+                row['archived'] = model is ArchivedOrder
+            yield rows
+
+
+def _items_summary(items):
+    """Cột ``items`` trong CSV: ``2 x Tee (Front); 1 x Bonus``"""
+    parts = []
+    for item in items:
+        part = f"{item['quantity']} x {item['product_name']}"
+        if item['print_position']:
+            part += f" ({item['print_position']})"
+        parts.append(part)
+    return '; '.join(parts)
+
+
+def _csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_chunks(pages):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS + ['archived', 'items'])
+    yield buffer.getvalue()
+    for rows in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow(
+                [_csv_value(row[column]) for column in COLUMNS] + [int(row['archived']), _items_summary(row['items'])]
+            )
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(pages):
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for rows in pages:
+        yield ''.join(encoder.encode(row) + '\n' for row in rows)
+
+
+def export_chunks(output='csv', since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Các khối text của file export (mỗi khối một trang ``chunk_size`` order)"""
+    pages = iter_orders(since, until, chunk_size)
+    return csv_chunks(pages) if output == 'csv' else ndjson_chunks(pages)
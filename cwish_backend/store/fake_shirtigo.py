@@ -0,0 +1,109 @@
+"""Server Shirtigo giả để chạy thử / load test không cần mạng.
+
+Nhận ``POST .../orders`` giống Shirtigo API và trả về ``{"id": "FAKE-<n>"}``. Có thể
+cấu hình độ trễ (``latency`` + ``jitter`` giây), tỉ lệ lỗi 503 (``error_rate``) và
+giới hạn số request mỗi giây (``rate_limit``, vượt quá trả về 429 kèm
+``Retry-After``). Trỏ ``SHIRTIGO_API_URL`` đến ``http://127.0.0.1:<port>/api``.
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TokenBucket:
+    """Cho phép trung bình ``rate`` request mỗi giây, tối đa ``burst`` request dồn"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class FakeShirtigoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive như API thật
+
+    def _reply(self, status_code, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        self.server.stats[status_code] += 1
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('/orders'):
+            return self._reply(404, {'message': 'Not found'})
+        if server.token and self.headers.get('Authorization') != f'Bearer {server.token}':
+            return self._reply(401, {'message': 'Unauthenticated.'})
+        if server.bucket and not server.bucket.take():
+            return self._reply(429, {'message': 'Too Many Attempts.'}, {'Retry-After': '1'})
+
+        delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and random.random() < server.error_rate:
+            return self._reply(503, {'message': 'Service Unavailable'})
+
+        try:
+            order = json.loads(body or b'{}')
+        except ValueError:
+            return self._reply(422, {'message': 'Invalid JSON'})
+        with server.lock:
+            server.sequence += 1
+            order_id = f'FAKE-{server.sequence}'
+        self._reply(201, {'id': order_id, 'status': 'pending', 'products': order.get('products', [])})
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            super().log_message(*args)
+
+
+class FakeShirtigoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit=0, token=None, verbose=False):
+        super().__init__(address, FakeShirtigoHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.token = token
+        self.verbose = verbose
+        self.stats = Counter()
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api'
+
+    def start(self):
+        """Chạy server trong thread nền (dùng trong test / load test)"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
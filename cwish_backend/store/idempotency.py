@@ -0,0 +1,190 @@
+"""Idempotency-Key cho các request POST (tạo đơn hàng).
+
+Request đầu tiên với một key ghi một dòng ``IdempotencyKey`` (in_progress) rồi chạy
+view; response được lưu lại. Request lặp lại cùng key nhận lại response đã lưu
+bằng một lookup theo index ``(user, key)`` mà không chạy lại view. Request trùng
+đến khi request đầu còn đang chạy sẽ chờ (unique constraint đóng vai trò lock)
+thay vì tạo đơn thứ hai.
+
+Key in_progress chỉ được giữ đến ``locked_until`` (``IDEMPOTENCY_LOCK_TIMEOUT``). Nếu
+request đầu bị bỏ dở (worker bị kill, timeout) thì request lặp lại cùng body lấy lại
+key bằng một UPDATE có điều kiện và chạy view, thay vì nhận 409 đến khi key hết hạn.
+
+View và việc đánh dấu key completed chạy trong cùng một transaction: order chỉ được
+commit cùng response đã lưu, nên request lấy lại key không thể tạo order thứ hai.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def request_fingerprint(request):
+    """Hash của method + path + body (JSON được chuẩn hóa thứ tự key)"""
+    try:
+        body = json.dumps(request.data, sort_keys=True, cls=JSONEncoder)
+    except (TypeError, ValueError):
+        body = repr(request.data)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def _replay(record, fingerprint):
+    if record.request_hash != fingerprint:
+        return Response(
+            {'error': f'{HEADER} was already used with a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _lock_until(now):
+    return now + timedelta(seconds=_setting('IDEMPOTENCY_LOCK_TIMEOUT', 120))
+
+
+def _is_abandoned(record, now):
+    """Key in_progress mà request giữ nó đã quá hạn (dòng cũ không có hạn cũng tính)"""
+    return record.status == 'in_progress' and (record.locked_until is None or record.locked_until <= now)
+
+
+def _claim(user, key, fingerprint):
+    """Tạo dòng in_progress. Trả về None nếu key đã tồn tại"""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, key=key, request_hash=fingerprint, locked_until=_lock_until(now),
+                expires_at=now + timedelta(seconds=_setting('IDEMPOTENCY_KEY_TTL', 86400)),
+            )
+    except IntegrityError:
+        return None
+
+
+def _take_over(record, fingerprint):
+    """Lấy lại key bị bỏ dở (cùng body). Trả về None nếu request khác đã lấy trước"""
+    now = timezone.now()
+    locked_until = _lock_until(now)
+    updated = IdempotencyKey.objects.filter(
+        Q(locked_until__lte=now) | Q(locked_until__isnull=True),
+        pk=record.pk, status='in_progress', request_hash=fingerprint,
+    ).update(locked_until=locked_until)
+    if not updated:
+        return None
+    record.locked_until = locked_until
+    return record
+
+
+def _mine(claimed):
+    """Dòng key vẫn do request này giữ (chưa bị request khác lấy lại)"""
+    return IdempotencyKey.objects.filter(pk=claimed.pk, locked_until=claimed.locked_until)
+
+
+def _wait_for(user, key):
+    """Chờ request đang chạy với cùng key xong, bị bỏ dở (hết hạn giữ), hoặc hết thời gian chờ"""
+    deadline = time.monotonic() + _setting('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+    while True:
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if (record is None or record.status == 'completed' or _is_abandoned(record, timezone.now())
+                or time.monotonic() >= deadline):
+            return record
+        time.sleep(0.1)
+
+
+def idempotent(view_method):
+    """Decorator cho method POST của ViewSet: bật khi request có header ``Idempotency-Key``"""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        now = timezone.now()
+        record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if record is not None and record.expires_at <= now:
+            # Key hết hạn nhưng chưa bị purge: coi như chưa dùng
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at__lte=now).delete()
+            record = None
+        if record is not None and record.status == 'completed':
+            return _replay(record, fingerprint)
+
+        if record is None:
+            claimed = _claim(request.user, key, fingerprint)
+        elif _is_abandoned(record, now):
+            claimed = _take_over(record, fingerprint)
+        else:
+            claimed = None
+        if claimed is None:
+            # Request khác với cùng key đang chạy: chờ kết quả của nó
+            record = _wait_for(request.user, key)
+            if record is not None and record.status == 'completed':
+                return _replay(record, fingerprint)
+            if record is not None and _is_abandoned(record, timezone.now()):
+                claimed = _take_over(record, fingerprint)
+                if claimed is None and record.request_hash != fingerprint:
+                    return _replay(record, fingerprint)  # 422: key đã dùng với body khác
+        if claimed is None:
+            return Response(
+                {'error': f'A request with this {HEADER} is still in progress'},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    # Lỗi server: hủy thay đổi của view, cho phép client thử lại với cùng key
+                    transaction.set_rollback(True)
+                elif _mine(claimed).update(
+                    status='completed',
+                    locked_until=None,
+                    response_status=response.status_code,
+                    response_body=json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                ):
+                    return response
+                else:
+                    # Hết hạn giữ và request khác đã lấy lại key: hủy order của request này
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': f'A request with this {HEADER} is still in progress'},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+        except Exception:
+            _mine(claimed).delete()
+            raise
+        _mine(claimed).delete()
+        return response
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """Xóa các key hết hạn theo batch (tránh một DELETE lớn khóa bảng). Trả về số dòng đã xóa"""
+    deleted = 0
+    while True:
+        pks = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,164 @@
+"""Tạo ảnh derivative (resize + nén lại) cho ảnh sản phẩm.
+
+Mỗi ảnh gốc được resize theo ``PRODUCT_IMAGE_WIDTHS`` và encode WebP + JPEG
+trong một process pool. Tên file derivative chứa hash nội dung nên có thể cache
+vĩnh viễn (``Cache-Control: immutable``) ở web server/CDN.
+
+Kết quả được lưu trong field ``image_variants`` của sản phẩm::
+
+    {"name": "<tên file gốc>", "source": "<sha256 ảnh gốc>",
+     "webp": {"320": "product/derivatives/<hash>-320w.webp", ...},
+     "jpeg": {"320": "product/derivatives/<hash>-320w.jpg", ...}}
+"""
+import hashlib
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _get_executor():
+    """Process pool dùng chung cho cả process (tạo khi cần)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=_setting('PRODUCT_IMAGE_WORKERS', 2))
+        return _executor
+
+
+def render_derivative(job):
+    """Resize và encode một ảnh. Chạy trong process con nên chỉ nhận/trả bytes."""
+    from PIL import Image, ImageOps
+
+    source, width, fmt, quality = job
+    pil_format, _ = FORMATS[fmt]
+    with Image.open(io.BytesIO(source)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            height = round(img.height * width / img.width)
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+
+        if fmt == 'jpeg' and img.mode != 'RGB':
+            # JPEG không có alpha: đặt ảnh lên nền trắng
+            rgba = img.convert('RGBA')
+            background = Image.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.split()[-1])
+            img = background
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+
+        out = io.BytesIO()
+        options = {'quality': quality, 'optimize': True}
+        if fmt == 'jpeg':
+            options['progressive'] = True
+        else:
+            options['method'] = 6
+        img.save(out, pil_format, **options)
+        return out.getvalue()
+
+
+def _target_widths(source):
+    from PIL import Image
+
+    with Image.open(io.BytesIO(source)) as img:
+        original_width = img.width
+    configured = _setting('PRODUCT_IMAGE_WIDTHS', [160, 320, 640, 1024])
+    widths = [w for w in configured if w < original_width]
+    # Luôn có ít nhất một bản kích thước gốc (đã nén lại)
+    widths.append(min(original_width, max(configured)))
+    return sorted(set(widths))
+
+
+def build_variants(image_field):
+    """Tạo derivative cho một ImageField, trả về dict ``image_variants``"""
+    image_field.open('rb')
+    try:
+        source = image_field.read()
+    finally:
+        image_field.close()
+
+    jobs = [
+        (source, width, fmt, _setting('PRODUCT_IMAGE_QUALITY', 80))
+        for width in _target_widths(source)
+        for fmt in FORMATS
+    ]
+    if _setting('PRODUCT_IMAGE_WORKERS', 2) > 0:
+        results = list(_get_executor().map(render_derivative, jobs))
+    else:
+        results = [render_derivative(job) for job in jobs]
+
+    variants = {'source': hashlib.sha256(source).hexdigest()}
+    for (_, width, fmt, _), content in zip(jobs, results):
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        name = f"product/derivatives/{digest}-{width}w.{FORMATS[fmt][1]}"
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        variants.setdefault(fmt, {})[str(width)] = name
+    return variants
+
+
+def update_product_variants(product, force=False):
+    """Tạo lại derivative cho sản phẩm nếu ảnh gốc đã thay đổi"""
+    if not product.image:
+        if product.image_variants:
+            product.image_variants = {}
+            product.save(update_fields=['image_variants', 'updated_at'])
+        return False
+
+    if not force and product.image_variants.get('name') == product.image.name:
+        return False
+
+    try:
+        variants = build_variants(product.image)
+    except Exception as e:
+        print(f"❌ Error building image derivatives for {product}: {e}")
+        return False
+
+    variants['name'] = product.image.name
+    product.image_variants = variants
+    product.save(update_fields=['image_variants', 'updated_at'])
+    return True
+
+
+def _absolute(url, request=None):
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return f"{settings.SITE_URL}{url}"
+
+
+def srcset_map(variants, request=None):
+    """Trả về {'webp': 'url 320w, url 640w', 'jpeg': ...} cho thuộc tính srcset"""
+    result = {}
+    for fmt in FORMATS:
+        sizes = (variants or {}).get(fmt)
+        if sizes:
+            result[fmt] = ', '.join(
+                f"{_absolute(default_storage.url(name), request)} {width}w"
+                for width, name in sorted(sizes.items(), key=lambda kv: int(kv[0]))
+            )
+    return result
+
+
+def pick_variant_url(variants, width, fmt='jpeg', request=None):
+    """URL derivative nhỏ nhất có chiều rộng >= width (hoặc lớn nhất nếu không có)"""
+    sizes = (variants or {}).get(fmt)
+    if not sizes:
+        return None
+    ordered = sorted(sizes.items(), key=lambda kv: int(kv[0]))
+    name = next((name for w, name in ordered if int(w) >= width), ordered[-1][1])
+    return _absolute(default_storage.url(name), request)
@@ -0,0 +1,140 @@
+"""Load test luồng checkout: signup -> add_to_cart -> tạo order.
+
+Mỗi "virtual user" dùng một ``django.test.Client`` riêng (giữ session cookie) và
+chạy các bước trong process, nên số liệu là thời gian xử lý của Django + DB (không
+gồm mạng). Mỗi bước được đo thời gian và đếm số query DB. Bước ``shirtigo`` (tuỳ
+chọn) chạy outbox worker gửi các order vừa tạo đến Shirtigo (thật hoặc giả).
+"""
+import math
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .models import ShirtigoOutbox
+from .outbox import drain
+
+STEPS = ('signup', 'add_to_cart', 'create_order')
+USERNAME_PREFIX = 'loadtest-'
+
+SHIPPING = {
+    'email': 'loadtest@example.com', 'first_name': 'Load', 'last_name': 'Test', 'address': '1 Test Street',
+    'city': 'Ho Chi Minh', 'country': 'VN', 'postal_code': '70000',
+}
+
+
+def percentile(values, pct):
+    """Percentile kiểu nearest-rank (values đã sắp xếp)"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def _step(client, name, path, data, headers=None):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.post(path, data, content_type='application/json', headers=headers or {})
+        elapsed = time.perf_counter() - started
+    return {
+        'step': name, 'seconds': elapsed, 'queries': len(queries.captured_queries),
+        'ok': 200 <= response.status_code < 300, 'status': response.status_code,
+    }
+
+
+def run_flow(run_id, index, quantity=1):
+    """Chạy một lượt signup -> add_to_cart -> tạo order. Trả về list kết quả từng bước"""
+    # Lỗi 500 được ghi nhận cho bước đó thay vì raise ra ngoài
+    client = Client(raise_request_exception=False)
+    username = f'{USERNAME_PREFIX}{run_id}-{index}'
+    samples = []
+    try:
+        for name, path, data, headers in (
+            ('signup', '/api/auth/signup/', {'username': username, 'password': 'loadtest-pw'}, None),
+            ('add_to_cart', '/api/cart/add_to_cart/', {'quantity': quantity}, None),
+            ('create_order', '/api/orders/', SHIPPING, {'Idempotency-Key': f'{username}-order'}),
+        ):
+            sample = _step(client, name, path, data, headers)
+            samples.append(sample)
+            if not sample['ok']:
+                break  # Các bước sau phụ thuộc bước này
+    except Exception as e:
+        samples.append({'step': 'error', 'seconds': 0.0, 'queries': 0, 'ok': False, 'status': repr(e)})
+    return samples
+
+
+def _run_flow_in_thread(run_id, index, quantity):
+    try:
+        return run_flow(run_id, index, quantity)
+    finally:
+        connections.close_all()
+
+
+def summarize(samples, elapsed):
+    """Thống kê theo bước: số lượng, lỗi, p50/p95/p99 (ms), query trung bình, throughput"""
+    by_step = defaultdict(list)
+    for sample in samples:
+        by_step[sample['step']].append(sample)
+
+    report = {}
+    for step, items in by_step.items():
+        durations = sorted(item['seconds'] * 1000 for item in items)
+        queries = [item['queries'] for item in items]
+        report[step] = {
+            'count': len(items),
+            'errors': sum(1 for item in items if not item['ok']),
+            'statuses': sorted({str(item['status']) for item in items if not item['ok']}),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'p99_ms': percentile(durations, 99),
+            'max_ms': durations[-1],
+            'queries_avg': sum(queries) / len(queries),
+            'queries_max': max(queries),
+            'per_second': len(items) / elapsed if elapsed else 0.0,
+        }
+    return report
+
+
+def run(users, concurrency, quantity=1):
+    """Chạy ``users`` lượt checkout với tối đa ``concurrency`` lượt đồng thời.
+
+    Trả về ``(report, elapsed, completed)`` với ``completed`` là số lượt tạo order thành công.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    if concurrency <= 1:
+        flows = [run_flow(run_id, i, quantity) for i in range(users)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            flows = list(pool.map(lambda i: _run_flow_in_thread(run_id, i, quantity), range(users)))
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for flow in flows for sample in flow]
+    completed = sum(1 for flow in flows if flow and flow[-1]['step'] == 'create_order' and flow[-1]['ok'])
+    return summarize(samples, elapsed), elapsed, completed
+
+
+def drain_outbox(concurrency=None, batch_size=None):
+    """Gửi hết các order của load test trong outbox. Trả về ``(results, elapsed)``"""
+    pending = ShirtigoOutbox.objects.filter(
+        order__user__username__startswith=USERNAME_PREFIX, status__in=['pending', 'in_progress'],
+    )
+    results = defaultdict(int)
+    started = time.perf_counter()
+    # Chỉ dừng khi không còn entry đến hạn (entry đang chờ retry được tính là 'retry')
+    while pending.exists():
+        batch = drain(concurrency=concurrency, batch_size=batch_size)
+        if not batch:
+            break
+        for key, count in batch.items():
+            results[key] += count
+    return dict(results), time.perf_counter() - started
+
+
+def cleanup():
+    """Xóa các user (và order, giỏ hàng...) do load test tạo ra"""
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).delete()[1].get('auth.User', 0)
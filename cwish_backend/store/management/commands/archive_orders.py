@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.archive import archivable_orders, archive_batch, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move delivered/cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive orders created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, help='Orders moved per transaction')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            count = archivable_orders(cutoff).count()
+            self.stdout.write(f'{count} order(s) created before {cutoff:%Y-%m-%d %H:%M} would be archived')
+            return
+
+        archived = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            count = archive_batch(cutoff, options['batch_size'])
+            if not count:
+                break
+            archived += count
+            batches += 1
+            self.stdout.write(f'Batch {batches}: {count} order(s) archived')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Done, {archived} order(s) archived'))
@@ -0,0 +1,64 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store.emails import email_shell, render_order_confirmation
+from store.models import Order, OrderItem, SingleProduct
+
+
+class Command(BaseCommand):
+    help = 'Measure order confirmation email renders per second for small and large orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 50], help='Order sizes (lines) to measure')
+        parser.add_argument('--iterations', type=int, default=200, help='Renders per order size')
+
+    def handle(self, *args, **options):
+        # Dữ liệu tạm trong transaction, rollback khi xong
+        with transaction.atomic():
+            orders = self._create_orders(options['lines'])
+
+            email_shell.cache_clear()
+            started = time.perf_counter()
+            render_order_confirmation(orders[0])
+            self.stdout.write(f'First render (shell not cached): {(time.perf_counter() - started) * 1000:.1f} ms')
+
+            for lines, order in zip(options['lines'], orders):
+                with CaptureQueriesContext(connection) as queries:
+                    size = len(render_order_confirmation(order))
+                started = time.perf_counter()
+                for _ in range(options['iterations']):
+                    render_order_confirmation(order)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{lines:>4} line(s): {options["iterations"] / elapsed:8.1f} renders/s, '
+                    f'{elapsed / options["iterations"] * 1000:6.2f} ms/render, '
+                    f'{len(queries.captured_queries)} query, {size / 1024:.1f} KiB'
+                )
+            transaction.set_rollback(True)
+
+    def _create_orders(self, sizes):
+        user = User.objects.create_user('email-benchmark', 'benchmark@example.com')
+        product = SingleProduct.objects.create(
+            name='Benchmark Tee', description='Soft cotton tee ' * 10, price=Decimal('20.00'), is_active=False,
+        )
+        orders = []
+        for lines in sizes:
+            order = Order.objects.create(
+                user=user, total_amount=product.price * lines, email='benchmark@example.com',
+                first_name='Bench', last_name='Mark', address='1 Street', city='City', country='VN',
+                postal_code='70000',
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product_type='single', product=product, quantity=1, unit_price=product.price,
+                    total_price=product.price, print_position='Front', personalization=f'Line {i}',
+                )
+                for i in range(lines)
+            ])
+            orders.append(order)
+        return orders
@@ -0,0 +1,95 @@
+import gc
+import os
+import resource
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from store import export
+from store.models import Order, OrderItem, SingleProduct
+
+
+def current_rss():
+    """RSS hiện tại (byte); ngoài Linux dùng peak RSS của process"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Command(BaseCommand):
+    help = 'Stream-export a large synthetic order table and check that memory (RSS) stays flat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Orders to create (rolled back afterwards)')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--max-growth-mb', type=float, default=20.0,
+                            help='Fail if RSS grows more than this after the first 10%% of the export')
+
+    def handle(self, *args, **options):
+        total = options['orders']
+        # DEBUG lưu mọi query vào connection.queries, làm RSS tăng theo số trang
+        with override_settings(DEBUG=False), transaction.atomic():
+            started = time.perf_counter()
+            self._create_orders(total)
+            self.stdout.write(f'Created {total} orders in {time.perf_counter() - started:.1f}s')
+            gc.collect()
+
+            exported = size = 0
+            baseline = peak = None
+            started = time.perf_counter()
+            # Order vừa tạo trong transaction này: export đến hiện tại, không lùi watermark
+            chunks = export.export_chunks(options['format'], until=timezone.now(), chunk_size=options['chunk_size'])
+            for chunk in chunks:
+                size += len(chunk)
+                exported += chunk.count('\n')
+                rss = current_rss()
+                # RSS sau 10% đầu (đã qua các lần cấp phát ban đầu) là mốc so sánh
+                if baseline is None and exported >= total // 10:
+                    baseline = peak = rss
+                elif baseline is not None:
+                    peak = max(peak, rss)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+
+        if baseline is None:
+            raise CommandError('Nothing was exported')
+        growth = (peak - baseline) / 2 ** 20
+        self.stdout.write(
+            f'Exported {total} orders ({size / 2 ** 20:.1f} MiB {options["format"]}) in {elapsed:.1f}s, '
+            f'{total / elapsed:.0f} orders/s'
+        )
+        self.stdout.write(f'RSS after 10%: {baseline / 2 ** 20:.1f} MiB, peak: {peak / 2 ** 20:.1f} MiB, '
+                          f'growth: {growth:.1f} MiB')
+        if growth > options['max_growth_mb']:
+            raise CommandError(f'RSS grew {growth:.1f} MiB during the export (limit {options["max_growth_mb"]} MiB)')
+        self.stdout.write(self.style.SUCCESS('RSS stayed flat'))
+
+    def _create_orders(self, total, batch_size=5000):
+        user = User.objects.create_user('export-benchmark', 'benchmark@example.com')
+        product = SingleProduct.objects.create(
+            name='Benchmark Tee', description='Benchmark', price=Decimal('20.00'), is_active=False,
+        )
+        for start in range(0, total, batch_size):
+            orders = Order.objects.bulk_create([
+                Order(
+                    user=user, total_amount=product.price, email='benchmark@example.com', status='delivered',
+                    first_name='Bench', last_name='Mark', address='1 Street', city='City', country='VN',
+                    postal_code='70000', item_count=1, main_line_count=1, main_total=product.price,
+                )
+                for _ in range(min(batch_size, total - start))
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order, product_type='single', product=product, quantity=1, unit_price=product.price,
+                    total_price=product.price, print_position='Front',
+                )
+                for order in orders
+            ])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from store.images import update_product_variants
+from store.models import SingleProduct, DigitalBonusProduct
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG derivatives for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild even if derivatives are up to date')
+
+    def handle(self, *args, **options):
+        built = 0
+        for model in (SingleProduct, DigitalBonusProduct):
+            for product in model.objects.exclude(image='').exclude(image__isnull=True):
+                if update_product_variants(product, force=options['force']):
+                    built += 1
+                    self.stdout.write(f'Built derivatives for {model.__name__} #{product.pk}: {product.name}')
+        self.stdout.write(self.style.SUCCESS(f'Done, {built} product(s) updated'))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import shirtigo
+from store.outbox import default_worker_id, drain
+
+
+class Command(BaseCommand):
+    help = 'Send queued orders to Shirtigo (outbox worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no entry is due instead of polling')
+        parser.add_argument('--concurrency', type=int, help='Max in-flight Shirtigo requests')
+        parser.add_argument('--batch-size', type=int, help='Entries claimed per round')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty')
+
+    def handle(self, *args, **options):
+        if not shirtigo.is_configured():
+            raise CommandError('SHIRTIGO_API_TOKEN is not set')
+        worker_id = default_worker_id()
+        self.stdout.write(f'Shirtigo outbox worker {worker_id} started')
+        try:
+            while True:
+                results = drain(
+                    worker_id=worker_id, concurrency=options['concurrency'], batch_size=options['batch_size'],
+                )
+                if results:
+                    summary = ', '.join(f'{key}: {count}' for key, count in sorted(results.items()))
+                    self.stdout.write(f'Processed {sum(results.values())} entr(ies) - {summary}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Shirtigo outbox worker stopped'))
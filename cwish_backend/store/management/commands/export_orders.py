@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store import export
+
+
+class Command(BaseCommand):
+    help = 'Stream all orders (archived included) to CSV or NDJSON, optionally only those updated since a watermark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--file', help='Write to this file instead of stdout')
+        parser.add_argument('--since', help='Only orders updated after this ISO datetime')
+        parser.add_argument('--state-file', help='Read --since from this file and store the new watermark in it')
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE, help='Orders read per query')
+
+    def handle(self, *args, **options):
+        state_file = Path(options['state_file']) if options['state_file'] else None
+        raw_since = options['since']
+        if raw_since is None and state_file is not None and state_file.exists():
+            raw_since = state_file.read_text().strip() or None
+        since = None
+        if raw_since:
+            since = parse_datetime(raw_since)
+            if since is None:
+                raise CommandError(f'Invalid --since: {raw_since}')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        until = export.watermark()
+        chunks = export.export_chunks(options['format'], since=since, until=until, chunk_size=options['chunk_size'])
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+
+        # Chỉ lưu watermark khi export xong
+        if state_file is not None:
+            state_file.write_text(until.isoformat())
+        self.stderr.write(f'Exported orders updated up to {until.isoformat()}')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from store.fake_shirtigo import FakeShirtigoServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local fake Shirtigo API (configurable latency, errors and rate limit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+        parser.add_argument('--latency', type=float, default=0.3, help='Seconds added to every order request')
+        parser.add_argument('--jitter', type=float, default=0.2, help='Extra random delay, 0..jitter seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+        parser.add_argument('--rate-limit', type=float, default=0, help='Requests per second before 429 (0 = off)')
+        parser.add_argument('--token', help='Require this Bearer token (default: accept any)')
+        parser.add_argument('--verbose', action='store_true', help='Log every request')
+
+    def handle(self, *args, **options):
+        server = FakeShirtigoServer(
+            (options['host'], options['port']), latency=options['latency'], jitter=options['jitter'],
+            error_rate=options['error_rate'], rate_limit=options['rate_limit'], token=options['token'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(f'Fake Shirtigo API listening on {server.api_url}')
+        self.stdout.write(f'Use it with: SHIRTIGO_API_URL={server.api_url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        summary = ', '.join(f'{code}: {count}' for code, count in sorted(server.stats.items())) or 'no requests'
+        self.stdout.write(self.style.SUCCESS(f'Fake Shirtigo API stopped ({summary})'))
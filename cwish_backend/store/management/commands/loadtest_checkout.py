@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from store import loadtest
+from store.cache import get_active_product
+from store.fake_shirtigo import FakeShirtigoServer
+from store.shirtigo import reset_client
+
+
+class Command(BaseCommand):
+    help = 'Load test the checkout flow (signup -> add_to_cart -> create order) and report latency per step'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of checkout flows to run')
+        parser.add_argument('--concurrency', type=int, default=8, help='Flows running at the same time')
+        parser.add_argument('--quantity', type=int, default=1, help='Quantity added to the cart')
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Afterwards, send the created orders through the Shirtigo outbox and time it',
+        )
+        parser.add_argument(
+            '--fake-shirtigo', action='store_true',
+            help='With --drain: send to an in-process fake Shirtigo API (the default)',
+        )
+        parser.add_argument(
+            '--real-upstream', action='store_true',
+            help='With --drain: send to SHIRTIGO_API_URL instead of the fake API (creates real Shirtigo orders!)',
+        )
+        parser.add_argument('--latency', type=float, default=0.3, help='Fake Shirtigo latency (seconds)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fake Shirtigo 503 rate')
+        parser.add_argument('--rate-limit', type=float, default=0, help='Fake Shirtigo requests/second (0 = off)')
+        parser.add_argument('--cleanup', action='store_true', help='Delete load-test users and orders at the end')
+
+    def handle(self, *args, **options):
+        if not get_active_product():
+            raise CommandError('No active product - run seed_data or create one in the admin first')
+        if (options['fake_shirtigo'] or options['real_upstream']) and not options['drain']:
+            raise CommandError('--fake-shirtigo/--real-upstream only make sense with --drain')
+        if options['fake_shirtigo'] and options['real_upstream']:
+            raise CommandError('Use either --fake-shirtigo or --real-upstream')
+
+        self.stdout.write(
+            f"Running {options['users']} checkout flow(s), concurrency {options['concurrency']} "
+            f"({settings.DATABASES['default']['ENGINE']})"
+        )
+        report, elapsed, completed = loadtest.run(options['users'], options['concurrency'], options['quantity'])
+        self._print_report(report, elapsed, completed)
+
+        if options['drain']:
+            self._drain(options)
+        if options['cleanup']:
+            self.stdout.write(f'Deleted {loadtest.cleanup()} load-test user(s)')
+
+    def _print_report(self, report, elapsed, completed):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'step':<14}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'max ms':>10}{'req/s':>9}{'queries':>9}"
+        )
+        steps = [step for step in loadtest.STEPS if step in report] + sorted(set(report) - set(loadtest.STEPS))
+        for step in steps:
+            row = report[step]
+            self.stdout.write(
+                f"{step:<14}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+                f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}{row['per_second']:>9.1f}"
+                f"{row['queries_avg']:>5.1f}/{row['queries_max']:<3}"
+            )
+            if row['statuses']:
+                self.stdout.write(f"  failed with: {', '.join(row['statuses'])}")
+        self.stdout.write('')
+        rate = completed / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'{completed} order(s) created in {elapsed:.2f}s ({rate:.1f} checkouts/s)'
+        ))
+
+    def _drain(self, options):
+        server = None
+        overrides = None
+        # Mặc định gửi đến fake API: load test không được tạo order thật trên Shirtigo
+        if not options['real_upstream']:
+            server = FakeShirtigoServer(
+                latency=options['latency'], error_rate=options['error_rate'], rate_limit=options['rate_limit'],
+            ).start()
+            # Fake API nhận mọi token
+            overrides = override_settings(
+                SHIRTIGO_API_URL=server.api_url, SHIRTIGO_API_TOKEN=settings.SHIRTIGO_API_TOKEN or 'fake-token',
+            )
+            overrides.enable()
+            self.stdout.write(f'Fake Shirtigo API on {server.api_url}')
+        reset_client()
+        try:
+            results, elapsed = loadtest.drain_outbox()
+        finally:
+            if server is not None:
+                overrides.disable()
+                server.stop()
+                reset_client()
+        summary = ', '.join(f'{key}: {count}' for key, count in sorted(results.items())) or 'nothing due'
+        sent = results.get('sent', 0)
+        rate = sent / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Shirtigo outbox drained in {elapsed:.2f}s - {summary} ({rate:.1f} orders/s)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized order aggregates (item count, line counts, totals) from order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders updated per chunk')
+
+    def handle(self, *args, **options):
+        updated = Order.objects.all().recompute_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Done, {updated} order(s) recomputed'))
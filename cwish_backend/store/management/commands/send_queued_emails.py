@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.emails import RateLimiter, send_batch
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails in batches over a reused SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--batch-size', type=int, help='Emails sent per SMTP connection')
+        parser.add_argument(
+            '--rate', type=int, default=getattr(settings, 'EMAIL_QUEUE_RATE_PER_MINUTE', 20),
+            help='Max emails per minute (0 = unlimited)',
+        )
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        # Giới hạn tốc độ dùng chung cho mọi batch của process này
+        limiter = RateLimiter(options['rate'])
+        self.stdout.write('Email sender started')
+        try:
+            while True:
+                results = send_batch(batch_size=options['batch_size'], limiter=limiter)
+                if results:
+                    summary = ', '.join(f'{key}: {count}' for key, count in sorted(results.items()))
+                    self.stdout.write(f'Processed {sum(results.values())} email(s) - {summary}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Email sender stopped'))
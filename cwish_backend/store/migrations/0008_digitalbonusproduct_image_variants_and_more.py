@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_alter_order_personalization_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="digitalbonusproduct",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Resized/recompressed derivatives of image (see store.images)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="singleproduct",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Resized/recompressed derivatives of image (see store.images)",
+            ),
+        ),
+    ]
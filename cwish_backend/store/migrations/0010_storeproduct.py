@@ -0,0 +1,115 @@
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_category_product_productimage_productoption_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoreProduct",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "product_type",
+                    models.CharField(
+                        choices=[
+                            ("single", "Single Product"),
+                            ("bonus", "Bonus Product"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("name", models.CharField(max_length=200)),
+                ("description", models.TextField()),
+                (
+                    "price",
+                    models.DecimalField(
+                        decimal_places=2,
+                        max_digits=10,
+                        validators=[django.core.validators.MinValueValidator(0)],
+                    ),
+                ),
+                ("currency", models.CharField(default="USD", max_length=3)),
+                (
+                    "image",
+                    models.ImageField(blank=True, null=True, upload_to="product/"),
+                ),
+                (
+                    "image_variants",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        editable=False,
+                        help_text="Resized/recompressed derivatives of image (see store.images)",
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "print_position",
+                    models.CharField(
+                        blank=True,
+                        help_text="Position to print on the product (e.g., Front, Back, Left Sleeve)",
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                ("is_digital", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Store Product",
+                "verbose_name_plural": "Store Products",
+                "indexes": [
+                    models.Index(
+                        fields=["product_type", "is_active", "id"],
+                        name="store_sprod_type_active",
+                    )
+                ],
+            },
+        ),
+        # FK mới (tạm thời nullable) trỏ đến bảng sản phẩm chung
+        migrations.AddField(
+            model_name="orderitem",
+            name="product",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="order_items",
+                to="store.storeproduct",
+            ),
+        ),
+        migrations.AddField(
+            model_name="usercart",
+            name="store_product",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="store.storeproduct",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bonuscart",
+            name="store_product",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="store.storeproduct",
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations
+
+PRODUCT_FIELDS = [
+    "name",
+    "description",
+    "price",
+    "currency",
+    "image",
+    "image_variants",
+    "is_active",
+    "created_at",
+    "updated_at",
+]
+
+
+def copy_products(apps, schema_editor):
+    """Chép SingleProduct/DigitalBonusProduct sang StoreProduct và trỏ lại các FK"""
+    StoreProduct = apps.get_model("store", "StoreProduct")
+    SingleProduct = apps.get_model("store", "SingleProduct")
+    DigitalBonusProduct = apps.get_model("store", "DigitalBonusProduct")
+    OrderItem = apps.get_model("store", "OrderItem")
+    UserCart = apps.get_model("store", "UserCart")
+    BonusCart = apps.get_model("store", "BonusCart")
+
+    single_ids = {}
+    for old in SingleProduct.objects.order_by("pk"):
+        new = StoreProduct(
+            product_type="single",
+            print_position=old.print_position,
+            is_digital=False,
+            **{field: getattr(old, field) for field in PRODUCT_FIELDS},
+        )
+        new.save()
+        single_ids[old.pk] = new.pk
+
+    bonus_ids = {}
+    for old in DigitalBonusProduct.objects.order_by("pk"):
+        new = StoreProduct(
+            product_type="bonus",
+            is_digital=old.is_digital,
+            **{field: getattr(old, field) for field in PRODUCT_FIELDS},
+        )
+        new.save()
+        bonus_ids[old.pk] = new.pk
+
+    # auto_now ghi đè updated_at khi save, khôi phục lại giá trị cũ
+    for old_model, mapping in ((SingleProduct, single_ids), (DigitalBonusProduct, bonus_ids)):
+        for old in old_model.objects.all():
+            StoreProduct.objects.filter(pk=mapping[old.pk]).update(updated_at=old.updated_at)
+
+    for old_pk, new_pk in single_ids.items():
+        OrderItem.objects.filter(single_product_id=old_pk).update(product_id=new_pk)
+        UserCart.objects.filter(product_id=old_pk).update(store_product_id=new_pk)
+    for old_pk, new_pk in bonus_ids.items():
+        OrderItem.objects.filter(bonus_product_id=old_pk).update(product_id=new_pk)
+        BonusCart.objects.filter(product_id=old_pk).update(store_product_id=new_pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_storeproduct"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_copy_products_to_storeproduct"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="usercart",
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name="bonuscart",
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name="usercart",
+            name="product",
+        ),
+        migrations.RemoveField(
+            model_name="bonuscart",
+            name="product",
+        ),
+        migrations.RemoveField(
+            model_name="orderitem",
+            name="single_product",
+        ),
+        migrations.RemoveField(
+            model_name="orderitem",
+            name="bonus_product",
+        ),
+        migrations.DeleteModel(
+            name="SingleProduct",
+        ),
+        migrations.DeleteModel(
+            name="DigitalBonusProduct",
+        ),
+        migrations.CreateModel(
+            name="SingleProduct",
+            fields=[],
+            options={
+                "verbose_name": "Single Product",
+                "verbose_name_plural": "Single Product",
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("store.storeproduct",),
+        ),
+        migrations.CreateModel(
+            name="DigitalBonusProduct",
+            fields=[],
+            options={
+                "verbose_name": "Digital Bonus Product",
+                "verbose_name_plural": "Digital Bonus Products",
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("store.storeproduct",),
+        ),
+        migrations.RenameField(
+            model_name="usercart",
+            old_name="store_product",
+            new_name="product",
+        ),
+        migrations.RenameField(
+            model_name="bonuscart",
+            old_name="store_product",
+            new_name="product",
+        ),
+        migrations.AlterField(
+            model_name="usercart",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="store.singleproduct",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="bonuscart",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="store.digitalbonusproduct",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="order_items",
+                to="store.storeproduct",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="usercart",
+            unique_together={("user", "product")},
+        ),
+        migrations.AlterUniqueTogether(
+            name="bonuscart",
+            unique_together={("user", "product")},
+        ),
+    ]
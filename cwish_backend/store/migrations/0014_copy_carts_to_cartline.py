@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def copy_carts(apps, schema_editor):
+    """Chép UserCart/BonusCart sang CartLine (giữ nguyên thời gian tạo/cập nhật)"""
+    CartLine = apps.get_model("store", "CartLine")
+    UserCart = apps.get_model("store", "UserCart")
+    BonusCart = apps.get_model("store", "BonusCart")
+
+    for item in UserCart.objects.order_by("pk"):
+        line = CartLine.objects.create(
+            user_id=item.user_id,
+            product_id=item.product_id,
+            product_type="single",
+            quantity=item.quantity,
+            print_position=item.print_position,
+            personalization=item.personalization,
+        )
+        # auto_now/auto_now_add ghi đè thời gian khi save, khôi phục lại giá trị cũ
+        CartLine.objects.filter(pk=line.pk).update(
+            created_at=item.created_at, updated_at=item.updated_at
+        )
+
+    for item in BonusCart.objects.order_by("pk"):
+        line = CartLine.objects.create(
+            user_id=item.user_id,
+            product_id=item.product_id,
+            product_type="bonus",
+            quantity=item.quantity,
+        )
+        CartLine.objects.filter(pk=line.pk).update(
+            created_at=item.created_at, updated_at=item.updated_at
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0013_cartline"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_carts, migrations.RunPython.noop),
+    ]
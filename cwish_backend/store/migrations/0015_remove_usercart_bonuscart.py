@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0014_copy_carts_to_cartline"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="usercart",
+            unique_together=None,
+        ),
+        migrations.RemoveField(
+            model_name="usercart",
+            name="product",
+        ),
+        migrations.RemoveField(
+            model_name="usercart",
+            name="user",
+        ),
+        migrations.AlterUniqueTogether(
+            name="bonuscart",
+            unique_together=None,
+        ),
+        migrations.DeleteModel(
+            name="BonusCart",
+        ),
+        migrations.DeleteModel(
+            name="UserCart",
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0020_order_user_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="bonus_line_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="bonus_total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="item_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Total quantity of all items"
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="main_line_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="main_total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0021_order_aggregates"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="storeproduct",
+            name="store_sprod_type_active",
+        ),
+        migrations.AddIndex(
+            model_name="cartline",
+            index=models.Index(
+                fields=["user", "product_type", "id"], name="store_cartline_user_type"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contact",
+            index=models.Index(fields=["created_at"], name="store_contact_created"),
+        ),
+        migrations.AddIndex(
+            model_name="contact",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["created_at"],
+                name="store_contact_unread",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "created_at", "id"], name="store_order_status_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("shirtigo_order_id__isnull", False)),
+                fields=["shirtigo_order_id", "created_at"],
+                name="store_order_shirtigo_id",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="orderitem",
+            index=models.Index(
+                fields=["order", "product_type"], name="store_orderitem_order_type"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="storeproduct",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["product_type", "id"],
+                name="store_sprod_type_active",
+            ),
+        ),
+    ]
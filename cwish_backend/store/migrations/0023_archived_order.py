@@ -0,0 +1,102 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:23
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0022_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("total_amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("currency", models.CharField(max_length=3)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("shipped", "Shipped"),
+                            ("delivered", "Delivered"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("email", models.EmailField(max_length=254)),
+                ("first_name", models.CharField(max_length=100)),
+                ("last_name", models.CharField(max_length=100)),
+                ("address", models.TextField()),
+                ("city", models.CharField(max_length=100)),
+                ("country", models.CharField(max_length=100)),
+                ("postal_code", models.CharField(max_length=20)),
+                ("phone", models.CharField(blank=True, max_length=20)),
+                (
+                    "print_position",
+                    models.CharField(blank=True, max_length=50, null=True),
+                ),
+                (
+                    "personalization",
+                    models.TextField(blank=True, max_length=256, null=True),
+                ),
+                (
+                    "shirtigo_order_id",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("shirtigo_response", models.JSONField(blank=True, null=True)),
+                ("item_count", models.PositiveIntegerField(default=0)),
+                ("main_line_count", models.PositiveIntegerField(default=0)),
+                ("bonus_line_count", models.PositiveIntegerField(default=0)),
+                (
+                    "main_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                (
+                    "bonus_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=10),
+                ),
+                (
+                    "items",
+                    models.JSONField(
+                        default=list,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_orders",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived Order",
+                "verbose_name_plural": "Archived Orders",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "created_at", "id"],
+                        name="store_archorder_user_created",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0024_order_export_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProviderPayload",
+            fields=[
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="provider_payload",
+                        serialize=False,
+                        to="store.order",
+                    ),
+                ),
+                ("provider", models.CharField(default="shirtigo", max_length=20)),
+                ("codec", models.CharField(default="zlib", max_length=10)),
+                ("data", models.BinaryField()),
+                (
+                    "raw_size",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Size of the JSON before compression"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Provider Payload",
+                "verbose_name_plural": "Provider Payloads",
+            },
+        ),
+        migrations.AddField(
+            model_name="archivedorder",
+            name="shirtigo_codec",
+            field=models.CharField(blank=True, default="", max_length=10),
+        ),
+        migrations.AddField(
+            model_name="archivedorder",
+            name="shirtigo_payload",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="archivedorder",
+            name="shirtigo_status",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name="archivedorder",
+            name="shirtigo_synced_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="shirtigo_status",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="shirtigo_synced_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+from store.payloads import DEFAULT_CODEC, pack, provider_status, unpack
+
+
+def move_responses(apps, schema_editor):
+    """Nén Order.shirtigo_response vào ProviderPayload (ArchivedOrder: vào cột payload)"""
+    Order = apps.get_model("store", "Order")
+    ArchivedOrder = apps.get_model("store", "ArchivedOrder")
+    ProviderPayload = apps.get_model("store", "ProviderPayload")
+
+    orders = Order.objects.filter(shirtigo_response__isnull=False).only(
+        "pk", "shirtigo_response", "updated_at"
+    )
+    for order in orders.iterator(chunk_size=500):
+        data, raw_size = pack(order.shirtigo_response)
+        ProviderPayload.objects.create(
+            order_id=order.pk, codec=DEFAULT_CODEC, data=data, raw_size=raw_size
+        )
+        # Thời điểm đồng bộ gần nhất đã biết là lần cập nhật order cuối
+        Order.objects.filter(pk=order.pk).update(
+            shirtigo_status=provider_status(order.shirtigo_response),
+            shirtigo_synced_at=order.updated_at,
+        )
+
+    archived = ArchivedOrder.objects.filter(shirtigo_response__isnull=False).only(
+        "pk", "shirtigo_response", "updated_at"
+    )
+    for order in archived.iterator(chunk_size=500):
+        data, _ = pack(order.shirtigo_response)
+        ArchivedOrder.objects.filter(pk=order.pk).update(
+            shirtigo_codec=DEFAULT_CODEC,
+            shirtigo_payload=data,
+            shirtigo_status=provider_status(order.shirtigo_response),
+            shirtigo_synced_at=order.updated_at,
+        )
+
+
+def restore_responses(apps, schema_editor):
+    Order = apps.get_model("store", "Order")
+    ArchivedOrder = apps.get_model("store", "ArchivedOrder")
+    ProviderPayload = apps.get_model("store", "ProviderPayload")
+
+    for payload in ProviderPayload.objects.iterator(chunk_size=500):
+        Order.objects.filter(pk=payload.order_id).update(
+            shirtigo_response=unpack(payload.codec, payload.data)
+        )
+    for order in ArchivedOrder.objects.exclude(shirtigo_codec="").iterator(
+        chunk_size=500
+    ):
+        ArchivedOrder.objects.filter(pk=order.pk).update(
+            shirtigo_response=unpack(order.shirtigo_codec, order.shirtigo_payload)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0025_provider_payloads"),
+    ]
+
+    operations = [
+        migrations.RunPython(move_responses, restore_responses),
+    ]
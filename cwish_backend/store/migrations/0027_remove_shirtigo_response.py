@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0026_move_shirtigo_responses"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="archivedorder",
+            name="shirtigo_response",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="shirtigo_response",
+        ),
+    ]
@@ -1,106 +1,251 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
+from decimal import Decimal
 
+from .payloads import DEFAULT_CODEC, pack, provider_status, unpack
 
-class SingleProduct(models.Model):
-    """Model cho sản phẩm duy nhất của website"""
+
+class TypedProductManager(models.Manager):
+    """Manager chỉ trả về sản phẩm đúng loại của proxy model"""
+    def get_queryset(self):
+        return super().get_queryset().filter(product_type=self.model.PRODUCT_TYPE)
+
+
+class StoreProduct(models.Model):
+    """Bảng sản phẩm chung cho sản phẩm chính và sản phẩm digital bonus"""
+    PRODUCT_TYPE_CHOICES = [
+        ('single', 'Single Product'),
+        ('bonus', 'Bonus Product'),
+    ]
+    PRODUCT_TYPE = None
+
+    product_type = models.CharField(max_length=20, choices=PRODUCT_TYPE_CHOICES)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     currency = models.CharField(max_length=3, default='USD')
     image = models.ImageField(upload_to='product/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized/recompressed derivatives of image (see store.images)")
     is_active = models.BooleanField(default=True)
+    # Chỉ dùng cho sản phẩm chính
     print_position = models.CharField(max_length=50, blank=True, null=True, help_text="Position to print on the product (e.g., Front, Back, Left Sleeve)")
+    # Chỉ dùng cho sản phẩm bonus
+    is_digital = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        verbose_name = "Store Product"
+        verbose_name_plural = "Store Products"
+        indexes = [
+            # Partial: filter(is_active=True) được render là `WHERE "is_active"` (không phải `= ?`)
+            # nên chỉ index partial mới khớp; SQLite không dùng điều kiện có tham số cho partial index
+            models.Index(fields=['product_type', 'id'], condition=Q(is_active=True), name='store_sprod_type_active'),
+        ]
+
+    def __init__(self, *args, **kwargs):
+        # Proxy model tự gán loại sản phẩm khi tạo mới (không áp dụng khi load từ DB)
+        if not args and self.PRODUCT_TYPE:
+            kwargs.setdefault('product_type', self.PRODUCT_TYPE)
+            if self.PRODUCT_TYPE == 'bonus':
+                kwargs.setdefault('is_digital', True)
+        super().__init__(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
+
+class SingleProduct(StoreProduct):
+    """Model cho sản phẩm duy nhất của website"""
+    PRODUCT_TYPE = 'single'
+
+    objects = TypedProductManager()
+
     class Meta:
+        proxy = True
         verbose_name = "Single Product"
         verbose_name_plural = "Single Product"
 
 
-class DigitalBonusProduct(models.Model):
+class DigitalBonusProduct(StoreProduct):
     """Model cho sản phẩm digital bonus"""
-    name = models.CharField(max_length=200)
-    description = models.TextField()
-    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
-    currency = models.CharField(max_length=3, default='USD')
-    image = models.ImageField(upload_to='product/', blank=True, null=True)
-    is_active = models.BooleanField(default=True)
-    is_digital = models.BooleanField(default=True)
+    PRODUCT_TYPE = 'bonus'
+
+    objects = TypedProductManager()
+
+    class Meta:
+        proxy = True
+        verbose_name = "Digital Bonus Product"
+        verbose_name_plural = "Digital Bonus Products"
+
+
+class Category(models.Model):
+    """Danh mục sản phẩm của catalog"""
+    name = models.CharField(max_length=100, unique=True)
+    description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        verbose_name = "Category"
+        verbose_name_plural = "Categories"
+        ordering = ['name']
+
     def __str__(self):
         return self.name
 
+
+class Product(models.Model):
+    """Sản phẩm trong catalog (nhiều sản phẩm, mỗi sản phẩm có nhiều variants)"""
+    STATUS_CHOICES = [
+        ('draft', 'Draft'),
+        ('published', 'Published'),
+        ('archived', 'Archived'),
+    ]
+
+    title = models.CharField(max_length=200)
+    handle = models.SlugField(max_length=200, unique=True)
+    description = models.TextField(blank=True)
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='products')
+    weight = models.PositiveIntegerField(default=0, help_text="Weight in grams")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    # Giá thấp nhất trong các variants, được cập nhật khi variant thay đổi (dùng để sort/filter)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    currency = models.CharField(max_length=3, default='USD')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
-        verbose_name = "Digital Bonus Product"
-        verbose_name_plural = "Digital Bonus Products"
+        verbose_name = "Product"
+        verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=['category', 'status', 'price', 'id'], name='store_prod_cat_status_price'),
+            models.Index(fields=['status', 'price', 'id'], name='store_prod_status_price'),
+            models.Index(fields=['status', 'created_at', 'id'], name='store_prod_status_created'),
+        ]
 
+    def __str__(self):
+        return self.title
 
-class UserCart(models.Model):
-    """Giỏ hàng của từng user"""
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart')
-    product = models.ForeignKey(SingleProduct, on_delete=models.CASCADE)
-    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], default=1)
-    print_position = models.CharField(max_length=50, blank=True, null=True, help_text="Selected print position for this cart item")
-    personalization = models.TextField(max_length=256, blank=True, null=True, help_text="Personalization text for this cart item")
+    def refresh_price(self):
+        """Cập nhật price = giá thấp nhất của các variants (một câu UPDATE)"""
+        lowest = ProductVariant.objects.filter(product=OuterRef('pk')).order_by('price').values('price')[:1]
+        Product.objects.filter(pk=self.pk).update(price=Coalesce(Subquery(lowest), Value(0), output_field=models.DecimalField()))
+
+
+class ProductOption(models.Model):
+    """Tùy chọn của sản phẩm (ví dụ Size: S, M, L)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='options')
+    name = models.CharField(max_length=100)
+    values = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = "Product Option"
+        verbose_name_plural = "Product Options"
+        unique_together = ['product', 'name']
+
+    def __str__(self):
+        return f"{self.product.title} - {self.name}"
+
+
+class ProductVariant(models.Model):
+    """Variant (SKU) của sản phẩm"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
+    title = models.CharField(max_length=200)
+    sku = models.CharField(max_length=100, unique=True)
+    options = models.JSONField(default=dict)
+    price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    inventory_quantity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['user', 'product']
-        verbose_name = "User Cart"
-        verbose_name_plural = "User Carts"
+        verbose_name = "Product Variant"
+        verbose_name_plural = "Product Variants"
+        ordering = ['id']
 
     def __str__(self):
-        return f"{self.user.username} - {self.product.name} x {self.quantity}"
+        return f"{self.sku} - {self.title}"
 
-    @property
-    def total_price(self):
-        return self.quantity * self.product.price
+
+class ProductImage(models.Model):
+    """Ảnh của sản phẩm trong catalog"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='products/')
+    alt_text = models.CharField(max_length=200, blank=True)
+    is_primary = models.BooleanField(default=False)
+    position = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Product Image"
+        verbose_name_plural = "Product Images"
+        ordering = ['-is_primary', 'position', 'id']
+
+    def __str__(self):
+        return self.alt_text or self.image.name
 
 
-class BonusCart(models.Model):
-    """Giỏ hàng riêng cho sản phẩm bonus"""
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bonus_cart')
-    product = models.ForeignKey(DigitalBonusProduct, on_delete=models.CASCADE)
+class CartLine(models.Model):
+    """Một dòng trong giỏ hàng của user - sản phẩm chính hoặc sản phẩm bonus"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_lines')
+    product = models.ForeignKey(StoreProduct, on_delete=models.CASCADE, related_name='cart_lines')
+    product_type = models.CharField(max_length=20, choices=StoreProduct.PRODUCT_TYPE_CHOICES)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], default=1)
+    # Chỉ dùng cho sản phẩm chính
+    print_position = models.CharField(max_length=50, blank=True, null=True, help_text="Selected print position for this cart item")
+    personalization = models.TextField(max_length=256, blank=True, null=True, help_text="Personalization text for this cart item")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ['user', 'product']
-        verbose_name = "Bonus Cart"
-        verbose_name_plural = "Bonus Carts"
+        verbose_name = "Cart Line"
+        verbose_name_plural = "Cart Lines"
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='store_cartline_user_product'),
+        ]
+        indexes = [
+            # Giỏ hàng theo loại (cart_lines/cart_summary): đã sắp xếp sẵn theo (product_type, id)
+            models.Index(fields=['user', 'product_type', 'id'], name='store_cartline_user_type'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name} x {self.quantity}"
 
     @property
     def total_price(self):
+        # Dùng giá trị đã annotate (cart.cart_summary) nếu có
+        if 'line_total' in self.__dict__:
+            return self.line_total
         return self.quantity * self.product.price
 
 
+class CartVersion(models.Model):
+    """Version của giỏ hàng theo user - tăng dần sau mỗi lần thay đổi giỏ hàng"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart_version')
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Cart Version"
+        verbose_name_plural = "Cart Versions"
+
+    def __str__(self):
+        return f"{self.user.username} - v{self.version}"
+
+
 class OrderItem(models.Model):
     """Chi tiết sản phẩm trong đơn hàng - hỗ trợ multiple products"""
     order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='order_items')
 
-    # Có thể là SingleProduct hoặc DigitalBonusProduct
-    product_type = models.CharField(max_length=20, choices=[
-        ('single', 'Single Product'),
-        ('bonus', 'Bonus Product')
-    ])
-
-    # Foreign keys đến các loại sản phẩm (chỉ một trong hai sẽ được set)
-    single_product = models.ForeignKey(SingleProduct, on_delete=models.CASCADE, null=True, blank=True)
-    bonus_product = models.ForeignKey(DigitalBonusProduct, on_delete=models.CASCADE, null=True, blank=True)
+    product_type = models.CharField(max_length=20, choices=StoreProduct.PRODUCT_TYPE_CHOICES)
+    product = models.ForeignKey(StoreProduct, on_delete=models.CASCADE, related_name='order_items')
 
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -117,30 +262,23 @@ class OrderItem(models.Model):
     class Meta:
         verbose_name = "Order Item"
         verbose_name_plural = "Order Items"
+        indexes = [
+            # get_main_products / get_bonus_products
+            models.Index(fields=['order', 'product_type'], name='store_orderitem_order_type'),
+        ]
 
     def __str__(self):
         product_name = self.get_product_name()
         return f"{product_name} x {self.quantity}"
 
-    @property
-    def product(self):
-        """Trả về sản phẩm tương ứng"""
-        return self.single_product or self.bonus_product
-
     def get_product_name(self):
         """Trả về tên sản phẩm"""
-        if self.single_product:
-            return self.single_product.name
-        elif self.bonus_product:
-            return self.bonus_product.name
-        return "Unknown Product"
+        return self.product.name if self.product_id else "Unknown Product"
 
     def get_product_image(self):
         """Trả về ảnh sản phẩm"""
-        if self.single_product and self.single_product.image:
-            return self.single_product.image
-        elif self.bonus_product and self.bonus_product.image:
-            return self.bonus_product.image
+        if self.product_id and self.product.image:
+            return self.product.image
         return None
 
     def save(self, *args, **kwargs):
@@ -149,14 +287,56 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
     def clean(self):
-        """Validation để đảm bảo chỉ có một loại sản phẩm được chọn"""
+        """Validation để đảm bảo product_type khớp với sản phẩm"""
         from django.core.exceptions import ValidationError
 
-        if not self.single_product and not self.bonus_product:
-            raise ValidationError('Either single_product or bonus_product must be specified')
-
-        if self.single_product and self.bonus_product:
-            raise ValidationError('Cannot have both single_product and bonus_product')
+        if self.product_id and self.product.product_type != self.product_type:
+            raise ValidationError('product_type must match the product')
+
+
+def order_item_aggregates():
+    """Biểu thức aggregate trên OrderItem cho các cột tổng hợp của Order"""
+    money = models.DecimalField(max_digits=10, decimal_places=2)
+    return {
+        'item_count': Coalesce(Sum('quantity'), 0),
+        'main_line_count': Count('pk', filter=Q(product_type='single')),
+        'bonus_line_count': Count('pk', filter=Q(product_type='bonus')),
+        'main_total': Coalesce(Sum('total_price', filter=Q(product_type='single')), Value(Decimal('0')), output_field=money),
+        'bonus_total': Coalesce(Sum('total_price', filter=Q(product_type='bonus')), Value(Decimal('0')), output_field=money),
+    }
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        """Prefetch order_items kèm sản phẩm: một query cho tất cả order trong queryset"""
+        return self.prefetch_related(
+            models.Prefetch('order_items', queryset=OrderItem.objects.select_related('product').order_by('order_id', 'pk'))
+        )
+
+    def recompute_aggregates(self, batch_size=500):
+        """Tính lại các cột tổng hợp từ order_items cho các order trong queryset.
+
+        Chạy theo từng chunk ``batch_size`` order (theo pk): một query aggregate GROUP BY
+        order và một bulk UPDATE mỗi chunk. Trả về số order đã cập nhật.
+        """
+        queryset = self.order_by('pk')
+        updated = 0
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            orders = list(chunk.only('pk', 'total_amount')[:batch_size])
+            if not orders:
+                return updated
+            rows = {
+                row.pop('order_id'): row
+                for row in OrderItem.objects.filter(order__in=[order.pk for order in orders])
+                .values('order_id').annotate(**order_item_aggregates()).order_by()
+            }
+            for order in orders:
+                order.apply_aggregates(rows.get(order.pk))
+            Order.objects.bulk_update(orders, Order.AGGREGATE_FIELDS)
+            updated += len(orders)
+            last_pk = orders[-1].pk
 
 
 class Order(models.Model):
@@ -168,6 +348,14 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Các cạnh chuyển trạng thái được phép (store/order_status.py)
+    TRANSITIONS = {
+        'pending': ('processing', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
@@ -188,9 +376,10 @@ class Order(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
 
-    # Thông tin Shirtigo
+    # Thông tin Shirtigo (response thô nén trong ProviderPayload, xem shirtigo_response)
     shirtigo_order_id = models.CharField(max_length=100, blank=True, null=True)
-    shirtigo_response = models.JSONField(blank=True, null=True)
+    shirtigo_status = models.CharField(max_length=50, blank=True, null=True)
+    shirtigo_synced_at = models.DateTimeField(blank=True, null=True)
 
     # Print position từ order items (computed field)
     print_position = models.CharField(max_length=50, blank=True, null=True, help_text="Print position from order items")
@@ -198,32 +387,93 @@ class Order(models.Model):
     # Personalization field
     personalization = models.TextField(max_length=256, blank=True, null=True, help_text="Custom personalization text from customer")
 
+    # Tổng hợp từ order_items, cập nhật khi ghi (checkout, sửa item) để đọc không cần query items.
+    # Tính lại cho dữ liệu cũ: manage.py recompute_order_aggregates
+    item_count = models.PositiveIntegerField(default=0, help_text="Total quantity of all items")
+    main_line_count = models.PositiveIntegerField(default=0)
+    bonus_line_count = models.PositiveIntegerField(default=0)
+    main_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    bonus_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    AGGREGATE_FIELDS = ['item_count', 'main_line_count', 'bonus_line_count', 'main_total', 'bonus_total', 'total_amount']
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Lịch sử đơn hàng của user, keyset pagination theo (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='store_order_user_created'),
+            # Đơn hàng theo trạng thái, mới nhất trước (admin, xử lý đơn)
+            models.Index(fields=['status', 'created_at', 'id'], name='store_order_status_created'),
+            # Tra cứu theo id bên Shirtigo; chỉ các order đã gửi
+            models.Index(
+                fields=['shirtigo_order_id', 'created_at'], condition=Q(shirtigo_order_id__isnull=False),
+                name='store_order_shirtigo_id',
+            ),
+            # Export tăng dần theo updated_at (store/export.py)
+            models.Index(fields=['updated_at', 'id'], name='store_order_updated'),
+        ]
 
     def __str__(self):
-        return f"Order {self.id} - {self.user.username} - {self.get_total_quantity()} items"
+        return f"Order {self.id} - {self.user.username} - {self.item_count} items"
 
     @property
     def quantity(self):
-        """Tính tổng quantity của tất cả items"""
-        return sum(item.quantity for item in self.order_items.all())
+        """Tổng quantity của tất cả items (cột item_count)"""
+        return self.item_count
 
     def get_total_quantity(self):
         """Trả về tổng số lượng sản phẩm"""
-        return self.quantity
+        return self.item_count
+
+    @staticmethod
+    def aggregate_items(items):
+        """Giá trị các cột tổng hợp tính từ danh sách item trong bộ nhớ (không query)"""
+        main = [item for item in items if item.product_type == 'single']
+        bonus = [item for item in items if item.product_type == 'bonus']
+        return {
+            'item_count': sum(item.quantity for item in items),
+            'main_line_count': len(main),
+            'bonus_line_count': len(bonus),
+            'main_total': sum((item.total_price for item in main), Decimal('0')),
+            'bonus_total': sum((item.total_price for item in bonus), Decimal('0')),
+        }
+
+    def apply_aggregates(self, values):
+        """Gán các cột tổng hợp; ``values`` là kết quả của order_item_aggregates() (None = không có item).
+
+        total_amount chỉ được tính lại khi order có item, để không xóa tổng tiền của đơn cũ.
+        Trả về tên các field đã gán.
+        """
+        values = values or {'item_count': 0, 'main_line_count': 0, 'bonus_line_count': 0,
+                            'main_total': Decimal('0'), 'bonus_total': Decimal('0')}
+        for field, value in values.items():
+            setattr(self, field, value)
+        if not (values['main_line_count'] or values['bonus_line_count']):
+            return list(values)
+        self.total_amount = values['main_total'] + values['bonus_total']
+        return list(values) + ['total_amount']
 
     def calculate_total_amount(self):
-        """Tính lại tổng tiền từ các order items"""
-        return sum(item.total_price for item in self.order_items.all())
+        """Tính lại tổng tiền từ các order items (một query aggregate)"""
+        values = self.order_items.aggregate(**order_item_aggregates())
+        return values['main_total'] + values['bonus_total']
+
+    def recompute_aggregates(self):
+        """Tính lại các cột tổng hợp từ order_items (một query aggregate + một UPDATE)"""
+        fields = self.apply_aggregates(self.order_items.aggregate(**order_item_aggregates()))
+        self.updated_at = timezone.now()
+        Order.objects.filter(pk=self.pk).update(
+            updated_at=self.updated_at, **{field: getattr(self, field) for field in fields}
+        )
 
     def update_total_amount(self):
-        """Cập nhật total_amount từ các order items"""
-        self.total_amount = self.calculate_total_amount()
-        self.save(update_fields=['total_amount'])
+        """Cập nhật total_amount (và các cột tổng hợp khác) từ các order items"""
+        self.recompute_aggregates()
 
     def get_main_products(self):
         """Trả về danh sách main products"""
@@ -233,34 +483,256 @@ class Order(models.Model):
         """Trả về danh sách bonus products"""
         return self.order_items.filter(product_type='bonus')
 
-    def update_print_position_and_personalization(self):
-        """Cập nhật print_position và personalization từ cart data"""
-        # Get print position from order items (only for single products)
+    @staticmethod
+    def combine_print_options(items):
+        """Gộp print_position và personalization của các item sản phẩm chính (không query)"""
         print_positions = []
         personalizations = []
 
-        for item in self.order_items.filter(product_type='single'):
+        for item in items:
+            if item.product_type != 'single':
+                continue
             if item.print_position:
                 print_positions.append(item.print_position)
             if item.personalization:
                 personalizations.append(item.personalization)
 
-        # Combine unique print positions
-        if print_positions:
-            self.print_position = ', '.join(set(print_positions))
+        # Combine unique print positions / personalizations (if multiple, join them)
+        print_position = ', '.join(dict.fromkeys(print_positions)) or None
+        personalization = ' | '.join(dict.fromkeys(personalizations)) or None
+        return print_position, personalization
 
-        # Combine personalizations (if multiple, join them)
-        if personalizations:
-            self.personalization = ' | '.join(set(personalizations))
+    def update_print_position_and_personalization(self):
+        """Cập nhật print_position và personalization từ cart data"""
+        print_position, personalization = self.combine_print_options(self.order_items.filter(product_type='single'))
+        if print_position:
+            self.print_position = print_position
+        if personalization:
+            self.personalization = personalization
 
         # Save the order
-        self.save(update_fields=['print_position', 'personalization'])
+        self.save(update_fields=['print_position', 'personalization', 'updated_at'])
+
+    @property
+    def shirtigo_response(self):
+        """Response thô của Shirtigo (giải nén từ ProviderPayload; một query nếu chưa select_related)"""
+        try:
+            return self.provider_payload.payload
+        except ProviderPayload.DoesNotExist:
+            return None
+
+    def record_shirtigo_response(self, result, now=None):
+        """Lưu id/trạng thái Shirtigo vào order và response thô (nén) vào ProviderPayload"""
+        now = now or timezone.now()
+        self.shirtigo_order_id = str(result['id'])
+        self.shirtigo_status = provider_status(result)
+        self.shirtigo_synced_at = now
+        Order.objects.filter(pk=self.pk).update(
+            shirtigo_order_id=self.shirtigo_order_id, shirtigo_status=self.shirtigo_status,
+            shirtigo_synced_at=now, updated_at=now,
+        )
+        self.provider_payload = ProviderPayload.store(self.pk, result)
 
     def update_status_after_payment(self):
         """Cập nhật status thành processing sau khi thanh toán thành công"""
         if self.status == 'pending':
             self.status = 'processing'
-            self.save(update_fields=['status'])
+            self.save(update_fields=['status', 'updated_at'])
+
+
+
+class ArchivedOrder(models.Model):
+    """Đơn hàng đã xong (delivered/cancelled) được chuyển khỏi bảng Order (store/archive.py).
+
+    Một dòng mỗi order, các item lưu gọn trong ``items`` (JSON, kèm tên/ảnh sản phẩm lúc
+    lưu trữ) nên bảng Order/OrderItem chỉ còn đơn hàng đang xử lý. Chỉ đọc.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+
+    email = models.EmailField()
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    address = models.TextField()
+    city = models.CharField(max_length=100)
+    country = models.CharField(max_length=100)
+    postal_code = models.CharField(max_length=20)
+    phone = models.CharField(max_length=20, blank=True)
+
+    print_position = models.CharField(max_length=50, blank=True, null=True)
+    personalization = models.TextField(max_length=256, blank=True, null=True)
+    shirtigo_order_id = models.CharField(max_length=100, blank=True, null=True)
+    shirtigo_status = models.CharField(max_length=50, blank=True, null=True)
+    shirtigo_synced_at = models.DateTimeField(blank=True, null=True)
+    # Payload nén nguyên trạng từ ProviderPayload (rỗng nếu không có)
+    shirtigo_codec = models.CharField(max_length=10, blank=True, default='')
+    shirtigo_payload = models.BinaryField(blank=True, null=True)
+
+    item_count = models.PositiveIntegerField(default=0)
+    main_line_count = models.PositiveIntegerField(default=0)
+    bonus_line_count = models.PositiveIntegerField(default=0)
+    main_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    bonus_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # [{'id', 'product_type', 'product_id', 'product_name', 'product_image', 'quantity',
+    #   'unit_price', 'total_price', 'print_position', 'personalization'}, ...]
+    items = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    # Giữ nguyên thời gian của order gốc
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Archived Order"
+        verbose_name_plural = "Archived Orders"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='store_archorder_user_created'),
+            models.Index(fields=['updated_at', 'id'], name='store_archorder_updated'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id} - {self.item_count} items"
+
+    @property
+    def shirtigo_response(self):
+        """Response thô của Shirtigo (nén, chuyển từ ProviderPayload khi lưu trữ)"""
+        return unpack(self.shirtigo_codec, self.shirtigo_payload) if self.shirtigo_codec else None
+
+
+class ProviderPayload(models.Model):
+    """Response thô của provider (Shirtigo) cho một order, lưu nén (store/payloads.py).
+
+    Tách khỏi bảng Order để dòng order nhỏ; chỉ đọc khi cần (``?expand=shirtigo``, admin).
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='provider_payload')
+    provider = models.CharField(max_length=20, default='shirtigo')
+    codec = models.CharField(max_length=10, default=DEFAULT_CODEC)
+    data = models.BinaryField()
+    raw_size = models.PositiveIntegerField(default=0, help_text="Size of the JSON before compression")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Provider Payload"
+        verbose_name_plural = "Provider Payloads"
+
+    def __str__(self):
+        return f"{self.provider} payload for order {self.order_id}"
+
+    @property
+    def payload(self):
+        return unpack(self.codec, self.data)
+
+    @classmethod
+    def store(cls, order_id, payload, provider='shirtigo'):
+        data, raw_size = pack(payload)
+        return cls.objects.update_or_create(
+            order_id=order_id,
+            defaults={'provider': provider, 'codec': DEFAULT_CODEC, 'data': data, 'raw_size': raw_size},
+        )[0]
+
+
+class ShirtigoOutbox(models.Model):
+    """Đơn hàng chờ gửi đến Shirtigo - ghi cùng transaction với order, worker gửi sau"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('in_progress', 'In progress'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead letter'),
+    ]
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='shirtigo_outbox')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    # Worker đang giữ entry và thời hạn giữ (hết hạn thì worker khác được lấy lại)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Shirtigo Outbox Entry"
+        verbose_name_plural = "Shirtigo Outbox"
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='store_outbox_due'),
+        ]
+
+    def __str__(self):
+        return f"Shirtigo {self.order_id} - {self.status} ({self.attempts} attempts)"
+
+
+class QueuedEmail(models.Model):
+    """Email chờ gửi - sender chạy nền (manage.py send_queued_emails) gửi theo batch"""
+    KIND_CHOICES = [
+        ('order_confirmation', 'Order confirmation'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='queued_emails')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Queued Email"
+        verbose_name_plural = "Queued Emails"
+        ordering = ['next_attempt_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='store_email_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.order_id} - {self.status}"
+
+
+class IdempotencyKey(models.Model):
+    """Idempotency-Key của một request (store/idempotency.py) và response đã lưu"""
+    STATUS_CHOICES = [
+        ('in_progress', 'In progress'),
+        ('completed', 'Completed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True)
+    # Hạn giữ key in_progress: request bị bỏ dở (worker chết) không khóa key đến expires_at
+    locked_until = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='store_idem_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key} ({self.status})"
 
 
 class Contact(models.Model):
@@ -276,6 +748,11 @@ class Contact(models.Model):
         verbose_name = "Liên hệ"
         verbose_name_plural = "Liên hệ"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='store_contact_created'),
+            # Liên hệ chưa đọc (nhỏ, chỉ chứa dòng is_read=False)
+            models.Index(fields=['created_at'], condition=Q(is_read=False), name='store_contact_unread'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.email} - {self.created_at.strftime('%d/%m/%Y')}"
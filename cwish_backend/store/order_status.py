@@ -0,0 +1,92 @@
+"""Chuyển trạng thái đơn hàng theo bảng ``Order.TRANSITIONS``.
+
+Một lần chuyển (một hay nhiều order) là một ``UPDATE ... WHERE status IN (...)`` có
+điều kiện: chỉ các order đang ở trạng thái được phép (và qua guard) bị cập nhật, nên
+hai request đồng thời không thể đưa một order đi sai cạnh. Các order bị bỏ qua được
+trả về kèm lý do.
+
+Guard là hàm trả về ``Q`` (điều kiện thêm vào WHERE) cho một cạnh, đăng ký bằng
+``@guard('processing', 'shipped')``.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Order
+
+# (source, target) -> [hàm trả về Q]
+GUARDS = defaultdict(list)
+
+
+class TransitionError(ValueError):
+    """Trạng thái đích không hợp lệ"""
+
+
+def guard(source, target):
+    """Đăng ký điều kiện cho cạnh source -> target (hàm không tham số, trả về Q)"""
+    if target not in Order.TRANSITIONS.get(source, ()):
+        raise TransitionError(f'No transition {source} -> {target}')
+
+    def register(func):
+        GUARDS[(source, target)].append(func)
+        return func
+    return register
+
+
+def allowed_sources(target):
+    """Các trạng thái có cạnh đi đến ``target``"""
+    if target not in dict(Order.STATUS_CHOICES):
+        raise TransitionError(f'Invalid status: {target}')
+    return [source for source, targets in Order.TRANSITIONS.items() if target in targets]
+
+
+def _condition(target):
+    condition = Q(pk__in=[])
+    for source in allowed_sources(target):
+        edge = Q(status=source)
+        for func in GUARDS.get((source, target), ()):
+            edge &= func()
+        condition |= edge
+    return condition
+
+
+def _skip_reason(current, target):
+    if current is None:
+        return 'not_found'
+    if current == target:
+        return 'already_in_status'
+    if target not in Order.TRANSITIONS.get(current, ()):
+        return 'invalid_transition'
+    return 'guard_failed'
+
+
+def transition(order_ids, target, queryset=None):
+    """Chuyển các order trong ``order_ids`` sang ``target``.
+
+    Một UPDATE có điều kiện + một SELECT để báo kết quả. Chỉ ghi ``status`` và
+    ``updated_at``. Trả về ``(updated_ids, skipped)`` với ``skipped`` là list
+    ``{'id', 'status', 'reason'}``.
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    order_ids = list(dict.fromkeys(Order._meta.pk.to_python(pk) for pk in order_ids))
+    condition = _condition(target)
+    now = timezone.now()
+
+    with transaction.atomic():
+        queryset.filter(condition, pk__in=order_ids).update(status=target, updated_at=now)
+        # Dòng vừa cập nhật có đúng updated_at = now
+        rows = {
+            pk: (status, updated_at)
+            for pk, status, updated_at in queryset.filter(pk__in=order_ids).values_list('pk', 'status', 'updated_at')
+        }
+
+    updated, skipped = [], []
+    for pk in order_ids:
+        current, updated_at = rows.get(pk, (None, None))
+        if current == target and updated_at == now:
+            updated.append(pk)
+        else:
+            skipped.append({'id': pk, 'status': current, 'reason': _skip_reason(current, target)})
+    return updated, skipped
@@ -0,0 +1,171 @@
+"""Outbox gửi đơn hàng đến Shirtigo ngoài request checkout.
+
+Checkout chỉ ghi một dòng ``ShirtigoOutbox`` trong cùng transaction với order.
+Lệnh ``drain_shirtigo_outbox`` lấy các entry đến hạn, gửi song song (giới hạn số
+luồng) và chuyển order sang ``processing`` khi Shirtigo trả về id. Lỗi tạm thời
+được thử lại với exponential backoff; quá số lần (hoặc lỗi 4xx) thì vào dead letter.
+
+Timeout sau khi đã gửi (Shirtigo có thể đã tạo order) không được gửi lại tự động
+vì sẽ tạo order trùng: entry vào dead letter, kiểm tra trên Shirtigo cockpit rồi
+dùng action "Retry" trong admin nếu order chưa được tạo.
+"""
+import os
+import random
+import socket
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import shirtigo
+from .models import Order, ShirtigoOutbox
+
+# Lỗi 4xx là lỗi dữ liệu, gửi lại cũng không thành công (trừ timeout / rate limit)
+RETRYABLE_CLIENT_ERRORS = (408, 409, 425, 429)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_order(order):
+    """Thêm order vào outbox (gọi trong transaction tạo order)"""
+    return ShirtigoOutbox.objects.create(order=order)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff_delay(attempts, base=None, cap=None):
+    """Exponential backoff có jitter: base * 2^(n-1), tối đa ``cap`` giây"""
+    base = base if base is not None else _setting('SHIRTIGO_OUTBOX_BACKOFF_BASE', 30)
+    cap = cap if cap is not None else _setting('SHIRTIGO_OUTBOX_BACKOFF_MAX', 3600)
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def _due(now):
+    # Entry đến hạn, hoặc đang xử lý nhưng worker giữ nó đã hết hạn (worker chết giữa chừng)
+    return Q(status='pending', next_attempt_at__lte=now) | Q(status='in_progress', locked_until__lt=now)
+
+
+def claim_batch(worker_id, limit, lease_seconds=None):
+    """Giữ tối đa ``limit`` entry đến hạn cho worker này.
+
+    Mỗi entry được giữ bằng một UPDATE có điều kiện; khi hai worker tranh cùng một
+    entry chỉ một UPDATE khớp, nên một order không bị gửi hai lần.
+    """
+    lease_seconds = lease_seconds or _setting('SHIRTIGO_OUTBOX_LEASE', 120)
+    now = timezone.now()
+    candidates = list(
+        ShirtigoOutbox.objects.filter(_due(now)).order_by('next_attempt_at').values_list('pk', flat=True)[:limit]
+    )
+    claimed = []
+    for pk in candidates:
+        updated = ShirtigoOutbox.objects.filter(_due(now), pk=pk).update(
+            status='in_progress', locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease_seconds), updated_at=now,
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def _describe(result):
+    if result is None:
+        return 'Network error'
+    if result.get('ambiguous'):
+        status_code = result.get('status_code')
+        reason = f"HTTP {status_code} without an order id" if status_code else 'Timeout after sending'
+        return f"{reason}, check Shirtigo before retrying: {str(result.get('response_body', ''))[:1000]}"
+    if result.get('error'):
+        return f"HTTP {result.get('status_code')}: {str(result.get('response_body', ''))[:1000]}"
+    return f"Unexpected response: {str(result)[:1000]}"
+
+
+def _retry_at(now, attempts, result):
+    """Lần thử tiếp theo: exponential backoff, không sớm hơn ``Retry-After`` của Shirtigo"""
+    delay = backoff_delay(attempts)
+    retry_after = str((result or {}).get('retry_after') or '')
+    if retry_after.isdigit():
+        delay = max(delay, timedelta(seconds=int(retry_after)))
+    return now + delay
+
+
+def _is_permanent(result):
+    if (result or {}).get('ambiguous'):
+        return True
+    status_code = (result or {}).get('status_code') or 0
+    return 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS
+
+
+def deliver(pk, worker_id):
+    """Gửi một entry đã giữ. Trả về 'sent', 'retry', 'dead' hoặc 'lost' (mất quyền giữ)"""
+    entry = ShirtigoOutbox.objects.select_related('order').get(pk=pk)
+    if entry.status != 'in_progress' or entry.locked_by != worker_id:
+        return 'lost'
+
+    result = shirtigo.submit_order(entry.order)
+    now = timezone.now()
+    mine = ShirtigoOutbox.objects.filter(pk=pk, status='in_progress', locked_by=worker_id)
+
+    if result and result.get('id'):
+        with transaction.atomic():
+            if not mine.update(status='sent', attempts=F('attempts') + 1, locked_until=None, last_error='', updated_at=now):
+                return 'lost'
+            # id/trạng thái vào Order, response thô nén vào ProviderPayload
+            entry.order.record_shirtigo_response(result, now)
+            # Cập nhật status thành processing
+            Order.objects.filter(pk=entry.order_id, status='pending').update(status='processing', updated_at=now)
+        print(f"✅ Shirtigo outbox: order {entry.order_id} -> {result['id']}")
+        return 'sent'
+
+    attempts = entry.attempts + 1
+    error = _describe(result)
+    if _is_permanent(result) or attempts >= _setting('SHIRTIGO_OUTBOX_MAX_ATTEMPTS', 8):
+        mine.update(status='dead', attempts=attempts, locked_until=None, last_error=error, updated_at=now)
+        print(f"❌ Shirtigo outbox: order {entry.order_id} dead after {attempts} attempt(s): {error}")
+        return 'dead'
+
+    mine.update(
+        status='pending', attempts=attempts, next_attempt_at=_retry_at(now, attempts, result),
+        locked_by='', locked_until=None, last_error=error, updated_at=now,
+    )
+    print(f"⚠️ Shirtigo outbox: order {entry.order_id} attempt {attempts} failed, will retry: {error}")
+    return 'retry'
+
+
+def _deliver_in_thread(pk, worker_id):
+    try:
+        return deliver(pk, worker_id)
+    except Exception as e:
+        # Entry vẫn in_progress, sẽ được lấy lại khi hết hạn giữ
+        print(f"❌ Shirtigo outbox: unexpected error for entry {pk}: {e}")
+        return 'error'
+    finally:
+        connections.close_all()
+
+
+def drain(worker_id=None, concurrency=None, batch_size=None, lease_seconds=None):
+    """Giữ một batch và gửi với tối đa ``concurrency`` request đồng thời.
+
+    Trả về Counter kết quả ({'sent': n, 'retry': n, ...}); rỗng khi không có entry đến hạn.
+    """
+    if not shirtigo.is_configured():
+        # Không giữ entry nào: order vẫn pending, không tốn lượt thử
+        print("❌ Shirtigo outbox: SHIRTIGO_API_TOKEN is not set, skipping")
+        return Counter()
+    worker_id = worker_id or default_worker_id()
+    concurrency = concurrency or _setting('SHIRTIGO_OUTBOX_CONCURRENCY', 4)
+    claimed = claim_batch(worker_id, batch_size or _setting('SHIRTIGO_OUTBOX_BATCH_SIZE', 20), lease_seconds)
+    if not claimed:
+        return Counter()
+    if concurrency <= 1:
+        return Counter(deliver(pk, worker_id) for pk in claimed)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return Counter(pool.map(lambda pk: _deliver_in_thread(pk, worker_id), claimed))
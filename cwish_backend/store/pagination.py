@@ -0,0 +1,169 @@
+"""Keyset (cursor) pagination - không dùng COUNT(*) hay OFFSET.
+
+Mỗi cách sắp xếp là một bộ (field, 'id') được hỗ trợ bởi index tương ứng; cursor
+lưu giá trị của dòng cuối trang nên trang sau là một index range scan.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = 24
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    # Tên ordering cho client -> các field sắp xếp (field cuối phải unique, các field cùng chiều)
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+    }
+    default_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request):
+        key = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if key not in self.orderings:
+            key = self.default_ordering
+        return key, self.orderings[key]
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'v': [str(v) for v in values], 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            raw_values = payload['v']
+            if len(raw_values) != len(fields):
+                raise ValueError
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(raw)
+                for field, raw in zip(fields, raw_values)
+            ]
+            return values, bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _after(fields, values):
+        """Q lọc các dòng đứng sau (values) theo thứ tự fields"""
+        condition = Q()
+        for i, field in enumerate(fields):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_field, prev_value in zip(fields[:i], values[:i]):
+                term &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= term
+        return condition
+
+    @staticmethod
+    def _invert(fields):
+        return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in fields)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Một trang của ``queryset``, hoặc của nhiều queryset gộp lại (list/tuple).
+
+        Khi gộp, các queryset phải có cùng field sắp xếp: mỗi queryset lấy tối đa
+        page_size + 1 dòng sau cursor rồi trộn theo thứ tự đó.
+        """
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.ordering_key, fields = self.get_ordering(request)
+        self.fields = fields
+
+        querysets = list(queryset) if isinstance(queryset, (list, tuple)) else [queryset]
+        values, reverse = self.decode_cursor(request, querysets[0].model, fields)
+        order = self._invert(fields) if reverse else fields
+        rows = []
+        for queryset in querysets:
+            if values is not None:
+                queryset = queryset.filter(self._after(order, values))
+            rows += queryset.order_by(*order)[:self.page_size_value + 1]
+        if len(querysets) > 1:
+            # Các field của một ordering cùng chiều (xem orderings)
+            rows.sort(key=lambda row: [getattr(row, field.lstrip('-')) for field in order],
+                      reverse=order[0].startswith('-'))
+
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = (values is not None) if not reverse else has_more
+        self.page = rows
+        return rows
+
+    def _row_values(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.fields]
+
+    def _link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_query_param, self.encode_cursor(self._row_values(row), reverse))
+        return url
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ProductKeysetPagination(KeysetPagination):
+    """Phân trang cho danh sách sản phẩm catalog"""
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+
+class OrderKeysetPagination(KeysetPagination):
+    """Phân trang lịch sử đơn hàng của user (index store_order_user_created và
+    store_archorder_user_created khi gộp đơn đã lưu trữ)"""
+    page_size = 20
+    orderings = {
+        '-created_at': ('-created_at', '-id'),
+    }
@@ -0,0 +1,35 @@
+"""Nén/giải nén payload thô của provider (Shirtigo) lưu trong ``ProviderPayload``.
+
+JSON được nén (mặc định zlib) trước khi ghi; cột ``codec`` cho biết cách giải nén nên
+có thể thêm codec khác mà không cần chuyển dữ liệu cũ.
+"""
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+CODECS = {
+    'zlib': (lambda raw: zlib.compress(raw, 6), zlib.decompress),
+}
+DEFAULT_CODEC = 'zlib'
+
+
+def pack(payload, codec=DEFAULT_CODEC):
+    """Trả về ``(data, raw_size)``: JSON của payload đã nén và kích thước trước khi nén"""
+    raw = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    compress, _ = CODECS[codec]
+    return compress(raw), len(raw)
+
+
+def unpack(codec, data):
+    if data is None:
+        return None
+    _, decompress = CODECS[codec]
+    return json.loads(decompress(bytes(data)))
+
+
+def provider_status(payload):
+    """Trạng thái đơn hàng bên provider trong response (nếu có)"""
+    if isinstance(payload, dict) and payload.get('status') is not None:
+        return str(payload['status'])[:50]
+    return None
@@ -1,35 +1,107 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
-from .models import SingleProduct, UserCart, Order, Contact, DigitalBonusProduct, BonusCart, OrderItem
+from .models import (
+    StoreProduct, SingleProduct, CartLine, Order, Contact, DigitalBonusProduct, OrderItem,
+    Category, Product, ProductOption, ProductVariant, ProductImage, ArchivedOrder
+)
+from .cache import get_active_product
+from .cart import bump_cart_version
+from .emails import EMAIL_IMAGE_WIDTH, enqueue_order_confirmation
+from .outbox import enqueue_order
+from .images import srcset_map, pick_variant_url
 
 
-class SingleProductSerializer(serializers.ModelSerializer):
+class ImageSrcsetMixin(serializers.Serializer):
+    """Thêm field image_srcset: {'webp': 'url 320w, ...', 'jpeg': ...}"""
+    image_srcset = serializers.SerializerMethodField()
+
+    def get_image_srcset(self, obj):
+        return srcset_map(obj.image_variants, self.context.get('request'))
+
+
+class SingleProductSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     class Meta:
         model = SingleProduct
-        fields = ['id', 'name', 'description', 'price', 'currency', 'image', 'is_active', 'print_position']
+        fields = ['id', 'name', 'description', 'price', 'currency', 'image', 'image_srcset', 'is_active', 'print_position']
 
 
-class DigitalBonusProductSerializer(serializers.ModelSerializer):
+class DigitalBonusProductSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     class Meta:
         model = DigitalBonusProduct
-        fields = ['id', 'name', 'description', 'price', 'currency', 'image', 'is_active', 'is_digital']
+        fields = ['id', 'name', 'description', 'price', 'currency', 'image', 'image_srcset', 'is_active', 'is_digital']
 
 
-class UserCartSerializer(serializers.ModelSerializer):
-    product = SingleProductSerializer(read_only=True)
-    total_price = serializers.ReadOnlyField()
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'description']
+
+
+class ProductOptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductOption
+        fields = ['id', 'name', 'values']
+
 
+class ProductVariantSerializer(serializers.ModelSerializer):
     class Meta:
-        model = UserCart
-        fields = ['id', 'product', 'quantity', 'total_price', 'print_position', 'personalization', 'created_at', 'updated_at']
+        model = ProductVariant
+        fields = ['id', 'title', 'sku', 'options', 'price', 'inventory_quantity']
 
 
-class BonusCartSerializer(serializers.ModelSerializer):
-    product = DigitalBonusProductSerializer(read_only=True)
+class ProductImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImage
+        fields = ['id', 'image', 'alt_text', 'is_primary']
+
+
+class ProductSerializer(serializers.ModelSerializer):
+    """Sản phẩm catalog - variants/options/images phải được prefetch sẵn"""
+    category = CategorySerializer(read_only=True)
+    options = ProductOptionSerializer(many=True, read_only=True)
+    variants = ProductVariantSerializer(many=True, read_only=True)
+    images = ProductImageSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'title', 'handle', 'description', 'category', 'weight', 'status',
+            'price', 'currency', 'options', 'variants', 'images', 'created_at', 'updated_at'
+        ]
+
+
+class VariantLookupSerializer(ProductVariantSerializer):
+    """Variant kèm thông tin cơ bản của sản phẩm (tra cứu theo SKU)"""
+    product = serializers.SerializerMethodField()
+
+    class Meta(ProductVariantSerializer.Meta):
+        fields = ProductVariantSerializer.Meta.fields + ['product']
+
+    def get_product(self, obj):
+        return {'id': obj.product_id, 'title': obj.product.title, 'handle': obj.product.handle}
+
+
+class StoreProductSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
+    """Sản phẩm (chính hoặc bonus) trong bảng sản phẩm chung"""
+    class Meta:
+        model = StoreProduct
+        fields = [
+            'id', 'product_type', 'name', 'description', 'price', 'currency', 'image', 'image_srcset',
+            'is_active', 'print_position', 'is_digital'
+        ]
+
+
+class CartLineSerializer(serializers.ModelSerializer):
+    product = StoreProductSerializer(read_only=True)
     total_price = serializers.ReadOnlyField()
-    
+
     class Meta:
-        model = BonusCart
-        fields = ['id', 'product', 'quantity', 'total_price', 'created_at', 'updated_at']
+        model = CartLine
+        fields = [
+            'id', 'product', 'product_type', 'quantity', 'total_price', 'print_position', 'personalization',
+            'created_at', 'updated_at'
+        ]
 
 
 class AddToCartSerializer(serializers.Serializer):
@@ -50,16 +122,44 @@ class UpdateBonusCartQuantitySerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=0)  # Cho phép 0 để xóa sản phẩm
 
 
+class CartOperationSerializer(serializers.Serializer):
+    """Một thao tác trong /api/cart/batch/"""
+    OPS = ('add', 'set_quantity', 'remove', 'set_options', 'clear')
+
+    op = serializers.ChoiceField(choices=OPS)
+    product_type = serializers.ChoiceField(choices=['single', 'bonus'], required=False)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    print_position = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    personalization = serializers.CharField(max_length=256, required=False, allow_blank=True)
+
+    def validate(self, data):
+        op = data['op']
+        if op != 'clear' and 'product_type' not in data:
+            raise serializers.ValidationError({'product_type': 'This field is required.'})
+        if op in ('add', 'set_quantity') and 'quantity' not in data:
+            raise serializers.ValidationError({'quantity': 'This field is required.'})
+        if op == 'add' and data['quantity'] < 1:
+            raise serializers.ValidationError({'quantity': 'Ensure this value is greater than or equal to 1.'})
+        if data.get('product_type') == 'bonus' and ('print_position' in data or 'personalization' in data):
+            raise serializers.ValidationError('Bonus items have no print position or personalization.')
+        if op == 'set_options' and 'print_position' not in data and 'personalization' not in data:
+            raise serializers.ValidationError('Nothing to update.')
+        return data
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
-    single_product = SingleProductSerializer(read_only=True)
-    bonus_product = DigitalBonusProductSerializer(read_only=True)
+    product = StoreProductSerializer(read_only=True)
     product_name = serializers.SerializerMethodField()
     product_image = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
         fields = [
-            'id', 'product_type', 'single_product', 'bonus_product',
+            'id', 'product_type', 'product',
             'quantity', 'unit_price', 'total_price', 'print_position', 'personalization', 'product_name', 'product_image'
         ]
 
@@ -69,8 +169,11 @@ class OrderItemSerializer(serializers.ModelSerializer):
     def get_product_image(self, obj):
         image = obj.get_product_image()
         if image:
-            # Trả về URL tuyệt đối cho email
+            # Trả về URL tuyệt đối cho email, ưu tiên bản JPEG đã resize
             request = self.context.get('request')
+            variant_url = pick_variant_url(obj.product.image_variants, EMAIL_IMAGE_WIDTH, request=request)
+            if variant_url:
+                return variant_url
             if request:
                 return request.build_absolute_uri(image.url)
             else:
@@ -81,26 +184,161 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    """Đơn hàng kèm các dòng sản phẩm.
+
+    Query params (khi có ``request`` trong context):
+
+    - ``fields=id,status,total_amount,created_at``: chỉ trả về các field này
+    - ``expand=products,shirtigo``: thêm ``main_products``/``bonus_products`` và
+      ``shirtigo_response`` (mặc định không tính; response thô đọc từ ProviderPayload)
+
+    ``quantity`` và các số dòng/tổng tiền đọc từ cột tổng hợp của Order. Danh sách
+    sản phẩm chính/bonus được tách từ ``order_items`` (không query hay serialize lại).
+    Khi serialize nhiều order, queryset nên dùng ``Order.objects.with_items()`` nếu
+    ``needs_items()``.
+    """
     order_items = OrderItemSerializer(many=True, read_only=True)
-    quantity = serializers.ReadOnlyField()
-    main_products = serializers.SerializerMethodField()
-    bonus_products = serializers.SerializerMethodField()
+    quantity = serializers.IntegerField(source='item_count', read_only=True)
+
+    # Thứ tự field trong response (gồm cả field tính từ order_items)
+    OUTPUT_FIELDS = [
+        'id', 'user', 'order_items', 'quantity', 'main_line_count', 'bonus_line_count',
+        'main_total', 'bonus_total', 'total_amount', 'currency',
+        'email', 'first_name', 'last_name', 'address', 'city', 'country', 'postal_code',
+        'phone', 'status', 'print_position', 'personalization', 'main_products', 'bonus_products',
+        'shirtigo_order_id', 'shirtigo_status', 'shirtigo_synced_at', 'shirtigo_response', 'created_at', 'updated_at'
+    ]
+    # Tên trong ?expand= -> các field nặng, mặc định không có
+    EXPANDABLE = {
+        'products': ('main_products', 'bonus_products'),
+        'shirtigo': ('shirtigo_response',),
+    }
+    # Field tách từ order_items, không phải field của model
+    DERIVED = ('main_products', 'bonus_products')
+    # Field không phải cột của model -> các cột/quan hệ cần đọc (rỗng: lấy qua prefetch)
+    FIELD_COLUMNS = {
+        'order_items': (), 'main_products': (), 'bonus_products': (), 'shirtigo_response': ('provider_payload',),
+    }
+    # Field đọc từ bảng khác qua select_related
+    RELATED = {'shirtigo_response': 'provider_payload'}
 
     class Meta:
         model = Order
         fields = [
-            'id', 'user', 'order_items', 'quantity', 'total_amount', 'currency',
+            'id', 'user', 'order_items', 'quantity', 'main_line_count', 'bonus_line_count',
+            'main_total', 'bonus_total', 'total_amount', 'currency',
             'email', 'first_name', 'last_name', 'address', 'city', 'country', 'postal_code',
-            'phone', 'status', 'print_position', 'personalization', 'main_products', 'bonus_products',
-            'shirtigo_order_id', 'shirtigo_response', 'created_at', 'updated_at'
+            'phone', 'status', 'print_position', 'personalization',
+            'shirtigo_order_id', 'shirtigo_status', 'shirtigo_synced_at', 'shirtigo_response', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
 
-    def get_main_products(self, obj):
-        return OrderItemSerializer(obj.get_main_products(), many=True).data
+    @classmethod
+    def requested_fields(cls, request):
+        """Các field sẽ có trong response theo ``fields``/``expand`` của request"""
+        params = request.query_params if request is not None else {}
+        expand = {name.strip() for name in params.get('expand', '').split(',')}
+        expanded = {field for name, fields in cls.EXPANDABLE.items() if name in expand for field in fields}
+        if params.get('fields'):
+            wanted = {name.strip() for name in params['fields'].split(',')}
+            return [field for field in cls.OUTPUT_FIELDS if field in wanted or field in expanded]
+        heavy = {field for fields in cls.EXPANDABLE.values() for field in fields}
+        return [field for field in cls.OUTPUT_FIELDS if field not in heavy or field in expanded]
+
+    @classmethod
+    def model_columns(cls, request):
+        """Các cột của model cần đọc cho response (để view dùng ``only()``)"""
+        columns = []
+        for field in cls.requested_fields(request):
+            if field in cls.FIELD_COLUMNS:
+                columns += cls.FIELD_COLUMNS[field]
+                continue
+            declared = cls._declared_fields.get(field)
+            columns.append(declared.source if declared is not None else field)
+        return list(dict.fromkeys(columns))
+
+    @classmethod
+    def related(cls, request):
+        """Các quan hệ cần ``select_related`` cho response"""
+        return [cls.RELATED[field] for field in cls.requested_fields(request) if field in cls.RELATED]
+
+    @classmethod
+    def needs_items(cls, request):
+        """Response có cần order_items (để view quyết định có prefetch hay không)"""
+        return bool({'order_items', *cls.DERIVED} & set(cls.requested_fields(request)))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_fields = self.requested_fields(self.context.get('request'))
+        for name in set(self.fields) - set(self.output_fields):
+            self.fields.pop(name)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'main_products' in self.output_fields or 'bonus_products' in self.output_fields:
+            items = data.get('order_items')
+            if items is None:
+                items = self.serialize_items(instance)
+            data['main_products'] = [item for item in items if item['product_type'] == 'single']
+            data['bonus_products'] = [item for item in items if item['product_type'] == 'bonus']
+        return {name: data[name] for name in self.output_fields}
+
+    def serialize_items(self, instance):
+        return OrderItemSerializer(instance.order_items.all(), many=True, context=self.context).data
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    """Đơn hàng đã lưu trữ - cùng dạng response (và ``fields``/``expand``) với OrderSerializer.
+
+    Item đọc từ ``ArchivedOrder.items`` (tên/ảnh sản phẩm lúc lưu trữ, ``product`` là None).
+    """
+    order_items = serializers.SerializerMethodField()
+
+    FIELD_COLUMNS = {
+        'order_items': ('items',), 'main_products': ('items',), 'bonus_products': ('items',),
+        'shirtigo_response': ('shirtigo_codec', 'shirtigo_payload'),
+    }
+    RELATED = {}
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+        read_only_fields = OrderSerializer.Meta.fields
+
+    def get_order_items(self, obj):
+        return self.serialize_items(obj)
+
+    def serialize_items(self, instance):
+        return [
+            {
+                'id': item['id'],
+                'product_type': item['product_type'],
+                'product': None,
+                'quantity': item['quantity'],
+                'unit_price': item['unit_price'],
+                'total_price': item['total_price'],
+                'print_position': item['print_position'],
+                'personalization': item['personalization'],
+                'product_name': item['product_name'],
+                'product_image': self._image_url(item['product_image']),
+            }
+            for item in instance.items
+        ]
+
+    def _image_url(self, name):
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        from django.conf import settings
+        return f"{settings.SITE_URL}{url}"
+
 
-    def get_bonus_products(self, obj):
-        return OrderItemSerializer(obj.get_bonus_products(), many=True).data
+class OrderStatusTransitionSerializer(serializers.Serializer):
+    """Chuyển nhiều đơn hàng sang một trạng thái (xem Order.TRANSITIONS)"""
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=5000)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
@@ -112,102 +350,109 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         ]
 
     def create(self, validated_data):
-        user = self.context['request'].user
+        """Tạo đơn hàng từ giỏ hàng trong một transaction.
 
-        # Lấy sản phẩm chính từ giỏ hàng
-        main_cart_items = UserCart.objects.filter(user=user)
-        bonus_cart_items = BonusCart.objects.filter(user=user)
+        Số query cố định, không phụ thuộc số dòng: khóa + đọc các dòng giỏ hàng,
+        một INSERT cho order, một bulk INSERT cho items, một DELETE giỏ hàng,
+        một INSERT vào Shirtigo outbox và một INSERT vào hàng đợi email.
+        """
+        user = self.context['request'].user
 
-        # Nếu giỏ hàng trống, tạo đơn với sản phẩm mặc định (fallback cho frontend hiện tại)
-        if not main_cart_items.exists() and not bonus_cart_items.exists():
-            request = self.context.get('request')
-            payload_items = []
-            try:
-                payload_items = (request.data.get('items') or []) if request else []
-            except Exception:
-                payload_items = []
+        with transaction.atomic():
+            # Khóa các dòng giỏ hàng (sản phẩm chính + bonus) để request thêm vào giỏ
+            # đồng thời không chen vào giữa lúc đọc và lúc xóa
+            cart_items = list(
+                CartLine.objects.select_for_update(of=('self',)).filter(user=user).select_related('product')
+            )
 
-            # Lấy sản phẩm đang active (website 1 sản phẩm)
-            main_product = SingleProduct.objects.filter(is_active=True).first()
-            if not main_product:
-                raise serializers.ValidationError("No active product available")
+            # Nếu giỏ hàng trống, tạo đơn với sản phẩm mặc định (fallback cho frontend hiện tại)
+            if not cart_items:
+                return self._create_default_order(user, validated_data)
+
+            # Tính items, tổng tiền, print position/personalization và các cột tổng hợp trong bộ nhớ
+            items = [
+                OrderItem(
+                    product_type=cart_item.product_type,
+                    product=cart_item.product,
+                    quantity=cart_item.quantity,
+                    unit_price=cart_item.product.price,
+                    total_price=cart_item.quantity * cart_item.product.price,
+                    print_position=cart_item.print_position if cart_item.product_type == 'single' else None,
+                    personalization=cart_item.personalization if cart_item.product_type == 'single' else None
+                )
+                for cart_item in cart_items
+            ]
+            print_position, personalization = Order.combine_print_options(items)
 
-            quantity = 0
-            try:
-                for it in payload_items:
-                    q = int(it.get('quantity') or 0)
-                    quantity += q
-            except Exception:
-                quantity = 0
-            if quantity <= 0:
-                quantity = 1
-
-            # Tạo đơn hàng
             order = Order.objects.create(
                 user=user,
-                total_amount=quantity * main_product.price,
+                total_amount=sum(item.total_price for item in items),
                 currency='USD',
+                print_position=print_position,
+                personalization=personalization,
+                **Order.aggregate_items(items),
                 **validated_data
             )
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
 
-            # Tạo OrderItem cho sản phẩm chính
-            OrderItem.objects.create(
-                order=order,
-                product_type='single',
-                single_product=main_product,
-                quantity=quantity,
-                unit_price=main_product.price,
-                total_price=quantity * main_product.price
-            )
+            # Xóa giỏ hàng sau khi đặt hàng
+            CartLine.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+            bump_cart_version(user)
+
+            # Gửi Shirtigo qua outbox và email xác nhận qua hàng đợi (cùng transaction,
+            # không chặn request)
+            enqueue_order(order)
+            enqueue_order_confirmation(order)
+
+        return order
+
+    def _create_default_order(self, user, validated_data):
+        """Đơn hàng với sản phẩm đang active khi giỏ hàng trống"""
+        request = self.context.get('request')
+        payload_items = []
+        try:
+            payload_items = (request.data.get('items') or []) if request else []
+        except Exception:
+            payload_items = []
 
-            return order
+        # Lấy sản phẩm đang active (website 1 sản phẩm)
+        main_product = get_active_product()
+        if not main_product:
+            raise serializers.ValidationError("No active product available")
+
+        quantity = 0
+        try:
+            for it in payload_items:
+                q = int(it.get('quantity') or 0)
+                quantity += q
+        except Exception:
+            quantity = 0
+        if quantity <= 0:
+            quantity = 1
+
+        # OrderItem cho sản phẩm chính
+        item = OrderItem(
+            product_type='single',
+            product=main_product,
+            quantity=quantity,
+            unit_price=main_product.price,
+            total_price=quantity * main_product.price
+        )
 
-        # Tạo đơn hàng mới với nhiều items
+        # Tạo đơn hàng
         order = Order.objects.create(
             user=user,
-            total_amount=0,  # Sẽ được cập nhật sau
+            total_amount=item.total_price,
             currency='USD',
+            **Order.aggregate_items([item]),
             **validated_data
         )
-
-        total_amount = 0
-
-        # Thêm main cart items vào order
-        for cart_item in main_cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product_type='single',
-                single_product=cart_item.product,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.product.price,
-                total_price=cart_item.total_price,
-                print_position=cart_item.print_position,
-                personalization=cart_item.personalization
-            )
-            total_amount += cart_item.total_price
-
-        # Thêm bonus cart items vào order
-        for cart_item in bonus_cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product_type='bonus',
-                bonus_product=cart_item.product,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.product.price,
-                total_price=cart_item.total_price
-            )
-            total_amount += cart_item.total_price
-
-        # Cập nhật tổng tiền cho order
-        order.total_amount = total_amount
-        order.save()
-
-        # Cập nhật print_position từ order items
-        order.update_print_position_and_personalization()
-
-        # Xóa giỏ hàng sau khi đặt hàng
-        main_cart_items.delete()
-        bonus_cart_items.delete()
+        item.order = order
+        OrderItem.objects.bulk_create([item])
+        enqueue_order(order)
+        enqueue_order_confirmation(order)
 
         return order
 
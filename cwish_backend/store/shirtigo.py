@@ -0,0 +1,299 @@
+"""Client cho Shirtigo API.
+
+Một ``ShirtigoClient`` dùng chung cho cả process:
+
+- ``requests.Session`` với connection pool keep-alive (không bắt tay TCP+TLS mỗi request)
+- timeout kết nối / đọc riêng
+- thử lại với backoff có jitter khi gặp 429/502/503/504 hoặc không kết nối được.
+  Tổng thời gian chờ giữa các lần thử bị giới hạn (``SHIRTIGO_RETRY_BUDGET``, nhỏ hơn
+  nhiều so với lease của outbox); ``Retry-After`` dài hơn phần còn lại thì trả về
+  response 429/503 ngay để outbox hẹn lại qua ``next_attempt_at``.
+  Không thử lại khi đã gửi xong mà đọc response bị timeout, vì Shirtigo có thể đã
+  tạo order (``ShirtigoTimeoutError``; outbox đưa vào dead letter để kiểm tra thủ công)
+- circuit breaker: sau nhiều lỗi liên tiếp thì fail ngay trong một khoảng thời gian
+- bulkhead: giới hạn số request đang chạy đồng thời trong process (chỉ giữ chỗ
+  trong lúc gửi, không giữ khi chờ thử lại)
+
+Cấu hình bằng các setting ``SHIRTIGO_*`` (xem settings.py).
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ShirtigoError(Exception):
+    """Không gửi được request đến Shirtigo"""
+
+
+class ShirtigoConfigError(ShirtigoError):
+    """Thiếu cấu hình (SHIRTIGO_API_TOKEN) - không gửi request"""
+
+
+class ShirtigoTimeoutError(ShirtigoError):
+    """Đã gửi nhưng hết thời gian chờ response - không biết Shirtigo đã tạo order hay chưa"""
+
+
+class CircuitOpenError(ShirtigoError):
+    """Circuit breaker đang mở - Shirtigo được coi là đang lỗi"""
+
+
+class BulkheadFullError(ShirtigoError):
+    """Đã đủ số request đồng thời cho phép"""
+
+
+class CircuitBreaker:
+    """Circuit breaker đơn giản: closed -> open sau ``threshold`` lỗi liên tiếp,
+    half-open sau ``reset_timeout`` giây (cho một request thử), closed lại khi thành công."""
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == 'open' or (state == 'half_open' and self._trial_in_flight):
+                raise CircuitOpenError('Shirtigo circuit is open')
+            if state == 'half_open':
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def cancel_call(self):
+        """Request đã qua ``before_call`` nhưng không được gửi (không tính là lỗi)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ShirtigoClient:
+    def __init__(self, base_url=None, token=None):
+        self.base_url = (base_url or _setting('SHIRTIGO_API_URL', 'https://cockpit.shirtigo.com/api')).rstrip('/')
+        self.token = token if token is not None else _setting('SHIRTIGO_API_TOKEN', '')
+        self.timeout = (_setting('SHIRTIGO_CONNECT_TIMEOUT', 3.05), _setting('SHIRTIGO_READ_TIMEOUT', 20))
+        self.max_retries = _setting('SHIRTIGO_MAX_RETRIES', 3)
+        self.backoff = _setting('SHIRTIGO_RETRY_BACKOFF', 0.5)
+        self.retry_budget = _setting('SHIRTIGO_RETRY_BUDGET', 10)
+        self.breaker = CircuitBreaker(
+            _setting('SHIRTIGO_BREAKER_THRESHOLD', 5), _setting('SHIRTIGO_BREAKER_RESET', 30),
+        )
+        max_in_flight = _setting('SHIRTIGO_MAX_IN_FLIGHT', 4)
+        self._bulkhead = threading.BoundedSemaphore(max_in_flight)
+        self._bulkhead_timeout = _setting('SHIRTIGO_BULKHEAD_TIMEOUT', 5)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.token}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+        })
+
+    def _retry_delay(self, attempt, response=None):
+        """Số giây chờ trước lần thử tiếp: ``Retry-After`` nếu có, không thì backoff có jitter"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, self.backoff * 2 ** attempt)  # full jitter
+
+    def request(self, method, path, **kwargs):
+        """Gửi request, trả về ``requests.Response`` (kể cả 4xx/5xx cuối cùng).
+
+        Raise ``ShirtigoConfigError`` khi chưa có token, ``CircuitOpenError`` /
+        ``BulkheadFullError`` khi không được phép gửi, ``ShirtigoError`` khi lỗi mạng
+        sau khi đã thử lại.
+        """
+        if not self.token:
+            raise ShirtigoConfigError('SHIRTIGO_API_TOKEN is not set')
+        self.breaker.before_call()
+        try:
+            response = self._request_with_retries(method, f"{self.base_url}/{path.lstrip('/')}", **kwargs)
+        except BulkheadFullError:
+            self.breaker.cancel_call()
+            raise
+        except requests.exceptions.ReadTimeout as e:
+            self.breaker.record_failure()
+            raise ShirtigoTimeoutError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            self.breaker.record_failure()
+            raise ShirtigoError(str(e)) from e
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _send(self, method, url, **kwargs):
+        """Một lần gửi, giữ một chỗ trong bulkhead chỉ trong lúc gửi"""
+        if not self._bulkhead.acquire(timeout=self._bulkhead_timeout):
+            raise BulkheadFullError('Too many concurrent Shirtigo requests')
+        try:
+            return self.session.request(method, url, timeout=self.timeout, **kwargs)
+        finally:
+            self._bulkhead.release()
+
+    def _request_with_retries(self, method, url, **kwargs):
+        budget = self.retry_budget
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self._send(method, url, **kwargs)
+            except requests.exceptions.ConnectionError:
+                # Gồm cả ConnectTimeout; ReadTimeout không được thử lại (request có thể đã được xử lý)
+                if last_attempt:
+                    raise
+                delay = min(self._retry_delay(attempt), budget)
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                delay = self._retry_delay(attempt, response)
+                if delay > budget:
+                    # Chờ lâu hơn phần còn lại: để outbox hẹn lại (next_attempt_at)
+                    return response
+            budget -= delay
+            time.sleep(delay)
+
+    def create_order(self, payload):
+        return self.request('POST', 'orders', json=payload)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def is_configured():
+    """Có token Shirtigo (chỉ đọc từ biến môi trường SHIRTIGO_API_TOKEN)"""
+    return bool(_setting('SHIRTIGO_API_TOKEN', ''))
+
+
+def get_client():
+    """Client dùng chung cho process (tạo khi cần)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ShirtigoClient()
+        return _client
+
+
+def reset_client():
+    """Bỏ client hiện tại (ví dụ sau khi đổi setting)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
+
+
+def build_order_payload(order):
+    """Dữ liệu order theo đúng format đã test thành công trên Postman"""
+    return {
+        "delivery": {
+            "type": "delivery",
+            "firstname": order.first_name or "Nguyen",
+            "lastname": order.last_name or "Van A",
+            "street": order.address or "123 Main Street",
+            "postcode": order.postal_code or "70000",
+            "city": order.city or "Ho Chi Minh",
+            "country": order.country or "VN",
+            "email": order.email or "nguyenvana@example.com"
+        },
+        "products": [
+            {
+                "amount": order.quantity or 1,
+                "productId": "3945923",
+                "colorId": "325",
+                "sizeId": "3"
+            }
+        ]
+    }
+
+
+def submit_order(order):
+    """Gửi order đến Shirtigo.
+
+    Trả về JSON của Shirtigo khi thành công (có ``id``), dict ``{"error": True,
+    "status_code": ..., "response_body": ...}`` khi Shirtigo trả lỗi (``"ambiguous":
+    True`` khi Shirtigo có thể đã tạo order: timeout sau khi gửi, hoặc 2xx không có
+    ``id`` dùng được), hoặc ``None`` khi không gửi được (lỗi mạng, circuit breaker mở,
+    bulkhead đầy).
+    """
+    client = get_client()
+    shirtigo_data = build_order_payload(order)
+    print(f"📡 Gửi order {order.id} đến Shirtigo API ({client.base_url})...")
+
+    try:
+        response = client.create_order(shirtigo_data)
+    except ShirtigoConfigError as e:
+        print(f"❌ Shirtigo chưa được cấu hình, không gửi order {order.id}: {e}")
+        return None
+    except ShirtigoTimeoutError as e:
+        print(f"❌ Shirtigo API timeout, order {order.id} có thể đã được tạo: {e}")
+        return {"error": True, "ambiguous": True, "status_code": None, "response_body": str(e)}
+    except ShirtigoError as e:
+        print(f"❌ Error sending to Shirtigo API: {e}")
+        return None
+
+    # Log chỉ status từ Shirtigo API
+    print(f"🎯 Shirtigo API Status: {response.status_code}")
+
+    if response.status_code == 200 or response.status_code == 201:
+        print(f"✅ Shirtigo API thành công!")
+        try:
+            result = response.json()
+        except Exception as json_error:
+            print(f"⚠️ Không thể parse JSON response: {json_error}")
+            result = None
+        if isinstance(result, dict) and result.get('id'):
+            return result
+        # Shirtigo đã nhận order nhưng không có id: không gửi lại, cần đối chiếu thủ công
+        print(f"❌ Shirtigo trả {response.status_code} nhưng không có order id, order {order.id} có thể đã được tạo")
+        return {
+            "error": True, "ambiguous": True, "status_code": response.status_code, "response_body": response.text,
+        }
+
+    print(f"❌ Shirtigo API thất bại! (Đây là lỗi từ Shirtigo, không phải backend của chúng ta)")
+    return {
+        "error": True,
+        "status_code": response.status_code,
+        "response_body": response.text,
+        "retry_after": response.headers.get('Retry-After'),
+    }
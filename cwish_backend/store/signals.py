@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import active_product, active_bonus_product
+from .images import update_product_variants
+from .models import StoreProduct, SingleProduct, DigitalBonusProduct, Product, ProductVariant, Order, OrderItem
+
+PRODUCT_SENDERS = (StoreProduct, SingleProduct, DigitalBonusProduct)
+
+
+def _invalidate(resolver):
+    # Xóa ngay cho process hiện tại, và xóa lại sau commit để worker khác
+    # không cache dữ liệu đọc được trước khi transaction commit
+    resolver.invalidate()
+    transaction.on_commit(resolver.invalidate)
+
+
+@receiver(post_save, sender=StoreProduct)
+@receiver(post_save, sender=SingleProduct)
+@receiver(post_save, sender=DigitalBonusProduct)
+@receiver(post_delete, sender=StoreProduct)
+@receiver(post_delete, sender=SingleProduct)
+@receiver(post_delete, sender=DigitalBonusProduct)
+def invalidate_active_product(sender, instance, **kwargs):
+    if instance.product_type == 'bonus':
+        _invalidate(active_bonus_product)
+    else:
+        _invalidate(active_product)
+
+
+@receiver(post_save, sender=StoreProduct)
+@receiver(post_save, sender=SingleProduct)
+@receiver(post_save, sender=DigitalBonusProduct)
+def build_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    if update_fields and 'image_variants' in update_fields:
+        return
+    if instance.image or instance.image_variants:
+        transaction.on_commit(lambda: update_product_variants(instance))
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_product_price(sender, instance, **kwargs):
+    Product(pk=instance.product_id).refresh_price()
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_order_aggregates(sender, instance, origin=None, **kwargs):
+    # Khi xóa cả order (hoặc user), các item bị xóa theo - không cần tính lại
+    if origin is not None and not isinstance(origin, OrderItem) and getattr(origin, 'model', None) is not OrderItem:
+        return
+    Order(pk=instance.order_id).recompute_aggregates()
@@ -1,3 +1,1490 @@
-from django.test import TestCase
+import json
+import re
+import threading
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from .cache import active_product, active_bonus_product, get_active_product
+from .models import SingleProduct, DigitalBonusProduct, CartLine
+
+
+def reset_product_cache():
+    cache.clear()
+    active_product.invalidate()
+    active_bonus_product.invalidate()
+
+
+class ActiveProductResolverTests(TestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+
+    def test_second_lookup_hits_cache(self):
+        self.assertEqual(get_active_product(), self.product)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_active_product(), self.product)
+
+    def test_save_invalidates(self):
+        get_active_product()
+        self.product.name = 'Renamed'
+        self.product.save()
+        self.assertEqual(get_active_product().name, 'Renamed')
+
+    def test_delete_invalidates(self):
+        get_active_product()
+        self.product.delete()
+        self.assertIsNone(get_active_product())
+
+    def test_other_worker_sees_new_version(self):
+        get_active_product()
+        # Worker khác tăng version trong cache dùng chung
+        cache.incr(active_product.version_key)
+        SingleProduct.objects.filter(pk=self.product.pk).update(name='Changed elsewhere')
+        active_product._checked_at = 0.0
+        self.assertEqual(get_active_product().name, 'Changed elsewhere')
+
+    def test_worker_that_loses_reload_lock_picks_up_published_value(self):
+        from .cache import ActiveProductResolver, _load_active_product
+        first = ActiveProductResolver('single', _load_active_product)
+        second = ActiveProductResolver('single', _load_active_product)
+        self.assertEqual(second.get(), self.product)
+        self.product.name = 'Renamed'
+        self.product.save()  # signal tăng version dùng chung
+        # first đang giữ lock tải lại: second tạm dùng bản cũ
+        self.assertTrue(first.cache.add(first._lock_key, 'x', timeout=5))
+        second._checked_at = 0.0
+        self.assertEqual(second.get().name, 'Tee')
+        first.cache.delete(first._lock_key)
+        self.assertEqual(first.get().name, 'Renamed')
+        # first đã ghi bản mới vào cache dùng chung: second lấy ngay, không đợi max age
+        with self.assertNumQueries(0):
+            self.assertEqual(second.get().name, 'Renamed')
+
+    def test_process_local_caches_go_stale_for_at_most_max_age(self):
+        import time
+        from unittest import mock
+        from django.core.cache.backends.locmem import LocMemCache
+        from .cache import ActiveProductResolver, _load_active_product
+
+        class LocalResolver(ActiveProductResolver):
+            # Mỗi "worker" có LocMemCache riêng, như các process gunicorn
+            def __init__(self, location):
+                super().__init__('single', _load_active_product)
+                self._cache = LocMemCache(location, {})
+                self._cache.clear()
+
+            @property
+            def cache(self):
+                return self._cache
+
+        first, second = LocalResolver('worker-1'), LocalResolver('worker-2')
+        self.assertEqual(first.get(), self.product)
+        self.assertEqual(second.get(), self.product)
+        self.product.is_active = False
+        self.product.save()
+        replacement = SingleProduct.objects.create(name='New Tee', description='Tee', price=Decimal('20.00'))
+        first.invalidate()
+        self.assertEqual(first.get(), replacement)
+        second._checked_at = 0.0
+        # Version mới không đến được worker kia: bản cũ còn dùng đến hết max age
+        self.assertEqual(second.get(), self.product)
+        later = time.time() + settings.ACTIVE_PRODUCT_CACHE_MAX_AGE + 1
+        with mock.patch('store.cache.time.time', return_value=later):
+            self.assertEqual(second.get(), replacement)
+
+
+class CartProductQueryTests(APITestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        self.bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+        active_product.get()
+        active_bonus_product.get()
+
+    def _product_queries(self, queries):
+        tables = (SingleProduct._meta.db_table, DigitalBonusProduct._meta.db_table)
+        return [q['sql'] for q in queries if any(f'FROM "{t}"' in q['sql'] for t in tables)]
+
+    def test_add_and_list_make_no_product_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/cart/add_to_cart/', {'quantity': 2}, format='json')
+            self.client.post('/api/bonus-cart/add_to_cart/', {'quantity': 1}, format='json')
+            self.client.get('/api/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 2)
+        self.assertEqual(self._product_queries(ctx.captured_queries), [])
+        self.assertEqual(CartLine.objects.get(user=self.user, product_type='single').quantity, 2)
+
+    def test_one_cart_call_returns_both_types(self):
+        self.client.post('/api/cart/add_to_cart/', {'quantity': 2}, format='json')
+        self.client.post('/api/bonus-cart/add_to_cart/', {'quantity': 3}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_amount'], Decimal('40.00'))
+        self.assertEqual(response.data['bonus']['item_count'], 3)
+        self.assertEqual(response.data['bonus']['total_amount'], Decimal('15.00'))
+        self.assertEqual(response.data['grand_total'], Decimal('55.00'))
+        cart_queries = [q['sql'] for q in ctx.captured_queries if 'store_cartline' in q['sql']]
+        # validator (ETag) + dòng giỏ hàng kèm tổng
+        self.assertEqual(len(cart_queries), 2)
+
+    def test_cart_query_count_does_not_grow_with_lines(self):
+        self.client.post('/api/cart/add_to_cart/', {'quantity': 1}, format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/cart/')
+        for i in range(5):
+            extra = SingleProduct.objects.create(
+                name=f'Tee {i}', description='Tee', price=Decimal('10.00'), is_active=False,
+            )
+            CartLine.objects.create(user=self.user, product=extra, product_type='single', quantity=2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/cart/')
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(response.data['item_count'], 11)
+        self.assertEqual(response.data['total_amount'], Decimal('120.00'))
+        self.assertEqual(response.data['items'][1]['total_price'], Decimal('20.00'))
+
+    def test_bonus_cart_endpoint_still_works(self):
+        self.client.post('/api/bonus-cart/add_to_cart/', {'quantity': 2}, format='json')
+        response = self.client.get('/api/bonus-cart/')
+        self.assertEqual(response.data['item_count'], 2)
+        self.assertEqual(response.data['items'][0]['product_type'], 'bonus')
+
+
+class CartBatchTests(APITestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        self.bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+
+    def test_operations_apply_in_order(self):
+        response = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'add', 'product_type': 'single', 'quantity': 1, 'print_position': 'Front'},
+            {'op': 'add', 'product_type': 'single', 'quantity': 2},
+            {'op': 'add', 'product_type': 'bonus', 'quantity': 4},
+            {'op': 'set_quantity', 'product_type': 'bonus', 'quantity': 2},
+            {'op': 'set_options', 'product_type': 'single', 'personalization': 'Hi'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item_count'], 3)
+        self.assertEqual(response.data['bonus']['item_count'], 2)
+        self.assertEqual(response.data['grand_total'], Decimal('70.00'))
+        line = CartLine.objects.get(user=self.user, product_type='single')
+        self.assertEqual((line.print_position, line.personalization), ('Front', 'Hi'))
+
+    def test_failed_operation_rolls_back_batch(self):
+        response = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'add', 'product_type': 'single', 'quantity': 1},
+            {'op': 'set_quantity', 'product_type': 'bonus', 'quantity': 3},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['operation'], 1)
+        self.assertFalse(CartLine.objects.filter(user=self.user).exists())
+
+    def test_invalid_operation_is_rejected(self):
+        response = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'set_options', 'product_type': 'bonus', 'personalization': 'Hi'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CartDeltaTests(APITestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        self.bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            extra = SingleProduct.objects.create(
+                name=f'Tee {i}', description='Tee', price=Decimal('10.00'), is_active=False,
+            )
+            CartLine.objects.create(user=self.user, product=extra, product_type='single', quantity=1)
+
+    def test_delta_returns_only_changed_line(self):
+        version = self.client.get('/api/cart/').data['version']
+        response = self.client.post(
+            '/api/cart/add_to_cart/', {'quantity': 2}, format='json', HTTP_X_CART_RESPONSE='delta',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], version + 1)
+        self.assertEqual([line['product']['id'] for line in response.data['changed']], [self.product.pk])
+        self.assertEqual(response.data['removed'], [])
+        self.assertEqual(response.data['totals']['single'], {'total_amount': Decimal('90.00'), 'item_count': 7})
+        self.assertNotIn('items', response.data)
+
+    def test_removed_lines_and_monotonic_version(self):
+        self.client.post('/api/bonus-cart/add_to_cart/', {'quantity': 1}, format='json')
+        first = self.client.post('/api/bonus-cart/update_quantity/?response=delta', {'quantity': 0}, format='json')
+        self.assertEqual(first.data['removed'], [self.bonus.pk])
+        self.assertEqual(first.data['totals']['bonus']['item_count'], 0)
+        second = self.client.post('/api/cart/clear_cart/?response=delta', format='json')
+        self.assertEqual(second.data['version'], first.data['version'] + 1)
+        self.assertEqual(len(second.data['removed']), 5)
+        self.assertEqual(self.client.get('/api/bonus-cart/').data['version'], second.data['version'])
+
+    def test_no_writes_that_bypass_the_version(self):
+        line = CartLine.objects.filter(user=self.user).first()
+        version = self.client.get('/api/cart/').data['version']
+        for prefix in ('/api/cart/', '/api/bonus-cart/'):
+            self.assertEqual(self.client.post(prefix, {'quantity': 3}, format='json').status_code, 405)
+            for method in (self.client.put, self.client.patch, self.client.delete):
+                self.assertEqual(method(f'{prefix}{line.pk}/', {'quantity': 3}, format='json').status_code, 404)
+        line.refresh_from_db()
+        self.assertEqual(line.quantity, 1)
+        self.assertEqual(self.client.get('/api/cart/').data['version'], version)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.shipping = {
+            'email': 'buyer@example.com', 'first_name': 'A', 'last_name': 'B', 'address': '1 Street',
+            'city': 'City', 'country': 'VN', 'postal_code': '70000',
+        }
+
+    def _fill_cart(self, lines):
+        for i in range(lines):
+            product = SingleProduct.objects.create(
+                name=f'Tee {i}', description='Tee', price=Decimal('10.00'), is_active=False,
+            )
+            CartLine.objects.create(
+                user=self.user, product=product, product_type='single', quantity=2, print_position='Front',
+            )
+        bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        CartLine.objects.create(user=self.user, product=bonus, product_type='bonus', quantity=1)
+
+    def _checkout(self):
+        from types import SimpleNamespace
+        from .serializers import OrderCreateSerializer
+        request = SimpleNamespace(user=self.user, data={})
+        serializer = OrderCreateSerializer(data=self.shipping, context={'request': request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def test_query_count_is_fixed(self):
+        from .cart import bump_cart_version
+        from .models import Order
+        bump_cart_version(self.user)
+        self._fill_cart(1)
+        with CaptureQueriesContext(connection) as small:
+            self._checkout()
+        Order.objects.all().delete()
+        self._fill_cart(6)
+        with CaptureQueriesContext(connection) as large:
+            order = self._checkout()
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(order.order_items.count(), 7)
+        self.assertFalse(CartLine.objects.filter(user=self.user).exists())
+
+    def test_totals_and_print_options_computed_in_memory(self):
+        self._fill_cart(2)
+        order = self._checkout()
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('45.00'))
+        self.assertEqual(order.print_position, 'Front')
+        self.assertIsNone(order.order_items.get(product_type='bonus').print_position)
+
+    def test_aggregates_are_stored_at_checkout(self):
+        self._fill_cart(2)
+        order = self._checkout()
+        order.refresh_from_db()
+        self.assertEqual(
+            (order.item_count, order.main_line_count, order.bonus_line_count, order.main_total, order.bonus_total),
+            (5, 2, 1, Decimal('40.00'), Decimal('5.00')),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(order.quantity, 5)
+
+    def test_item_edits_and_recompute_command_keep_aggregates_correct(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import Order
+        self._fill_cart(1)
+        order = self._checkout()
+        item = order.order_items.get(product_type='single')
+        item.quantity, item.total_price = 4, Decimal('40.00')
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.total_amount), (5, Decimal('45.00')))
+
+        Order.objects.filter(pk=order.pk).update(item_count=0, main_line_count=0, main_total=0)
+        call_command('recompute_order_aggregates', batch_size=1, stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.main_line_count, order.main_total), (5, 1, Decimal('40.00')))
+
+        order.order_items.get(product_type='bonus').delete()
+        order.refresh_from_db()
+        self.assertEqual((order.bonus_line_count, order.total_amount), (0, Decimal('40.00')))
+
+    def test_failure_leaves_no_order_and_keeps_cart(self):
+        from unittest import mock
+        from .models import Order, OrderItem
+        self._fill_cart(2)
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self._checkout()
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartLine.objects.filter(user=self.user).count(), 3)
+
+
+class OrderListTests(APITestCase):
+    def setUp(self):
+        from .models import Order
+        reset_product_cache()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+        self.tee = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('10.00'))
+        self.bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        self.Order = Order
+
+    def _create_orders(self, count):
+        for _ in range(count):
+            order = self.Order.objects.create(
+                user=self.user, total_amount=Decimal('25.00'), email='buyer@example.com',
+                first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+            )
+            order.order_items.create(product_type='single', product=self.tee, quantity=2, unit_price=Decimal('10.00'))
+            order.order_items.create(product_type='bonus', product=self.bonus, quantity=1, unit_price=Decimal('5.00'))
+
+    def test_page_query_count_does_not_grow_with_orders(self):
+        self._create_orders(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/orders/')
+        self._create_orders(18)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertLessEqual(len(large.captured_queries), 4)
+
+    def test_derived_fields_come_from_items(self):
+        self._create_orders(1)
+        order = self.client.get('/api/orders/?expand=products').json()['results'][0]
+        self.assertEqual(order['quantity'], 3)
+        self.assertEqual([item['product_name'] for item in order['main_products']], ['Tee'])
+        self.assertEqual([item['product_name'] for item in order['bonus_products']], ['Bonus'])
+
+    def test_heavy_fields_only_when_expanded(self):
+        self._create_orders(1)
+        order = self.client.get('/api/orders/').json()['results'][0]
+        self.assertNotIn('shirtigo_response', order)
+        self.assertNotIn('main_products', order)
+        self.assertIn('order_items', order)
+        order = self.client.get('/api/orders/?expand=shirtigo').json()['results'][0]
+        self.assertIn('shirtigo_response', order)
+
+    def test_shirtigo_payload_joined_only_when_expanded(self):
+        self._create_orders(3)
+        for order in self.Order.objects.all():
+            order.record_shirtigo_response({'id': f'SH-{order.pk}', 'status': 'open', 'items': ['x'] * 50})
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/orders/')
+        self.assertFalse(any('store_providerpayload' in q['sql'] for q in ctx.captured_queries))
+        # expand=shirtigo: payload lấy bằng JOIN, không thêm query mỗi order
+        with CaptureQueriesContext(connection) as ctx:
+            orders = self.client.get('/api/orders/?expand=shirtigo').json()['results']
+        self.assertEqual(len(ctx.captured_queries), 3)
+        self.assertEqual({order['shirtigo_status'] for order in orders}, {'open'})
+        self.assertEqual({order['shirtigo_response']['id'] for order in orders}, {f"SH-{order['id']}" for order in orders})
+
+    def test_sparse_fields_skip_items(self):
+        self._create_orders(3)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders/?fields=id,status,total_amount,created_at')
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'total_amount', 'status', 'created_at'])
+        # Một query mỗi bảng (order + order đã lưu trữ): không COUNT(*), không lấy items
+        self.assertEqual(len(ctx.captured_queries), 2)
+        for query in ctx.captured_queries:
+            self.assertNotIn('shirtigo_response', query['sql'])
+            self.assertNotIn('"items"', query['sql'])
+
+    def test_cursor_pages_cover_all_orders_once(self):
+        self._create_orders(5)
+        seen = []
+        url = '/api/orders/?fields=id&page_size=2'
+        while url:
+            body = self.client.get(url).json()
+            self.assertNotIn('count', body)
+            seen += [order['id'] for order in body['results']]
+            url = body['next']
+        expected = [str(pk) for pk in self.Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)]
+        self.assertEqual(seen, expected)
+
+
+class OrderStatusTests(APITestCase):
+    def setUp(self):
+        from .models import Order
+        self.Order = Order
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+
+    def _order(self, status='pending'):
+        return self.Order.objects.create(
+            user=self.user, total_amount=Decimal('10.00'), email='buyer@example.com', status=status,
+            first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+        )
+
+    def test_bulk_transition_updates_valid_orders_and_reports_skipped(self):
+        processing = [self._order('processing') for _ in range(3)]
+        pending, shipped = self._order('pending'), self._order('shipped')
+        missing = '00000000-0000-0000-0000-000000000000'
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/orders/bulk_status/', {
+                'ids': [str(o.pk) for o in processing + [pending, shipped]] + [missing], 'status': 'shipped',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(sorted(body['updated']), sorted(str(o.pk) for o in processing))
+        reasons = {item['id']: item['reason'] for item in body['skipped']}
+        self.assertEqual(reasons, {
+            str(pending.pk): 'invalid_transition', str(shipped.pk): 'already_in_status', missing: 'not_found',
+        })
+        self.assertEqual(self.Order.objects.filter(status='shipped').count(), 4)
+        self.assertEqual(sum('UPDATE' in q['sql'] for q in queries.captured_queries), 1)
+
+    def test_bulk_transition_requires_staff(self):
+        order = self._order()
+        self.client.force_authenticate(self.user)
+        response = self.client.post(
+            '/api/orders/bulk_status/', {'ids': [str(order.pk)], 'status': 'processing'}, format='json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_update_status_rejects_invalid_edge(self):
+        order = self._order('delivered')
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(f'/api/orders/{order.pk}/update_status/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['reason'], 'invalid_transition')
+        response = self.client.patch(f'/api/orders/{order.pk}/update_status/', {'status': 'lost'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        order = self._order('pending')
+        response = self.client.patch(f'/api/orders/{order.pk}/update_status/', {'status': 'processing'}, format='json')
+        self.assertEqual(response.json()['status'], 'processing')
+
+    def test_guard_blocks_transition(self):
+        from django.db.models import Q
+        from .order_status import GUARDS, guard, transition
+        blocked = guard('pending', 'processing')(lambda: Q(total_amount__gt=Decimal('50.00')))
+        try:
+            order = self._order()
+            updated, skipped = transition([order.pk], 'processing')
+        finally:
+            GUARDS[('pending', 'processing')].remove(blocked)
+        self.assertEqual(updated, [])
+        self.assertEqual(skipped[0]['reason'], 'guard_failed')
+
+
+class OrderArchiveTests(APITestCase):
+    def setUp(self):
+        from .models import Order
+        reset_product_cache()
+        self.Order = Order
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+        self.tee = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('10.00'))
+        self.bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+
+    def _order(self, status, days_ago):
+        from datetime import timedelta
+        from django.utils import timezone
+        order = self.Order.objects.create(
+            user=self.user, total_amount=Decimal('25.00'), email='buyer@example.com', status=status,
+            first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+        )
+        order.order_items.create(product_type='single', product=self.tee, quantity=2, unit_price=Decimal('10.00'),
+                                 print_position='Front')
+        order.order_items.create(product_type='bonus', product=self.bonus, quantity=1, unit_price=Decimal('5.00'))
+        self.Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+    def test_archives_only_old_finished_orders_in_batches(self):
+        from .archive import archive_orders
+        from .models import ArchivedOrder, OrderItem
+        old = [self._order('delivered', 400), self._order('cancelled', 300), self._order('delivered', 200)]
+        keep = [self._order('shipped', 400), self._order('delivered', 10)]
+
+        self.assertEqual(archive_orders(days=180, batch_size=2, max_batches=1), 2)
+        self.assertEqual(archive_orders(days=180, batch_size=2), 1)
+
+        self.assertEqual(set(ArchivedOrder.objects.values_list('pk', flat=True)), {o.pk for o in old})
+        self.assertEqual(set(self.Order.objects.values_list('pk', flat=True)), {o.pk for o in keep})
+        self.assertFalse(OrderItem.objects.filter(order_id__in=[o.pk for o in old]).exists())
+        archived = ArchivedOrder.objects.get(pk=old[0].pk)
+        self.assertEqual(archived.item_count, 3)
+        self.assertEqual([item['product_name'] for item in archived.items], ['Tee', 'Bonus'])
+
+    def test_archive_keeps_compressed_shirtigo_payload(self):
+        from .archive import archive_orders
+        from .models import ArchivedOrder, ProviderPayload
+        order = self._order('delivered', 400)
+        order.record_shirtigo_response({'id': 'SH-1', 'status': 'shipped'})
+        archive_orders(days=180)
+
+        self.assertFalse(ProviderPayload.objects.exists())
+        archived = ArchivedOrder.objects.get(pk=order.pk)
+        self.assertEqual((archived.shirtigo_codec, archived.shirtigo_status), ('zlib', 'shipped'))
+        self.assertEqual(archived.shirtigo_response, {'id': 'SH-1', 'status': 'shipped'})
+        detail = self.client.get(f'/api/orders/{order.pk}/?expand=shirtigo').json()
+        self.assertEqual(detail['shirtigo_response'], {'id': 'SH-1', 'status': 'shipped'})
+
+    def test_api_reads_archived_orders(self):
+        from .archive import archive_orders
+        archived = self._order('delivered', 400)
+        recent = self._order('pending', 1)
+        expected = self.client.get(f'/api/orders/{archived.pk}/?expand=products').json()
+        archive_orders(days=180)
+
+        body = self.client.get('/api/orders/').json()
+        self.assertEqual([order['id'] for order in body['results']], [str(recent.pk), str(archived.pk)])
+
+        detail = self.client.get(f'/api/orders/{archived.pk}/?expand=products').json()
+        self.assertEqual(set(detail), set(expected))
+        self.assertEqual(detail['quantity'], 3)
+        self.assertEqual([item['product_name'] for item in detail['main_products']], ['Tee'])
+        self.assertEqual(detail['main_products'][0]['total_price'], expected['main_products'][0]['total_price'])
+
+        # Chỉ đọc
+        response = self.client.patch(f'/api/orders/{archived.pk}/update_status/', {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_redirects_archived_order_to_read_only_page(self):
+        from .archive import archive_orders
+        order = self._order('delivered', 400)
+        archive_orders(days=180)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get(f'/admin/store/order/{order.pk}/change/')
+        self.assertRedirects(response, f'/admin/store/archivedorder/{order.pk}/change/')
+        self.assertContains(self.client.get(response['Location']), 'Main: Tee (x2) - Front')
+
+    def test_cursor_pages_merge_hot_and_archived_orders(self):
+        from .archive import archive_orders
+        for days in (400, 300, 250, 5, 3, 1):
+            self._order('delivered', days)
+        archive_orders(days=180)
+        seen = []
+        url = '/api/orders/?fields=id&page_size=2'
+        while url:
+            body = self.client.get(url).json()
+            seen += [order['id'] for order in body['results']]
+            url = body['next']
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        from .models import Order
+        self.Order = Order
+        self.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        self.tee = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('10.00'))
+        self.orders = []
+        for i in range(5):
+            order = Order.objects.create(
+                user=self.staff, total_amount=Decimal('20.00'), email=f'buyer{i}@example.com',
+                first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+            )
+            order.order_items.create(product_type='single', product=self.tee, quantity=2, unit_price=Decimal('10.00'),
+                                     print_position='Front')
+            self.orders.append(order)
+        self.client.force_authenticate(self.staff)
+        overrides = self.settings(ORDER_EXPORT_SAFETY_LAG=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_all_orders_in_chunks(self):
+        import csv
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/orders/export/?chunk_size=2')
+            rows = list(csv.DictReader(self._body(response).splitlines()))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(str(o.pk) for o in self.orders))
+        self.assertEqual(rows[0]['items'], '2 x Tee (Front)')
+        # 3 trang order + 3 query item + 1 trang rỗng cho bảng chính, 1 cho bảng lưu trữ
+        self.assertEqual(len(queries.captured_queries), 8)
+
+    def test_ndjson_export_since_watermark(self):
+        first = self.client.get('/api/orders/export/?output=ndjson')
+        self.assertEqual(len(self._body(first).splitlines()), 5)
+
+        changed = self.orders[2]
+        changed.status = 'processing'
+        changed.save(update_fields=['status', 'updated_at'])
+        response = self.client.get('/api/orders/export/', {'output': 'ndjson', 'since': first['X-Export-Until']})
+        rows = [json.loads(line) for line in self._body(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [str(changed.pk)])
+        self.assertEqual(rows[0]['status'], 'processing')
+        self.assertEqual(rows[0]['items'][0]['product_name'], 'Tee')
+        self.assertFalse(rows[0]['archived'])
+
+    def test_watermark_trails_export_so_late_commits_are_not_skipped(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        # Order ghi updated_at ngay trước export nhưng (có thể) chưa commit: để lần sau
+        recent = self.orders[4]
+        self.Order.objects.exclude(pk=recent.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        with self.settings(ORDER_EXPORT_SAFETY_LAG=30):
+            first = self.client.get('/api/orders/export/?output=ndjson')
+            ids = [json.loads(line)['id'] for line in self._body(first).splitlines()]
+        self.assertEqual(len(ids), 4)
+        self.assertNotIn(str(recent.pk), ids)
+        second = self.client.get('/api/orders/export/', {'output': 'ndjson', 'since': first['X-Export-Until']})
+        self.assertEqual([json.loads(line)['id'] for line in self._body(second).splitlines()], [str(recent.pk)])
+
+    def test_export_requires_staff_and_valid_params(self):
+        self.assertEqual(self.client.get('/api/orders/export/?since=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/export/?output=xml').status_code, 400)
+        self.client.force_authenticate(User.objects.create_user('buyer', 'buyer@example.com', 'pw'))
+        self.assertEqual(self.client.get('/api/orders/export/').status_code, 403)
+
+    def test_command_keeps_watermark_in_state_file(self):
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        with tempfile.TemporaryDirectory() as tmp:
+            state, target = os.path.join(tmp, 'state'), os.path.join(tmp, 'orders.ndjson')
+            call_command('export_orders', format='ndjson', file=target, state_file=state, stderr=StringIO())
+            with open(target) as f:
+                self.assertEqual(len(f.readlines()), 5)
+            call_command('export_orders', format='ndjson', file=target, state_file=state, stderr=StringIO())
+            with open(target) as f:
+                self.assertEqual(f.read(), '')
+
+    def test_benchmark_command_checks_rss(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        with self.settings(ORDER_EXPORT_SAFETY_LAG=30):
+            call_command('benchmark_order_export', orders=200, chunk_size=50, max_growth_mb=50, stdout=out)
+        self.assertIn('RSS stayed flat', out.getvalue())
+        self.assertEqual(self.Order.objects.count(), 5)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(APITestCase):
+    """Các query thường dùng phải đi qua index: không full scan, không sort bằng temp B-tree.
+
+    Ngoại lệ: sort lại output của window function (cart_summary) - chỉ là các dòng đã
+    lấy qua index của một giỏ hàng.
+    """
+    FULL_SCAN = re.compile(r'^SCAN \w+$')
+
+    def setUp(self):
+        from .models import Contact, Order
+        reset_product_cache()
+        self.Order, self.Contact = Order, Contact
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.tee = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('10.00'))
+        self.bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        CartLine.objects.create(user=self.user, product=self.tee, product_type='single', quantity=1)
+        CartLine.objects.create(user=self.user, product=self.bonus, product_type='bonus', quantity=1)
+        self.orders = []
+        for i in range(3):
+            order = Order.objects.create(
+                user=self.user, total_amount=Decimal('15.00'), email='buyer@example.com', shirtigo_order_id=f'SH-{i}',
+                first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+            )
+            order.order_items.create(product_type='single', product=self.tee, quantity=1, unit_price=Decimal('10.00'))
+            order.order_items.create(product_type='bonus', product=self.bonus, quantity=1, unit_price=Decimal('5.00'))
+            self.orders.append(order)
+        Contact.objects.create(name='A', email='a@example.com', message='Hi')
+
+    def _bad_plans(self, run):
+        """Chạy ``run`` và trả về các query (trên bảng store_*) có plan xấu"""
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            run()
+        bad = []
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')) or 'store_' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[3] for row in cursor.fetchall()]
+                window_output = any(detail.startswith('SCAN (subquery') for detail in plan)
+                if any(
+                    self.FULL_SCAN.match(detail) or (detail.startswith('USE TEMP B-TREE') and not window_output)
+                    for detail in plan
+                ):
+                    bad.append((sql, plan))
+        return bad
+
+    def test_viewset_queries_use_indexes(self):
+        self.client.force_authenticate(self.user)
+
+        def run():
+            page = self.client.get('/api/orders/?page_size=2&expand=products').json()
+            self.client.get(page['next'])
+            self.client.get(f'/api/orders/{self.orders[0].pk}/')
+            self.client.get('/api/cart/')
+            self.client.get('/api/bonus-cart/')
+            self.client.get('/api/product/')
+            self.client.get('/api/catalog/products/')
+
+        self.assertEqual(self._bad_plans(run), [])
+
+    def test_admin_and_worker_queries_use_indexes(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .archive import archivable_orders
+        from .export import export_chunks
+        order = self.orders[0]
+
+        def run():
+            list(self.Order.objects.filter(status='pending')[:50])
+            self.Order.objects.filter(shirtigo_order_id='SH-1').first()
+            list(self.Contact.objects.filter(is_read=False)[:50])
+            list(self.Contact.objects.all()[:50])
+            list(order.get_main_products())
+            list(order.get_bonus_products())
+            list(archivable_orders(timezone.now()).values_list('pk', flat=True)[:50])
+            list(export_chunks('ndjson', since=timezone.now() - timedelta(days=1), chunk_size=2))
+
+        self.assertEqual(self._bad_plans(run), [])
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+        self.shipping = {
+            'email': 'buyer@example.com', 'first_name': 'A', 'last_name': 'B', 'address': '1 Street',
+            'city': 'City', 'country': 'VN', 'postal_code': '70000',
+        }
+        product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('10.00'))
+        CartLine.objects.create(user=self.user, product=product, product_type='single', quantity=1)
+
+    def _post(self, data, key='checkout-1'):
+        return self.client.post('/api/orders/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response_without_new_order(self):
+        from .models import Order
+        first = self._post(self.shipping)
+        self.assertEqual(first.status_code, 201)
+        with CaptureQueriesContext(connection) as replay_queries:
+            second = self._post(self.shipping)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['id'], first.json()['id'])
+        self.assertEqual(len(replay_queries.captured_queries), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self.assertEqual(self._post(self.shipping).status_code, 201)
+        response = self._post({**self.shipping, 'city': 'Other'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_in_progress_key_returns_conflict_after_wait(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import IdempotencyKey, Order
+        now = timezone.now()
+        IdempotencyKey.objects.create(
+            user=self.user, key='checkout-1', request_hash='x', locked_until=now + timedelta(minutes=2),
+            expires_at=now + timedelta(hours=1),
+        )
+        with self.settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            response = self._post(self.shipping)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+
+    def test_abandoned_key_is_taken_over_after_lock_expires(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .models import IdempotencyKey, Order
+        from .views import OrderViewSet
+        # Worker bị kill giữa request: không chạy except/cleanup, key còn in_progress
+        with mock.patch.object(OrderViewSet, 'get_serializer', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self._post(self.shipping)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'in_progress')
+        with self.settings(IDEMPOTENCY_WAIT_TIMEOUT=0):
+            self.assertEqual(self._post(self.shipping).status_code, 409)
+
+        IdempotencyKey.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._post({**self.shipping, 'city': 'Other'}).status_code, 422)
+        response = self._post(self.shipping)
+        self.assertEqual(response.status_code, 201)
+        record = IdempotencyKey.objects.get()
+        self.assertEqual((record.status, record.locked_until), ('completed', None))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self._post(self.shipping)['Idempotent-Replayed'], 'true')
+
+    def test_failure_after_order_is_saved_rolls_back_with_the_key(self):
+        from unittest import mock
+        from .models import IdempotencyKey, Order, QueuedEmail, ShirtigoOutbox
+        with mock.patch('store.views.OrderSerializer', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self._post(self.shipping)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(ShirtigoOutbox.objects.exists())
+        self.assertFalse(QueuedEmail.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self._post(self.shipping).status_code, 201)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_request_that_lost_its_key_does_not_keep_the_order(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from .models import IdempotencyKey, Order
+        from .serializers import OrderSerializer
+
+        def taken_over(*args, **kwargs):
+            # Request khác lấy lại key trong lúc view đang chạy
+            IdempotencyKey.objects.update(locked_until=timezone.now() + timedelta(minutes=5))
+            return OrderSerializer(*args, **kwargs)
+
+        with mock.patch('store.views.OrderSerializer', side_effect=taken_over):
+            response = self._post(self.shipping)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(IdempotencyKey.objects.get().status, 'in_progress')
+
+    def test_purge_deletes_only_expired_keys(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import IdempotencyKey
+        now = timezone.now()
+        for i in range(5):
+            IdempotencyKey.objects.create(user=self.user, key=f'old-{i}', request_hash='x', expires_at=now - timedelta(seconds=1))
+        IdempotencyKey.objects.create(user=self.user, key='fresh', request_hash='x', expires_at=now + timedelta(hours=1))
+        call_command('purge_idempotency_keys', batch_size=2, stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh'])
+
+
+class ShirtigoOutboxTests(TestCase):
+    def setUp(self):
+        from .models import Order
+        from .outbox import enqueue_order
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.order = Order.objects.create(
+            user=user, total_amount=Decimal('20.00'), email='buyer@example.com',
+            first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+        )
+        self.entry = enqueue_order(self.order)
+        overrides = self.settings(SHIRTIGO_API_TOKEN='test-token')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _drain(self, result):
+        from unittest import mock
+        from .outbox import drain
+        with mock.patch('store.shirtigo.submit_order', return_value=result) as submit:
+            results = drain(worker_id='test', concurrency=1)
+        self.entry.refresh_from_db()
+        self.order.refresh_from_db()
+        return results, submit
+
+    def test_success_moves_order_to_processing(self):
+        results, submit = self._drain({'id': 'SH-1'})
+        self.assertEqual(results['sent'], 1)
+        self.assertEqual(self.entry.status, 'sent')
+        self.assertEqual((self.order.status, self.order.shirtigo_order_id), ('processing', 'SH-1'))
+        self.assertIsNotNone(self.order.shirtigo_synced_at)
+        # Entry đã gửi không bị gửi lại
+        results, submit = self._drain({'id': 'SH-2'})
+        self.assertFalse(results)
+        submit.assert_not_called()
+
+    def test_retry_waits_at_least_retry_after(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        self._drain({'error': True, 'status_code': 429, 'response_body': '', 'retry_after': '900'})
+        self.assertEqual(self.entry.status, 'pending')
+        self.assertGreater(self.entry.next_attempt_at, timezone.now() + timedelta(seconds=890))
+
+    def test_ambiguous_timeout_is_dead_lettered(self):
+        results, submit = self._drain({'error': True, 'ambiguous': True, 'status_code': None, 'response_body': 'timed out'})
+        self.assertEqual(results['dead'], 1)
+        self.assertEqual((self.entry.status, self.entry.attempts), ('dead', 1))
+        self.assertIn('check Shirtigo', self.entry.last_error)
+        self.assertEqual(self.order.status, 'pending')
+
+    def test_skips_without_token(self):
+        with self.settings(SHIRTIGO_API_TOKEN=''):
+            results, submit = self._drain({'id': 'SH-1'})
+        self.assertFalse(results)
+        submit.assert_not_called()
+        self.assertEqual((self.entry.status, self.entry.attempts), ('pending', 0))
+
+    def test_response_stored_compressed_in_side_table(self):
+        from .models import ProviderPayload
+        result = {'id': 'SH-1', 'status': 'open', 'items': [{'sku': 'TEE-M', 'quantity': 1}] * 100}
+        self._drain(result)
+        payload = ProviderPayload.objects.get(order=self.order)
+        self.assertEqual((payload.provider, payload.codec), ('shirtigo', 'zlib'))
+        self.assertLess(len(payload.data), payload.raw_size)
+        self.assertEqual(self.order.shirtigo_status, 'open')
+        self.assertEqual(self.order.shirtigo_response, result)
+
+    def test_transient_error_backs_off_then_dead_letters(self):
+        from django.utils import timezone
+        with self.settings(SHIRTIGO_OUTBOX_MAX_ATTEMPTS=2):
+            self._drain({'error': True, 'status_code': 503, 'response_body': 'down'})
+            self.assertEqual((self.entry.status, self.entry.attempts), ('pending', 1))
+            self.assertGreater(self.entry.next_attempt_at, timezone.now())
+            self.assertEqual(self.order.status, 'pending')
+
+            self.entry.next_attempt_at = timezone.now()
+            self.entry.save()
+            self._drain(None)
+            self.assertEqual((self.entry.status, self.entry.attempts), ('dead', 2))
+
+    def test_client_error_is_not_retried(self):
+        self._drain({'error': True, 'status_code': 422, 'response_body': 'invalid'})
+        self.assertEqual(self.entry.status, 'dead')
+
+    def test_entry_is_claimed_by_one_worker(self):
+        from .outbox import claim_batch
+        self.assertEqual(claim_batch('worker-a', 10), [self.entry.pk])
+        self.assertEqual(claim_batch('worker-b', 10), [])
+
+
+class EmailQueueTests(TestCase):
+    def setUp(self):
+        from .emails import enqueue_order_confirmation
+        from .models import Order
+        reset_product_cache()
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        self.entries = []
+        for i in range(3):
+            order = Order.objects.create(
+                user=user, total_amount=Decimal('20.00'), email=f'buyer{i}@example.com',
+                first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+            )
+            order.order_items.create(product_type='single', product=product, quantity=1, unit_price=product.price)
+            self.entries.append(enqueue_order_confirmation(order))
+
+    def test_batch_reuses_one_connection(self):
+        from unittest import mock
+        from django.core import mail
+        from .emails import RateLimiter, get_connection, send_batch
+        with mock.patch('store.emails.get_connection', wraps=get_connection) as connect:
+            results = send_batch(limiter=RateLimiter(0))
+        self.assertEqual(results['sent'], 3)
+        self.assertEqual(connect.call_count, 1)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), [f'buyer{i}@example.com' for i in range(3)])
+        self.assertFalse(send_batch(limiter=RateLimiter(0)))
+
+    def test_transient_failure_is_retried_later(self):
+        import smtplib
+        from unittest import mock
+        from .emails import RateLimiter, send_batch
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=smtplib.SMTPDataError(451, 'try later')):
+            results = send_batch(limiter=RateLimiter(0))
+        self.assertEqual(results['retry'], 3)
+        entry = type(self.entries[0]).objects.get(pk=self.entries[0].pk)
+        self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+
+    def test_rate_limiter_spaces_sends(self):
+        from unittest import mock
+        from .emails import RateLimiter
+        limiter = RateLimiter(60)
+        with mock.patch('store.emails.time.sleep') as sleep:
+            limiter.wait()
+            limiter.wait()
+        self.assertEqual(sleep.call_count, 1)
+        self.assertAlmostEqual(sleep.call_args[0][0], 1.0, places=1)
+
+    def test_shell_is_rendered_once_and_items_in_one_query(self):
+        from unittest import mock
+        from . import emails
+        emails.email_shell.cache_clear()
+        self.addCleanup(emails.email_shell.cache_clear)
+        order = self.entries[0].order
+        with mock.patch('store.emails.render_to_string', wraps=emails.render_to_string) as render:
+            first = emails.render_order_confirmation(order)
+            with self.assertNumQueries(1):
+                second = emails.render_order_confirmation(order)
+        rendered = [call.args[0] for call in render.call_args_list]
+        self.assertEqual(rendered.count(emails.SHELL_TEMPLATE), 1)
+        self.assertEqual(rendered.count(emails.BODY_TEMPLATE), 2)
+        self.assertEqual(first, second)
+        self.assertIn('Tee', first)
+        self.assertIn(str(order.id), first)
+        self.assertNotIn(emails.CONTENT_MARKER, first)
+        self.assertTrue(first.rstrip().endswith('</html>'))
+
+    def test_footer_year_is_current_with_cached_shell(self):
+        from datetime import datetime, timezone as dt_timezone
+        from unittest import mock
+        from . import emails
+        emails.email_shell.cache_clear()
+        self.addCleanup(emails.email_shell.cache_clear)
+        order = self.entries[0].order
+        new_year = datetime(2031, 1, 1, 0, 5, tzinfo=dt_timezone.utc)
+        with mock.patch('store.emails.timezone.now', return_value=new_year.replace(year=2030, month=12, day=31)):
+            self.assertIn('&copy; 2030 Cwish Store', emails.render_order_confirmation(order))
+        with mock.patch('store.emails.render_to_string', wraps=emails.render_to_string) as render, \
+                mock.patch('store.emails.timezone.now', return_value=new_year):
+            html = emails.render_order_confirmation(order)
+        self.assertIn('&copy; 2031 Cwish Store', html)
+        self.assertNotIn(emails.YEAR_MARKER, html)
+        self.assertNotIn(emails.SHELL_TEMPLATE, [call.args[0] for call in render.call_args_list])
+
+
+class StubShirtigoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        server.requests.append((self.client_address[1], self.headers.get('Authorization')))
+        status_code, body, *headers = server.responses.pop(0) if server.responses else (201, {'id': 'SH-1'})
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status_code)
+        for name, value in (headers[0] if headers else {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class ShirtigoClientTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubShirtigoHandler)
+        self.server.requests, self.server.responses = [], []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        overrides = self.settings(
+            SHIRTIGO_API_URL=f'http://127.0.0.1:{self.server.server_port}/api', SHIRTIGO_API_TOKEN='test-token',
+            SHIRTIGO_RETRY_BACKOFF=0, SHIRTIGO_MAX_RETRIES=2, SHIRTIGO_BREAKER_THRESHOLD=2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        from .shirtigo import reset_client
+        reset_client()
+        self.addCleanup(reset_client)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_retries_on_503_over_one_connection(self):
+        from .shirtigo import get_client
+        self.server.responses = [(503, {}), (201, {'id': 'SH-1'})]
+        response = get_client().create_order({})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(get_client().create_order({}).status_code, 201)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len({port for port, _ in self.server.requests}), 1)
+        self.assertEqual(self.server.requests[0][1], 'Bearer test-token')
+
+    def test_missing_token_fails_before_sending(self):
+        from .shirtigo import ShirtigoClient, ShirtigoConfigError
+        with self.assertRaises(ShirtigoConfigError):
+            ShirtigoClient(token='').create_order({})
+        self.assertEqual(self.server.requests, [])
+
+    def test_client_error_is_not_retried(self):
+        from .shirtigo import get_client
+        self.server.responses = [(422, {'message': 'invalid'})]
+        self.assertEqual(get_client().create_order({}).status_code, 422)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_long_retry_after_is_left_to_the_outbox(self):
+        from unittest import mock
+        from .shirtigo import get_client
+        self.server.responses = [(429, {}, {'Retry-After': '300'})]
+        with mock.patch('store.shirtigo.time.sleep') as sleep:
+            response = get_client().create_order({})
+        sleep.assert_not_called()
+        self.assertEqual((response.status_code, response.headers['Retry-After']), (429, '300'))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_bulkhead_slot_released_while_waiting_to_retry(self):
+        from unittest import mock
+        from .shirtigo import get_client
+        client = get_client()
+        self.server.responses = [(503, {}, {'Retry-After': '2'}), (201, {'id': 'SH-1'})]
+        free_slots = []
+        with mock.patch('store.shirtigo.time.sleep', side_effect=lambda _: free_slots.append(client._bulkhead._value)):
+            self.assertEqual(client.create_order({}).status_code, 201)
+        self.assertEqual(free_slots, [settings.SHIRTIGO_MAX_IN_FLIGHT])
+
+    def test_accepted_order_without_id_is_dead_lettered(self):
+        from .models import Order
+        from .outbox import drain, enqueue_order
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        order = Order.objects.create(
+            user=user, total_amount=Decimal('20.00'), email='buyer@example.com',
+            first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+        )
+        entry = enqueue_order(order)
+        self.server.responses = [(201, b'<html>Created</html>')]
+        results = drain(worker_id='test', concurrency=1)
+        entry.refresh_from_db()
+        self.assertEqual(results['dead'], 1)
+        self.assertEqual(entry.status, 'dead')
+        self.assertIn('HTTP 201 without an order id', entry.last_error)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_read_timeout_is_not_retried(self):
+        from unittest import mock
+        import requests
+        from .shirtigo import ShirtigoTimeoutError, get_client
+        client = get_client()
+        with mock.patch.object(client.session, 'request', side_effect=requests.exceptions.ReadTimeout('slow')) as send:
+            with self.assertRaises(ShirtigoTimeoutError):
+                client.create_order({})
+        self.assertEqual(send.call_count, 1)
+
+    def test_breaker_fails_fast_while_open(self):
+        from .shirtigo import CircuitOpenError, get_client
+        self.server.responses = [(503, {})] * 6
+        client = get_client()
+        client.create_order({})
+        client.create_order({})
+        self.assertEqual(client.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            client.create_order({})
+        self.assertEqual(len(self.server.requests), 6)
+
+
+class FakeShirtigoTests(TestCase):
+    def _server(self, **kwargs):
+        from .fake_shirtigo import FakeShirtigoServer
+        server = FakeShirtigoServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def test_client_gets_fake_order_id(self):
+        from .shirtigo import ShirtigoClient
+        server = self._server(token='t')
+        response = ShirtigoClient(base_url=server.api_url, token='t').create_order({'products': []})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['id'], 'FAKE-1')
+
+    def test_rate_limit_and_error_rate(self):
+        import requests
+        server = self._server(rate_limit=1)
+        statuses = [requests.post(f'{server.api_url}/orders', json={}).status_code for _ in range(3)]
+        self.assertEqual(statuses[0], 201)
+        self.assertIn(429, statuses[1:])
+
+        server = self._server(error_rate=1.0)
+        self.assertEqual(requests.post(f'{server.api_url}/orders', json={}).status_code, 503)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CheckoutLoadTestTests(TestCase):
+    def setUp(self):
+        reset_product_cache()
+        SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+
+    def test_reports_every_step(self):
+        from . import loadtest
+        from .models import Order
+        report, elapsed, completed = loadtest.run(users=3, concurrency=1)
+        self.assertEqual(completed, 3)
+        self.assertEqual(Order.objects.count(), 3)
+        for step in loadtest.STEPS:
+            self.assertEqual(report[step]['count'], 3)
+            self.assertEqual(report[step]['errors'], 0)
+            self.assertGreater(report[step]['queries_avg'], 0)
+            self.assertLessEqual(report[step]['p50_ms'], report[step]['p99_ms'])
+        self.assertEqual(loadtest.cleanup(), 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_drain_flags_are_checked_before_any_order_is_created(self):
+        from django.core.management import CommandError, call_command
+        from .models import Order
+        with self.assertRaises(CommandError):
+            call_command('loadtest_checkout', users=1, drain=True, fake_shirtigo=True, real_upstream=True)
+        with self.assertRaises(CommandError):
+            call_command('loadtest_checkout', users=1, real_upstream=True)
+        self.assertFalse(Order.objects.exists())
+
+
+class CartUpsertTests(TransactionTestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+
+    def test_add_is_one_statement(self):
+        from .cart import add_line
+        add_line(self.user, self.product, 1, print_position='Front')
+        with self.assertNumQueries(1):
+            add_line(self.user, self.product, 2)
+        line = CartLine.objects.get(user=self.user)
+        self.assertEqual(line.quantity, 3)
+        self.assertEqual(line.print_position, 'Front')
+
+    def test_parallel_adds_do_not_lose_increments(self):
+        from .cart import add_line
+        workers, per_worker = 4, 5
+        barrier = threading.Barrier(workers)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(per_worker):
+                    add_line(self.user, self.product, 1)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartLine.objects.get(user=self.user).quantity, workers * per_worker)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        reset_product_cache()
+        self.product = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.client.force_authenticate(self.user)
+
+    def test_product_not_modified(self):
+        first = self.client.get('/api/product/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('public', first['Cache-Control'])
+        second = self.client.get('/api/product/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+        self.product.price = Decimal('25.00')
+        self.product.save()
+        third = self.client.get('/api/product/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+
+    def test_cart_revalidation_skips_serialization(self):
+        self.client.post('/api/cart/add_to_cart/', {'quantity': 1}, format='json')
+        first = self.client.get('/api/cart/')
+        self.assertIn('private', first['Cache-Control'])
+        self.assertIn('Cookie', first['Vary'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.client.post('/api/cart/add_to_cart/', {'quantity': 1}, format='json')
+        third = self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.data['item_count'], 2)
+
+    def test_cart_removal_is_never_answered_with_stale_304(self):
+        self.client.post('/api/cart/add_to_cart/', {'quantity': 1}, format='json')
+        first = self.client.get('/api/cart/')
+        # Không có Last-Modified: If-Modified-Since không thể trả 304 sau khi xóa dòng
+        self.assertFalse(first.has_header('Last-Modified'))
+        self.client.post('/api/cart/update_quantity/', {'quantity': 0}, format='json')
+        second = self.client.get('/api/cart/', HTTP_IF_NONE_MATCH=first['ETag'],
+                                 HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['item_count'], 0)
+
+    def test_order_retrieve_not_modified(self):
+        from .models import Order
+        order = Order.objects.create(
+            user=self.user, total_amount=Decimal('20.00'), email='buyer@example.com',
+            first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+        )
+        first = self.client.get(f'/api/orders/{order.pk}/')
+        self.assertEqual(first.status_code, 200)
+        second = self.client.get(f'/api/orders/{order.pk}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+        order.update_status_after_payment()
+        third = self.client.get(f'/api/orders/{order.pk}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.data['status'], 'processing')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        reset_product_cache()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _image_file(self, size=(1200, 800)):
+        import io
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, 'PNG')
+        return SimpleUploadedFile('tee.png', buffer.getvalue(), content_type='image/png')
+
+    def test_derivatives_built_on_save(self):
+        with self.settings(MEDIA_ROOT=self.media_root, PRODUCT_IMAGE_WORKERS=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = SingleProduct.objects.create(
+                    name='Tee', description='Tee', price=Decimal('20.00'), image=self._image_file(),
+                )
+            product.refresh_from_db()
+            variants = product.image_variants
+            self.assertEqual(sorted(variants['webp'], key=int), ['160', '320', '640', '1024'])
+            self.assertEqual(set(variants['jpeg']), set(variants['webp']))
+            self.assertTrue(variants['jpeg']['160'].endswith('-160w.jpg'))
+
+            from .serializers import SingleProductSerializer
+            srcset = SingleProductSerializer(product).data['image_srcset']
+            self.assertIn('1024w', srcset['webp'])
+
+            # Lưu lại mà không đổi ảnh thì không build lại
+            with self.captureOnCommitCallbacks(execute=True):
+                product.name = 'Renamed'
+                product.save()
+            product.refresh_from_db()
+            self.assertEqual(product.image_variants, variants)
+
+    def test_small_image_is_not_upscaled(self):
+        with self.settings(MEDIA_ROOT=self.media_root, PRODUCT_IMAGE_WORKERS=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = DigitalBonusProduct.objects.create(
+                    name='Bonus', description='Bonus', price=Decimal('5.00'), image=self._image_file((200, 200)),
+                )
+            product.refresh_from_db()
+            self.assertEqual(sorted(product.image_variants['jpeg'], key=int), ['160', '200'])
+
+
+class CatalogTests(APITestCase):
+    def setUp(self):
+        from .models import Category
+        self.shirts = Category.objects.create(name='Shirts')
+        self.pants = Category.objects.create(name='Pants')
+
+    def _make_products(self, count, category=None, start=0):
+        from .models import Product, ProductOption, ProductVariant, ProductImage
+        for i in range(start, start + count):
+            product = Product.objects.create(
+                title=f'Product {i}', handle=f'product-{i}', category=category or self.shirts, status='published',
+            )
+            ProductOption.objects.create(product=product, name='Size', values=['S', 'M'])
+            for size, price in (('S', 10 + i % 7), ('M', 12 + i % 7)):
+                ProductVariant.objects.create(
+                    product=product, title=size, sku=f'P{i}-{size}', options={'Size': size}, price=price,
+                )
+            ProductImage.objects.create(product=product, image=f'products/product-{i}.jpg', is_primary=True)
+
+    def test_price_tracks_cheapest_variant(self):
+        from .models import Product, ProductVariant
+        self._make_products(1)
+        product = Product.objects.get()
+        self.assertEqual(product.price, Decimal('10.00'))
+        ProductVariant.objects.filter(sku='P0-S').delete()
+        product.refresh_from_db()
+        self.assertEqual(product.price, Decimal('12.00'))
+
+    def test_listing_query_count_is_bounded(self):
+        self._make_products(3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/catalog/products/', {'page_size': 3})
+        self._make_products(40, start=3)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/catalog/products/', {'page_size': 40})
+        self.assertEqual(len(response.data['results']), 40)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertLessEqual(len(large.captured_queries), 4)
+        for query in large.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_cursor_walks_price_ordering_without_gaps(self):
+        self._make_products(25)
+        self._make_products(5, category=self.pants, start=25)
+        seen = []
+        url = f'/api/catalog/products/?ordering=price&page_size=7&category={self.shirts.pk}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend((Decimal(item['price']), item['id']) for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(seen, sorted(seen))
+
+        # Quay lại trang trước từ trang thứ hai
+        first = self.client.get('/api/catalog/products/', {'ordering': 'price', 'page_size': 7})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([p['id'] for p in back.data['results']], [p['id'] for p in first.data['results']])
+
+    def test_variant_lookup_by_sku(self):
+        self._make_products(2)
+        response = self.client.get('/api/catalog/variants/P1-M/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product']['handle'], 'product-1')
+        self.assertEqual(self.client.get('/api/catalog/variants/NOPE/').status_code, 404)
+
+    def test_seed_data_command(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from .models import Product
+        call_command('seed_data', stdout=StringIO())
+        self.assertEqual(Product.objects.get(handle='magic-nectar').price, Decimal('12.00'))
+
+
+class StoreProductTests(TestCase):
+    def setUp(self):
+        reset_product_cache()
+
+    def test_proxies_share_one_table(self):
+        from .models import StoreProduct
+        single = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        self.assertEqual(single.product_type, 'single')
+        self.assertTrue(bonus.is_digital)
+        self.assertEqual(StoreProduct.objects.count(), 2)
+        self.assertEqual(list(SingleProduct.objects.all()), [single])
+        self.assertEqual(list(DigitalBonusProduct.objects.all()), [bonus])
+        self.assertEqual(get_active_product(), single)
+        self.assertEqual(active_bonus_product.get(), bonus)
+
+    def test_order_item_product_is_one_join(self):
+        from .models import Order, OrderItem
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        single = SingleProduct.objects.create(name='Tee', description='Tee', price=Decimal('20.00'))
+        bonus = DigitalBonusProduct.objects.create(name='Bonus', description='Bonus', price=Decimal('5.00'))
+        order = Order.objects.create(
+            user=user, total_amount=Decimal('25.00'), email='buyer@example.com',
+            first_name='A', last_name='B', address='1 Street', city='City', country='VN', postal_code='70000',
+        )
+        OrderItem.objects.create(order=order, product_type='single', product=single, quantity=1, unit_price=single.price)
+        OrderItem.objects.create(order=order, product_type='bonus', product=bonus, quantity=1, unit_price=bonus.price)
+        with self.assertNumQueries(1):
+            names = [item.get_product_name() for item in order.order_items.select_related('product')]
+        self.assertEqual(sorted(names), ['Bonus', 'Tee'])
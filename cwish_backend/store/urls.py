@@ -9,6 +9,9 @@ router.register(r'cart', views.UserCartViewSet, basename='cart')
 router.register(r'bonus-cart', views.BonusCartViewSet, basename='bonus-cart')
 router.register(r'orders', views.OrderViewSet, basename='order')
 router.register(r'contact', views.ContactViewSet, basename='contact')
+router.register(r'catalog/categories', views.CategoryViewSet, basename='catalog-category')
+router.register(r'catalog/products', views.ProductViewSet, basename='catalog-product')
+router.register(r'catalog/variants', views.ProductVariantViewSet, basename='catalog-variant')
 
 urlpatterns = [
     path('api/', include(router.urls)),